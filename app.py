@@ -11,11 +11,29 @@ import zipfile
 import io
 import random
 import contextlib
+import shutil
+import heapq
+import tempfile
+import itertools
 from collections import deque, defaultdict
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, send_file
 import requests
 from werkzeug.utils import secure_filename
 
+from session_pool import ServerSessionPool
+from audio_cache import AudioCache, make_cache_key
+from segment_store import SegmentStore, text_digest
+from throughput_model import ThroughputModel
+from concurrency_control import AIMDLimiter
+from rate_limiter import ServerRateLimiter, parse_rate_limit_headers
+from scheduler_core import DelayedRetryQueue, WakeupSignal
+from circuit_breaker import CircuitBreaker
+from health_prober import HealthProber
+from batch_scheduler import DEFAULT_PRIORITY, PRIORITY_CLASSES, SharedScheduler, server_key
+from batch_store import BatchStore
+from text_cleaner import clean_text, clean_text_client, collapse_whitespace
+
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'md'}
@@ -24,8 +42,37 @@ app.secret_key = 'super-secret-key'  # 生产环境请替换为随机字符串
 # 确保目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# 存储批量处理状态
-batch_status = {}
+# 内容寻址音频缓存（默认放在上传目录下，便于硬链接；TTS_AUDIO_CACHE_MAX_MB=0 时关闭）
+AUDIO_CACHE_DIR = os.environ.get(
+    'TTS_AUDIO_CACHE_DIR', os.path.join(app.config['UPLOAD_FOLDER'], '.audio_cache')
+)
+AUDIO_CACHE_MAX_MB = int(os.environ.get('TTS_AUDIO_CACHE_MAX_MB', '2048') or 0)
+
+# 存储批量处理状态：SQLite（WAL）持久化，服务重启后仍可查询与重试；状态变化由后台线程批量写库
+BATCH_STATE_DB = os.environ.get(
+    'TTS_STATE_DB', os.path.join(app.config['UPLOAD_FOLDER'], '.batch_state.db')
+)
+BATCH_STATE_FLUSH_SECONDS = float(os.environ.get('TTS_STATE_FLUSH_SECONDS', '1.0'))
+BATCH_STATE_MEMORY_TTL = float(os.environ.get('TTS_STATE_MEMORY_TTL', '600'))  # 已结束批次在内存中保留的秒数
+batch_status = BatchStore(BATCH_STATE_DB, BATCH_STATE_FLUSH_SECONDS, BATCH_STATE_MEMORY_TTL)
+# 进度查询分页：指定页码未指定每页条数时的默认值，以及每页条数上限
+PROGRESS_PAGE_SIZE = 100
+PROGRESS_MAX_PAGE_SIZE = 1000
+
+# 进度事件流 (SSE)：服务器状态检查间隔、空闲心跳间隔、浏览器断线重连间隔
+SSE_POLL_SECONDS = float(os.environ.get('TTS_SSE_POLL_SECONDS', '1.0'))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('TTS_SSE_HEARTBEAT_SECONDS', '15'))
+SSE_RETRY_MS = 3000
+
+# 启动时自动恢复上次异常退出时仍在处理的批次
+AUTO_RESUME = os.environ.get('TTS_AUTO_RESUME', 'true').lower() == 'true'
+# 批次的服务器配置写库时不含 API Key；自动恢复时按服务器地址（或名称）从这里取 Key，JSON 对象
+try:
+    RESUME_API_KEYS = json.loads(os.environ.get('TTS_RESUME_API_KEYS', '') or '{}')
+except ValueError:
+    print("⚠️ TTS_RESUME_API_KEYS 不是合法的 JSON 对象，已忽略")
+    RESUME_API_KEYS = {}
+SERVER_SECRET_FIELDS = ('apiKey', 'api_key')
 
 # 默认提交接口的清洗配置
 DEFAULT_CLEANING_OPTIONS = {
@@ -36,12 +83,105 @@ DEFAULT_CLEANING_OPTIONS = {
     "remove_citation_numbers": True
 }
 
+# 长文本分段合成：单段字符预算（0 表示关闭，整文件一次提交）
+CHUNK_MAX_CHARS = int(os.environ.get("TTS_CHUNK_MAX_CHARS", "0") or 0)
+
+# 增量合成：按段落存储分段音频，文件修改后只重新合成变化的段落
+INCREMENTAL_SYNTHESIS = os.environ.get("TTS_INCREMENTAL_SYNTHESIS", "false").lower() == "true"
+INCREMENTAL_SEGMENT_MAX_CHARS = 2000  # 未设置分段预算时的段落上限
+INCREMENTAL_SEGMENT_MIN_CHARS = 200   # 过短的段落（如标题）并入下一段
+
+# 客户端清洗：批次在本地清洗文本后提交，服务端清洗全部关闭，减少请求体积
+CLIENT_SIDE_CLEANING = os.environ.get("TTS_CLIENT_SIDE_CLEANING", "false").lower() == "true"
+CLIENT_CLEANING_POOL_THRESHOLD = int(os.environ.get("TTS_CLIENT_CLEANING_POOL_THRESHOLD", 64))  # 文件数达到该值时改用进程池
+CLIENT_CLEANING_WORKERS = int(os.environ.get("TTS_CLIENT_CLEANING_WORKERS", "0") or 0) or None  # 默认 CPU 核数
+PREPASS_WINDOW = 64  # 派发前预处理每轮并行读取/清洗的文件数
+
+# 客户端清洗时提交给服务端的配置（全部关闭）
+CLIENT_CLEANING_DISABLED = {name: False for name in DEFAULT_CLEANING_OPTIONS}
+
+# 客户端清洗的本地配置：保留换行以便分段，整文件提交前再合并为单行
+CLIENT_CLEANING_OPTIONS = DEFAULT_CLEANING_OPTIONS.copy()
+CLIENT_CLEANING_OPTIONS['remove_line_breaks'] = False
+
+# 单台服务器并发上限的天花板（实际并发由 AIMD 在运行时学习）
+SERVER_MAX_CONCURRENCY = int(os.environ.get("TTS_SERVER_MAX_CONCURRENCY", 8))
+
+# 进程级共享调度器：所有批次在同一个后台事件循环上运行，同一台服务器被多个批次使用时
+# 总在途请求数不超过全局上限，并发位按批次公平分配
+SERVER_GLOBAL_LIMIT = int(os.environ.get("TTS_SERVER_GLOBAL_LIMIT", SERVER_MAX_CONCURRENCY))
+scheduler = SharedScheduler(SERVER_GLOBAL_LIMIT)
+
+# 批次优先级：interactive（紧急单文档）> normal > bulk（大批量任务，只使用剩余容量，高优先级批次到来时在文件边界让出）
+DEFAULT_BATCH_PRIORITY = os.environ.get("TTS_DEFAULT_PRIORITY", DEFAULT_PRIORITY).lower()
+
+def parse_priority(value, default=None):
+    """表单中的优先级，无效或缺省时取默认值"""
+    value = (value or '').strip().lower()
+    if value in PRIORITY_CLASSES:
+        return value
+    default = default or DEFAULT_BATCH_PRIORITY
+    return default if default in PRIORITY_CLASSES else DEFAULT_PRIORITY
+
+# 对冲请求：队列已空时，耗时超过同长度请求高分位的在途请求向空闲服务器发送副本，先成功者胜出
+HEDGING_ENABLED = os.environ.get("TTS_HEDGING", "false").lower() == "true"
+HEDGE_QUANTILE = float(os.environ.get("TTS_HEDGE_QUANTILE", "0.95"))
+HEDGE_BUDGET = float(os.environ.get("TTS_HEDGE_BUDGET", "0.05"))        # 副本数占已派发请求的比例上限
+HEDGE_MIN_DELAY = float(os.environ.get("TTS_HEDGE_MIN_DELAY", "5.0"))   # 发出副本前至少等待的秒数
+
 # 最小音频有效性判定配置
 MIN_AUDIO_SIZE_BYTES = int(os.environ.get("TTS_MIN_AUDIO_SIZE_BYTES", 4096))
 MIN_AUDIO_BYTES_PER_CHAR = float(
     os.environ.get("TTS_MIN_AUDIO_BYTES_PER_CHAR", "3.0")
 )
 
+# 音频流式写盘的分块大小
+AUDIO_STREAM_CHUNK_SIZE = int(os.environ.get("TTS_AUDIO_STREAM_CHUNK_SIZE", 256 * 1024))
+
+# 请求超时：首字节超时按 文本长度 / 服务器实测吞吐 × 安全系数 计算并限制在上下限之间；
+# 连接与读空闲（音频流两次到达之间）单独设较短的超时，卡住的连接几秒内即可发现
+REQUEST_TIMEOUT_MIN = float(os.environ.get("TTS_REQUEST_TIMEOUT_MIN", 30))
+REQUEST_TIMEOUT_MAX = float(os.environ.get("TTS_REQUEST_TIMEOUT_MAX", 1800))
+REQUEST_TIMEOUT_FACTOR = float(os.environ.get("TTS_REQUEST_TIMEOUT_FACTOR", 3.0))
+REQUEST_TIMEOUT_FALLBACK_RATE = float(os.environ.get("TTS_REQUEST_TIMEOUT_FALLBACK_RATE", 20))  # 尚无实测时假定的字/秒
+CONNECT_TIMEOUT = float(os.environ.get("TTS_CONNECT_TIMEOUT", 10))
+READ_IDLE_TIMEOUT = float(os.environ.get("TTS_READ_IDLE_TIMEOUT", 30))
+
+# 熔断：连续失败达到阈值的服务器暂停派发，冷却后用一句极短文本探测恢复（探测失败冷却时间翻倍）
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("TTS_BREAKER_FAILURES", 3))
+BREAKER_OPEN_SECONDS = float(os.environ.get("TTS_BREAKER_OPEN_SECONDS", 30))
+BREAKER_MAX_OPEN_SECONDS = float(os.environ.get("TTS_BREAKER_MAX_OPEN_SECONDS", 300))
+BREAKER_PROBE_TEXT = "语音服务恢复检测。"
+
+# 健康探测：批次开始时用一段短文本校准每台服务器（可用性、首字节耗时、字符吞吐），校准完成前不分配文件；
+# 运行期间长时间没有请求完成的空闲服务器每隔 HEALTH_PROBE_INTERVAL 秒复查一次（0 表示不复查）
+HEALTH_PROBE_ENABLED = os.environ.get("TTS_HEALTH_PROBE", "true").lower() == "true"
+HEALTH_PROBE_INTERVAL = float(os.environ.get("TTS_HEALTH_PROBE_INTERVAL", 60))
+HEALTH_PROBE_TEXT = "这是一段用于检测语音合成服务状态与速度的测试文本，合成完成后会立即删除，不会出现在任何输出文件中。"
+
+def expected_min_audio_size(text):
+    """基于文本长度和固定阈值计算音频的最小有效大小"""
+    return max(MIN_AUDIO_SIZE_BYTES, int(len(text) * MIN_AUDIO_BYTES_PER_CHAR))
+
+def request_timeouts(text_length, chars_per_sec=None):
+    """按文本长度与服务器实测吞吐（字/秒，未知时用保守值）计算超时，返回 async_text_to_speech 的关键字参数。
+
+    服务端通常合成完毕才返回响应头，因此首字节超时即合成耗时的预算；总超时再为音频传输留出同样的余量。
+    """
+    rate = chars_per_sec or REQUEST_TIMEOUT_FALLBACK_RATE
+    first_byte = min(REQUEST_TIMEOUT_MAX, max(REQUEST_TIMEOUT_MIN, text_length / rate * REQUEST_TIMEOUT_FACTOR))
+    return {'timeout_seconds': first_byte * 2, 'first_byte_timeout': first_byte}
+
+def make_temp_audio_path(output_path):
+    """在目标文件同目录生成临时文件路径（隐藏文件，不以 .mp3 结尾，避免被继续处理误判为已完成）"""
+    directory, name = os.path.split(output_path)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.part")
+
+def looks_like_error_body(chunk):
+    """200 响应的首块若是 JSON/HTML 文本，说明服务端返回的不是音频"""
+    head = chunk[:64].lstrip()
+    return head.startswith(b'{') or head.startswith(b'<')
+
 # 全局API并发上限（仅当显式配置 >0 时启用；默认禁用，按服务器独立处理）
 def _init_global_semaphore():
     value = os.environ.get('GLOBAL_CONCURRENCY_LIMIT', '0')
@@ -55,6 +195,62 @@ def _init_global_semaphore():
 
 global_api_semaphore = _init_global_semaphore()
 
+audio_cache = (
+    AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024)
+    if AUDIO_CACHE_MAX_MB > 0 else None
+)
+
+def audio_cache_key(text, voice, speed, pitch=1.0, cleaning_options=None, response_format="mp3"):
+    """与 async_text_to_speech 实际提交的参数一致的缓存键"""
+    effective_cleaning = DEFAULT_CLEANING_OPTIONS.copy()
+    if cleaning_options:
+        effective_cleaning.update(cleaning_options)
+    return make_cache_key(text, voice, speed, pitch, response_format, effective_cleaning)
+
+class LongestFirstQueue(asyncio.PriorityQueue):
+    """按任务字符数从大到小出队的任务队列（最长任务优先，LPT）。
+
+    元素仍是 (task_id, retry_count)；字符数未知的任务排在最后，同样长度按入队顺序出队。
+    """
+
+    def __init__(self, task_chars):
+        super().__init__()
+        self._task_chars = task_chars
+        self._sequence = itertools.count()
+
+    def _put(self, item):
+        super()._put((-self._task_chars.get(item[0], 0), next(self._sequence), item))
+
+    def _get(self):
+        return super()._get()[2]
+
+    def _pop_until(self, count, stop=None):
+        """从堆顶依次弹出至多 count 个条目（遇到 stop 任务即停），返回弹出的条目"""
+        popped = []
+        while self._queue and len(popped) < count:
+            entry = heapq.heappop(self._queue)
+            popped.append(entry)
+            if entry[2] is stop:
+                break
+        return popped
+
+    def peek(self, count):
+        """按出队顺序查看前 count 个任务（不出队）；只弹出再放回队首条目，代价 O(count·log n)"""
+        popped = self._pop_until(count)
+        for entry in popped:
+            heapq.heappush(self._queue, entry)
+        return [entry[2] for entry in popped]
+
+    def take(self, item, count):
+        """取出 peek(count) 返回的指定任务，其余弹出的条目放回堆中"""
+        popped = self._pop_until(count, stop=item)
+        for entry in popped:
+            if entry[2] is not item:
+                heapq.heappush(self._queue, entry)
+        if not popped or popped[-1][2] is not item:
+            raise KeyError(item)
+        return item
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -118,79 +314,136 @@ def clean_directory_name(name):
         clean_name = "custom_batch"
     return clean_name
 
-def clean_text(text, options=None):
-    """清理文本，移除 Markdown 语法、表情符号、URL 链接等"""
-    if not isinstance(text, str):
-        text = str(text) if text is not None else ""
-    
-    cleaned_text = text
-    options = options or {}
-    
-    # 移除 Markdown 语法
-    if options.get('remove_markdown', True):
-        # 移除图片链接
-        cleaned_text = re.sub(r'!\[.*?\]\(.*?\)', '', cleaned_text)
-        # 移除链接，保留文本内容
-        cleaned_text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', cleaned_text)
-        # 移除粗体标记
-        cleaned_text = re.sub(r'\*\*(.*?)\*\*', r'\1', cleaned_text)
-        cleaned_text = re.sub(r'__(.*?)__', r'\1', cleaned_text)
-        # 移除斜体标记
-        cleaned_text = re.sub(r'\*(.*?)\*', r'\1', cleaned_text)
-        cleaned_text = re.sub(r'_(.*?)_', r'\1', cleaned_text)
-        # 移除代码块标记
-        cleaned_text = re.sub(r'`([^`]+)`', r'\1', cleaned_text)
-        # 移除标题标记
-        cleaned_text = re.sub(r'^#{1,6}\s*', '', cleaned_text, flags=re.MULTILINE)
-        # 移除列表标记
-        cleaned_text = re.sub(r'^\s*[-*+]\s*', '', cleaned_text, flags=re.MULTILINE)
-        # 移除数字列表标记
-        cleaned_text = re.sub(r'^\s*\d+\.\s*', '', cleaned_text, flags=re.MULTILINE)
-    
-    # 移除 URL 链接
-    if options.get('remove_urls', True):
-        cleaned_text = re.sub(r'https?://[^\s]+', '', cleaned_text)
-    
-    # 移除表情符号
-    if options.get('remove_emoji', True):
-        # 使用更精确的表情符号范围，避免误删中文字符
-        emoji_pattern = re.compile(
-            "["
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F300-\U0001F5FF"  # symbols & pictographs
-            "\U0001F680-\U0001F6FF"  # transport & map symbols
-            "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-            "\U00002702-\U000027B0"
-            "\U000024C2-\U0001F251"
-            "\U0001F900-\U0001F9FF"  # supplemental symbols
-            "\U0001FA70-\U0001FAFF"  # symbols and pictographs extended-a
-            "\U00002600-\U000026FF"  # miscellaneous symbols
-            "\U00002700-\U000027BF"  # dingbats
-            "]+", flags=re.UNICODE)
-        cleaned_text = emoji_pattern.sub('', cleaned_text)
-    
-    # 移除引用标记
-    if options.get('remove_citation_numbers', True):
-        cleaned_text = re.sub(r'\[\d+\]', '', cleaned_text)
-        cleaned_text = re.sub(r'【\d+】', '', cleaned_text)
-    
-    # 合并为单行文本
-    if options.get('remove_line_breaks', True):
-        # 移除所有换行符
-        cleaned_text = re.sub(r'(\r\n|\n|\r)', ' ', cleaned_text)
-        # 合并多个连续空格为单个空格
-        cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
-    else:
-        # 只合并非换行的连续空格
-        cleaned_text = re.sub(r'[ \t]+', ' ', cleaned_text)
-    
-    return cleaned_text.strip()
-
-async def async_text_to_speech(session, text, output_path, voice="zh-CN-XiaoxiaoNeural", speed=1.0, api_url=None, api_key=None, timeout_seconds: int = 300, pitch: float = 1.0, cleaning_options=None, response_format: str = "mp3"):
-    """异步调用TTS API转换文本为语音（固定超时，移除按字数动态超时）。
+PARAGRAPH_SPLIT_RE = re.compile(r'\n\s*\n')
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[。！？；…])|(?<=[.!?;])\s+')
+
+def split_text_into_chunks(text, max_chars):
+    """按段落/句子边界把文本切分为不超过 max_chars 字符的分段（超长句子按字数硬切）"""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    # 先拆成不超过预算的最小单元：段落 → 句子 → 硬切
+    pieces = []
+    for paragraph in PARAGRAPH_SPLIT_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, '\n\n'))
+            continue
+        for sentence in SENTENCE_SPLIT_RE.split(paragraph):
+            sentence = sentence.strip()
+            for start in range(0, len(sentence), max_chars):
+                pieces.append((sentence[start:start + max_chars], ' '))
+        pieces[-1] = (pieces[-1][0], '\n\n')
+
+    # 再贪心合并相邻单元，尽量填满预算
+    chunks = []
+    current = ''
+    separator = ''
+    for piece, next_separator in pieces:
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f"{current}{separator}{piece}" if current else piece
+        separator = next_separator
+    if current:
+        chunks.append(current)
+    return chunks
+
+def split_paragraph_segments(text, max_chars, min_chars=INCREMENTAL_SEGMENT_MIN_CHARS):
+    """按段落切分（增量合成用）：每个段落独立成段，过短段落并入下一段，超长段落按句子再切。
+
+    与 split_text_into_chunks 不同，这里不做跨段落的贪心合并，
+    分段边界只取决于局部内容，修改一个段落只影响它所在的分段。
+    """
+    segments = []
+    pending = ''
+    for paragraph in PARAGRAPH_SPLIT_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        paragraph = f"{pending}\n\n{paragraph}" if pending else paragraph
+        if len(paragraph) < min_chars:
+            pending = paragraph
+            continue
+        pending = ''
+        segments.extend(split_text_into_chunks(paragraph, max_chars))
+    if pending:
+        segments.append(pending)
+    return segments
+
+def clean_text_for_segmentation(text):
+    """清洗文档但保留换行，以便识别段落。
+
+    表情符号交给服务端清洗：本地表情范围过宽，会误删中文。
+    """
+    options = DEFAULT_CLEANING_OPTIONS.copy()
+    options['remove_line_breaks'] = False
+    options['remove_emoji'] = False
+    return clean_text(text, options)
+
+def plan_text_chunks(text, max_chars, precleaned=False):
+    """清洗文档并切分为分段列表（precleaned 表示已在客户端清洗，分段直接合并为单行提交）"""
+    if precleaned:
+        return [collapse_whitespace(chunk) for chunk in split_text_into_chunks(text, max_chars)]
+    return split_text_into_chunks(clean_text_for_segmentation(text), max_chars)
+
+def plan_paragraph_segments(text, max_chars, precleaned=False):
+    """清洗文档并按段落切分为增量合成分段"""
+    if precleaned:
+        return [collapse_whitespace(segment) for segment in split_paragraph_segments(text, max_chars)]
+    return split_paragraph_segments(clean_text_for_segmentation(text), max_chars)
+
+_cleaning_pool = None
+_cleaning_pool_lock = threading.Lock()
+
+def get_cleaning_pool():
+    """客户端清洗的进程池（全局共享，首次使用时创建）"""
+    global _cleaning_pool
+    with _cleaning_pool_lock:
+        if _cleaning_pool is None:
+            _cleaning_pool = ProcessPoolExecutor(max_workers=CLIENT_CLEANING_WORKERS)
+        return _cleaning_pool
+
+def read_text_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def chunk_segment_dir(batch_upload_dir, filename):
+    """分段音频的临时目录（隐藏目录，合并后删除）"""
+    return os.path.join(batch_upload_dir, '.chunks', os.path.splitext(filename)[0])
+
+def concat_audio_segments(segment_paths, output_path):
+    """按顺序拼接分段音频（MP3 帧可直接首尾相接），经临时文件原子落盘"""
+    temp_path = make_temp_audio_path(output_path)
+    try:
+        with open(temp_path, 'wb') as out:
+            for segment_path in segment_paths:
+                with open(segment_path, 'rb') as segment:
+                    shutil.copyfileobj(segment, out, AUDIO_STREAM_CHUNK_SIZE)
+        os.replace(temp_path, output_path)
+    except Exception:
+        with contextlib.suppress(Exception):
+            os.remove(temp_path)
+        raise
+
+def remove_chunk_segments(batch_upload_dir, filename):
+    """删除文件的分段音频目录"""
+    segment_dir = chunk_segment_dir(batch_upload_dir, filename)
+    shutil.rmtree(segment_dir, ignore_errors=True)
+    with contextlib.suppress(OSError):
+        os.rmdir(os.path.dirname(segment_dir))
+
+async def async_text_to_speech(session, text, output_path, voice="zh-CN-XiaoxiaoNeural", speed=1.0, api_url=None, api_key=None, timeout_seconds=None, pitch: float = 1.0, cleaning_options=None, response_format: str = "mp3", response_meta=None, first_byte_timeout=None, connect_timeout=CONNECT_TIMEOUT, read_idle_timeout=READ_IDLE_TIMEOUT, cache=True):
+    """异步调用TTS API转换文本为语音。
 
     返回 (success, status_code, error_detail) 元组，便于上层针对限流/超时等情况做精细化处理。
-    当出现网络异常、超时等情况时 status_code 可能为 None，同时 error_detail 提供简短说明。
+    当出现网络异常、超时等情况时 status_code 可能为 None，同时 error_detail 提供简短说明
+    （超时为 'connect timeout' / 'first byte timeout' / 'read timeout'）。
+    未指定 timeout_seconds 时按文本长度计算（见 request_timeouts）；首字节超时默认等于总超时。
+    传入 response_meta 字典时写入限流相关响应头（retry_after/remaining/reset_after）与首字节耗时 ttfb（秒）。
+    cache 为假时成功的音频不写入内容缓存（探测请求用）。
     """
     # 使用传入的API信息，如果没有则使用默认值
     if not api_url:
@@ -225,39 +478,73 @@ async def async_text_to_speech(session, text, output_path, voice="zh-CN-Xiaoxiao
     if response_format:
         data["response_format"] = response_format
     
+    if timeout_seconds is None:
+        timeouts = request_timeouts(len(text))
+        timeout_seconds = timeouts['timeout_seconds']
+        first_byte_timeout = first_byte_timeout or timeouts['first_byte_timeout']
+    first_byte_timeout = min(first_byte_timeout or timeout_seconds, timeout_seconds)
+
+    stage = 'first byte'
     try:
         text_length = len(text)
-        print(f"⏱️ 固定超时: {timeout_seconds}秒，文本长度: {text_length:,} 字符")
+        print(
+            f"⏱️ 超时: 首字节 {first_byte_timeout:.0f}s / 总计 {timeout_seconds:.0f}s / 读空闲 {read_idle_timeout:.0f}s，"
+            f"文本长度: {text_length:,} 字符"
+        )
         
-        # 异步发送请求并获取响应
-        timeout = aiohttp.ClientTimeout(total=timeout_seconds)
-        async with session.post(api_url, headers=headers, json=data, timeout=timeout) as response:
+        # 异步发送请求并获取响应：连接与首字节（响应头）分别限时
+        timeout = aiohttp.ClientTimeout(total=timeout_seconds, sock_connect=connect_timeout)
+        request_started = time.time()
+        response = await asyncio.wait_for(
+            session.post(api_url, headers=headers, json=data, timeout=timeout), first_byte_timeout
+        )
+        stage = 'read'
+        async with response:
+            if response_meta is not None:
+                response_meta.update(parse_rate_limit_headers(response.headers))
+                response_meta['ttfb'] = time.time() - request_started
             if response.status == 200:
-                # 异步读取响应内容
-                content = await response.read()
-                
-                # 保存音频文件
-                with open(output_path, 'wb') as f:
-                    f.write(content)
-
-                # 基于文本长度和固定阈值检测音频是否过短/为空
-                expected_min_size = max(
-                    MIN_AUDIO_SIZE_BYTES,
-                    int(len(text) * MIN_AUDIO_BYTES_PER_CHAR)
-                )
-                actual_size = os.path.getsize(output_path)
-
-                if actual_size < expected_min_size:
-                    with contextlib.suppress(Exception):
-                        os.remove(output_path)
-                    warning_msg = (
-                        f"⚠️ 音频文件疑似异常 (大小 {actual_size}B < 预期 {expected_min_size}B, "
-                        f"文本长度 {len(text)}). 将视为失败并计划重试。"
-                    )
-                    print(warning_msg, file=sys.stderr)
-                    return False, response.status, 'audio_too_small'
-
-                return True, response.status, None
+                # 流式写入同目录临时文件，校验通过后原子重命名，避免出现半成品MP3
+                expected_min_size = expected_min_audio_size(text)
+                temp_path = make_temp_audio_path(output_path)
+                loop = asyncio.get_running_loop()
+                actual_size = 0
+                finalized = False
+                f = await loop.run_in_executor(None, open, temp_path, 'wb')
+                try:
+                    while True:
+                        # 两次数据到达之间超过读空闲超时即判定音频流卡住
+                        chunk = await asyncio.wait_for(response.content.read(AUDIO_STREAM_CHUNK_SIZE), read_idle_timeout)
+                        if not chunk:
+                            break
+                        if actual_size == 0 and looks_like_error_body(chunk):
+                            print(f"⚠️ 响应内容不是音频 ({api_url}): {chunk[:100]!r}", file=sys.stderr)
+                            return False, response.status, 'invalid_audio'
+                        actual_size += len(chunk)
+                        await loop.run_in_executor(None, f.write, chunk)
+                    await loop.run_in_executor(None, f.close)
+
+                    if actual_size < expected_min_size:
+                        warning_msg = (
+                            f"⚠️ 音频文件疑似异常 (大小 {actual_size}B < 预期 {expected_min_size}B, "
+                            f"文本长度 {len(text)}). 将视为失败并计划重试。"
+                        )
+                        print(warning_msg, file=sys.stderr)
+                        return False, response.status, 'audio_too_small'
+
+                    await loop.run_in_executor(None, os.replace, temp_path, output_path)
+                    finalized = True
+                    if cache and audio_cache is not None:
+                        cache_key = audio_cache_key(text, voice, speed, pitch, cleaning_options, response_format)
+                        await loop.run_in_executor(None, audio_cache.store, cache_key, output_path)
+                    return True, response.status, None
+                finally:
+                    # 失败、异常或被取消时丢弃临时文件
+                    if not f.closed:
+                        f.close()
+                    if not finalized:
+                        with contextlib.suppress(Exception):
+                            os.remove(temp_path)
             else:
                 # 尝试读取错误响应内容
                 error_detail = None
@@ -271,9 +558,11 @@ async def async_text_to_speech(session, text, output_path, voice="zh-CN-Xiaoxiao
                     error_detail = None
                 return False, response.status, error_detail
                 
-    except asyncio.TimeoutError:
-        print(f"⏰ TTS转换超时 ({api_url}) - 固定超时: {timeout_seconds}s, 文本长度: {len(text):,} 字符", file=sys.stderr)
-        return False, None, 'timeout'
+    except asyncio.TimeoutError as e:
+        if isinstance(e, aiohttp.ServerTimeoutError) and stage == 'first byte':
+            stage = 'connect'  # sock_connect 超时
+        print(f"⏰ TTS转换超时 ({api_url}) - 阶段: {stage}, 文本长度: {len(text):,} 字符", file=sys.stderr)
+        return False, None, f'{stage} timeout'
     except aiohttp.ClientConnectorError as e:
         print(f"🔌 连接错误 ({api_url}): {str(e)} - 可能原因: DNS解析失败、服务器不可达、端口被拒绝", file=sys.stderr)
         return False, None, str(e)
@@ -284,6 +573,48 @@ async def async_text_to_speech(session, text, output_path, voice="zh-CN-Xiaoxiao
         print(f"💥 TTS转换失败 ({api_url}): {str(e)} - 未知错误", file=sys.stderr)
         return False, None, str(e)
 
+async def measure_tts_server(session, server, text, voice="zh-CN-XiaoxiaoNeural", speed=1.0):
+    """向服务器合成一段短文本，测量可用性、首字节耗时与字符吞吐（探测音频随即删除，不写入缓存）。
+
+    返回 {'ok', 'status_code', 'error', 'ttfb', 'chars_per_sec', 'meta'}，meta 为限流相关响应头。
+    """
+    probe_path = os.path.join(tempfile.gettempdir(), f"tts_probe_{uuid.uuid4().hex[:8]}.mp3")
+    api_key = server.get('apiKey', server.get('api_key', ''))
+    meta = {}
+    started = time.time()
+    try:
+        success, status_code, error_detail = await async_text_to_speech(
+            session, text, probe_path, voice, speed, server.get('url'), api_key, response_meta=meta, cache=False
+        )
+        seconds = time.time() - started
+        # 探测文本很短，音频可能低于最小有效大小；200 且确为音频即可说明服务可用
+        ok = success or (status_code == 200 and error_detail == 'audio_too_small')
+        return {
+            'ok': ok,
+            'status_code': status_code,
+            'error': None if ok else (error_detail or f'HTTP {status_code}'),
+            'ttfb': meta.get('ttfb'),
+            'chars_per_sec': len(text) / seconds if ok and seconds > 0 else None,
+            'meta': meta,
+        }
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(probe_path)
+
+async def probe_tts_server(session, server, voice="zh-CN-XiaoxiaoNeural", speed=1.0, on_throttled=None):
+    """熔断半开时的探测请求：合成一句极短文本，服务端正常返回音频即视为恢复
+
+    探测被限流 (429) 时以限流响应头调用 on_throttled（通常只暂停服务器，不学习速率）。
+    """
+    result = await measure_tts_server(session, server, BREAKER_PROBE_TEXT, voice, speed)
+    if result['status_code'] == 429 and on_throttled is not None:
+        on_throttled(result['meta'])
+    if result['ok']:
+        print(f"🔍 熔断探测 {server.get('name')}: 已恢复")
+    else:
+        print(f"🔍 熔断探测 {server.get('name')}: 仍不可用 ({result['error']})")
+    return result['ok']
+
 def text_to_speech(text, output_path, voice="zh-CN-XiaoxiaoNeural", speed=1.0, api_url=None, api_key=None, pitch: float = 1.0, cleaning_options=None, response_format: str = "mp3"):
     """同步版本的TTS调用（保持向后兼容）"""
     # 使用传入的API信息，如果没有则使用默认值
@@ -321,25 +652,30 @@ def text_to_speech(text, output_path, voice="zh-CN-XiaoxiaoNeural", speed=1.0, a
     
     try:
         # 发送请求并获取响应
-        response = requests.post(api_url, headers=headers, json=data)
+        timeouts = request_timeouts(len(text))
+        response = requests.post(
+            api_url, headers=headers, json=data, timeout=(CONNECT_TIMEOUT, timeouts['first_byte_timeout'])
+        )
         response.raise_for_status()
         
-        # 保存音频文件
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-
-        expected_min_size = max(
-            MIN_AUDIO_SIZE_BYTES,
-            int(len(text) * MIN_AUDIO_BYTES_PER_CHAR)
-        )
-        actual_size = os.path.getsize(output_path)
+        # 校验后通过临时文件原子落盘
+        expected_min_size = expected_min_audio_size(text)
+        actual_size = len(response.content)
 
         if actual_size < expected_min_size:
-            with contextlib.suppress(Exception):
-                os.remove(output_path)
             raise ValueError(
                 f"audio_too_small (size={actual_size}, expected>={expected_min_size}, text_len={len(text)})"
             )
+
+        temp_path = make_temp_audio_path(output_path)
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(response.content)
+            os.replace(temp_path, output_path)
+        except Exception:
+            with contextlib.suppress(Exception):
+                os.remove(temp_path)
+            raise
         
         return True
     except Exception as e:
@@ -364,6 +700,11 @@ def upload_files():
     # 获取API服务器信息
     api_servers_json = request.form.get('api_servers', '[]')
     concurrency = int(request.form.get('concurrency', 1))
+    # 分段合成字符预算（0 表示整文件提交）
+    chunk_max_chars = int(request.form.get('chunk_chars', CHUNK_MAX_CHARS) or 0)
+    incremental = request.form.get('incremental', str(INCREMENTAL_SYNTHESIS)).lower() == 'true'
+    client_cleaning = request.form.get('client_cleaning', str(CLIENT_SIDE_CLEANING)).lower() == 'true'
+    priority = parse_priority(request.form.get('priority'))
     
     # 解析API服务器列表
     try:
@@ -377,7 +718,7 @@ def upload_files():
         print(f"🔧 启用的API服务器列表:")
         for i, server in enumerate(enabled_servers):
             print(f"  {i+1}. {server.get('name', 'Unknown')} - {server.get('url', 'No URL')}")
-        print(f"📊 总共 {len(enabled_servers)} 个启用的服务器，并发度: {concurrency}")
+        print(f"📊 总共 {len(enabled_servers)} 个启用的服务器，并发度: {concurrency}，优先级: {priority}")
         
     except json.JSONDecodeError:
         return jsonify({'error': 'API服务器配置格式错误'}), 400
@@ -398,7 +739,12 @@ def upload_files():
         'current_file': 0,
         'files': {},
         'server_statuses': {},  # 添加服务器状态跟踪
-        'upload_dir': batch_upload_dir  # 保存上传目录路径
+        'upload_dir': batch_upload_dir,  # 保存上传目录路径
+        'chunk_max_chars': chunk_max_chars,
+        'client_cleaning': client_cleaning,
+        'priority': priority,
+        # 目录已有增量清单（重新上传到同名目录）时自动沿用增量合成
+        'incremental': incremental or SegmentStore.exists(batch_upload_dir)
     }
     
     # 先保存所有文件并初始化状态
@@ -418,11 +764,8 @@ def upload_files():
             'stage': '等待处理'
         }
     
-    # 启动后台处理任务
-    import threading
-    thread = threading.Thread(target=run_async_processing, args=(batch_id, batch_upload_dir, voice, speed, enabled_servers, concurrency))
-    thread.daemon = True
-    thread.start()
+    # 提交到共享调度器后台处理
+    run_async_processing(batch_id, batch_upload_dir, voice, speed, enabled_servers, concurrency)
     
     return jsonify({
         'batch_id': batch_id,
@@ -430,20 +773,90 @@ def upload_files():
         'total_files': len(valid_files)
     })
 
+def redact_servers(api_servers):
+    """写库用的服务器配置：去掉 API Key，有 Key 的服务器记下 key_ref（规范化地址），恢复时据此取 Key"""
+    redacted = []
+    for server in api_servers:
+        copy = {key: value for key, value in server.items() if key not in SERVER_SECRET_FIELDS}
+        if any(server.get(field) for field in SERVER_SECRET_FIELDS):
+            copy['key_ref'] = server_key(server)
+        redacted.append(copy)
+    return redacted
+
+def restore_server_keys(servers):
+    """按 key_ref 从 TTS_RESUME_API_KEYS 取回 API Key；返回 (服务器配置, 缺少 Key 的服务器名)"""
+    restored, missing = [], []
+    for server in servers:
+        server = dict(server)
+        key_ref = server.pop('key_ref', None)
+        if key_ref and not any(server.get(field) for field in SERVER_SECRET_FIELDS):
+            api_key = RESUME_API_KEYS.get(key_ref) or RESUME_API_KEYS.get(server.get('url')) or RESUME_API_KEYS.get(server.get('name'))
+            if api_key:
+                server['apiKey'] = api_key
+            else:
+                missing.append(server.get('name') or server.get('url'))
+        restored.append(server)
+    return restored, missing
+
 def run_async_processing(batch_id, batch_upload_dir, voice, speed, api_servers, concurrency, specific_files=None):
-    """运行异步处理的主函数"""
-    try:
-        # 创建新的事件循环
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # 运行异步处理
-        loop.run_until_complete(process_files_async(batch_id, batch_upload_dir, voice, speed, api_servers, concurrency, specific_files))
-        
-    except Exception as e:
-        print(f"异步处理异常: {str(e)}", file=sys.stderr)
-    finally:
-        loop.close()
+    """把批次提交到共享调度器的事件循环（立即返回）
+
+    批次的处理参数与"处理中"标记随状态一起写库，进程异常退出后启动时据此自动恢复；
+    服务器配置写库前去掉 API Key（见 redact_servers）。
+    """
+    batch_info = batch_status.get(batch_id)
+
+    def report(future):
+        if batch_info is not None:
+            batch_info['processing'] = False
+        batch_status.mark_idle(batch_id)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"异步处理异常: {str(error)}", file=sys.stderr)
+
+    if batch_info is not None:
+        batch_info['job'] = {'voice': voice, 'speed': speed, 'api_servers': redact_servers(api_servers),
+                             'concurrency': concurrency}
+        batch_info['processing'] = True
+    batch_status.mark_active(batch_id)
+    future = scheduler.submit(
+        process_files_async(batch_id, batch_upload_dir, voice, speed, api_servers, concurrency, specific_files)
+    )
+    future.add_done_callback(report)
+    return future
+
+def resume_interrupted_batches():
+    """启动时恢复上次退出时仍在处理的批次：沿用原 batch_id 与原声音、语速、服务器配置，
+    只重新排队未完成的文件（已完成的文件不会重新合成）。API Key 不入库，按 key_ref 从
+    TTS_RESUME_API_KEYS 取回，缺 Key 的批次不自动恢复"""
+    for batch_id in batch_status.flagged('processing'):
+        batch_info = batch_status.get(batch_id)
+        job = batch_info.get('job') if batch_info else None
+        if not job or not os.path.isdir(batch_info.get('upload_dir') or ''):
+            if batch_info is not None:
+                batch_info['processing'] = False
+            print(f"⚠️ 批次 {batch_id} 缺少处理参数或目录，无法自动恢复")
+            continue
+        api_servers, missing = restore_server_keys(job['api_servers'])
+        if missing:
+            batch_info['processing'] = False
+            print(f"⚠️ 批次 {batch_id} 的服务器 {', '.join(missing)} 缺少 API Key，无法自动恢复；"
+                  f"请在 TTS_RESUME_API_KEYS 中配置后从页面继续处理")
+            continue
+        pending = [file_id for file_id, file_info in batch_info['files'].items()
+                   if file_info.get('status') != 'completed']
+        if not pending:
+            batch_info['processing'] = False
+            continue
+        for file_id in pending:
+            batch_info['files'][file_id].update({'status': 'waiting', 'progress': 0, 'stage': '等待恢复处理'})
+        batch_info['completed_files'] = batch_info['total_files'] - len(pending)
+        batch_info['current_file'] = batch_info['completed_files']
+        print(f"♻️ 恢复中断的批次 {batch_id}: {len(pending)} 个未完成文件重新排队")
+        run_async_processing(batch_id, batch_info['upload_dir'], job['voice'], job['speed'],
+                             api_servers, job['concurrency'], pending)
 
 async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_servers, concurrency, specific_files=None):
     """异步处理文件，支持选择负载均衡器"""
@@ -513,6 +926,49 @@ async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_serv
             completed_tasks = 0
             failed_tasks = []
             retry_queue = asyncio.Queue()  # 失败任务重试队列
+            all_done = asyncio.Event()  # 全部完成（或已无任务可做）时由回调置位
+            
+            def check_all_done():
+                """任务全部完成，或队列为空且没有在途任务时通知等待方"""
+                if completed_tasks >= total_tasks:
+                    all_done.set()
+                    return
+                active_tasks = sum(server_stats[i]['active_tasks'] for i in range(len(api_servers)))
+                if active_tasks == 0 and task_queue.empty() and retry_queue.empty():
+                    print(f"⚠️ 所有任务已完成但计数不匹配，强制退出")
+                    all_done.set()
+                elif active_tasks == 0 and all(breaker.exhausted(i) for i in range(len(api_servers))):
+                    print(f"💥 所有服务器探测多次失败，放弃队列中剩余的任务")
+                    while not retry_queue.empty():
+                        task_queue.put_nowait(retry_queue.get_nowait()['file_id'])
+                    while not task_queue.empty():
+                        file_id = task_queue.get_nowait()
+                        batch_info['files'][file_id]['status'] = 'failed'
+                        batch_info['files'][file_id]['stage'] = '❌ 所有服务器熔断'
+                    all_done.set()
+
+            def on_breaker_change(server_id):
+                """服务器恢复时补满它的并发位；熔断加剧时检查是否已无服务器可用"""
+                batch_info['server_statuses'][server_id].update(breaker.snapshot(server_id))
+                if breaker.allows(server_id):
+                    async def refill():
+                        for _ in range(concurrency - server_stats[server_id]['active_tasks']):
+                            await assign_next_task(server_id)
+                    asyncio.create_task(refill())
+                else:
+                    check_all_done()
+
+            # 熔断器：连续失败的服务器不再分配文件，冷却结束后探测恢复
+            breaker = CircuitBreaker(
+                len(api_servers),
+                probe=lambda server_id: probe_tts_server(session, api_servers[server_id], voice, speed),
+                failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                open_seconds=BREAKER_OPEN_SECONDS,
+                max_open_seconds=BREAKER_MAX_OPEN_SECONDS,
+                on_change=on_breaker_change,
+            )
+            for server_id in range(len(api_servers)):
+                batch_info['server_statuses'][server_id].update(breaker.snapshot(server_id))
             
             print(f"🚀 启动动态负载均衡器:")
             print(f"  📊 总任务数: {total_tasks}")
@@ -545,6 +1001,7 @@ async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_serv
                     print(f"⏰ 任务超时检测: {file_id} 耗时 {processing_time:.2f}秒，可能存在问题")
                 
                 if success:
+                    breaker.on_success(server_id)
                     server_stats[server_id]['completed_tasks'] += 1
                     batch_info['server_statuses'][server_id]['completed_tasks'] = server_stats[server_id]['completed_tasks']
                     completed_tasks += 1
@@ -553,6 +1010,8 @@ async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_serv
                     batch_info['current_file'] = completed_tasks
                     print(f"✅ 任务完成: {file_id} (服务器: {api_servers[server_id]['name']}, 耗时: {processing_time:.2f}秒)")
                 else:
+                    if breaker.on_failure(server_id):
+                        print(f"🔌 服务器 {api_servers[server_id]['name']} 熔断 {BREAKER_OPEN_SECONDS:.0f} 秒 (连续失败 {BREAKER_FAILURE_THRESHOLD} 次)")
                     # 任务失败，加入重试队列（包含失败服务器信息）
                     failed_tasks.append(file_id)
                     retry_info = {
@@ -571,7 +1030,7 @@ async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_serv
                 # 检查是否所有任务都已完成
                 if completed_tasks >= total_tasks:
                     print(f"🎉 所有任务已完成！")
-                    return
+                check_all_done()
             
             # 任务分配函数
             async def assign_next_task(server_id):
@@ -584,6 +1043,9 @@ async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_serv
                 if current_load >= concurrency:
                     print(f"⚠️ 服务器 {server_name} 已满，跳过任务分配")
                     return  # 服务器已满
+                if not breaker.allows(server_id):
+                    print(f"🔌 服务器 {server_name} 熔断中，恢复后再分配")
+                    return
                 
                 # 优先从重试队列获取失败的任务
                 file_id = None
@@ -662,17 +1124,10 @@ async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_serv
             # 等待所有任务完成（事件驱动，无需轮询）
             print(f"🎯 启动事件驱动负载均衡，等待任务完成...")
             
-            # 创建任务完成等待器
-            async def wait_for_completion():
-                while completed_tasks < total_tasks:
-                    # 检查是否有活跃任务
-                    active_tasks = sum(server_stats[i]['active_tasks'] for i in range(len(api_servers)))
-                    if active_tasks == 0 and task_queue.empty() and retry_queue.empty():
-                        print(f"⚠️ 所有任务已完成但计数不匹配，强制退出")
-                        break
-                    await asyncio.sleep(0.5)  # 减少检查频率
-            
-            await wait_for_completion()
+            # 等待完成回调置位，不再定时检查
+            check_all_done()
+            await all_done.wait()
+            breaker.close()
             
             total_time = time.time() - start_time
             print(f"🎉 动态负载均衡处理完成 (总耗时: {total_time:.2f}秒)")
@@ -703,313 +1158,6 @@ async def process_files_async(batch_id, batch_upload_dir, voice, speed, api_serv
         print(f"🎉 异步处理完成: {success_count}/{len(files_to_process)} 个文件成功")
         print(f"📊 使用了 {len(api_servers)} 个服务器，并发度: {concurrency}")
 
-async def dynamic_worker_balancer_v4(batch_id, batch_upload_dir, voice, speed, api_servers, specific_files=None):
-    """V4：基于持久化工作节点与队列的事件驱动动态负载均衡。"""
-    if batch_id not in batch_status:
-        return
-
-    batch_info = batch_status[batch_id]
-
-    # 1) 任务列表
-    files_to_process = specific_files or list(batch_info['files'].keys())
-    total_tasks_count = len(files_to_process)
-
-    warmup_primary = max(10, MAX_CONCURRENCY * 2)
-    warmup_secondary = max(10, MAX_CONCURRENCY)
-    WARMUP_COUNT = min(total_tasks_count, warmup_primary)
-    SECOND_STAGE_COUNT = max(0, min(total_tasks_count - WARMUP_COUNT, warmup_secondary))
-
-    print("🚀 启动动态工作节点负载均衡器 (V4):")
-    print(f"  📊 总任务数: {total_tasks_count}")
-    print(f"  🖥️ 服务器节点数: {len(api_servers)}")
-
-    # 初始化 WebUI 服务器状态
-    batch_info['server_statuses'] = {}
-    for i, server in enumerate(api_servers):
-        batch_info['server_statuses'][i] = {
-            'name': server.get('name', f'Server-{i}'),
-            'status': 'idle',
-            'load': 0,
-            'max_load': 1,
-            'completed_tasks': 0,
-            'timeout_tasks': 0,
-            'failed_tasks': 0,
-            'total_time': 0.0,
-        }
-
-    # 2) 队列：放 (file_id, retry_count)
-    MAX_RETRIES = 3
-    task_queue = asyncio.Queue()
-    for file_id in files_to_process:
-        task_queue.put_nowait((file_id, 0))
-
-    # 停止信号（每个工作节点一个）
-    STOP_SIGNAL = object()
-    for _ in range(len(api_servers)):
-        task_queue.put_nowait(STOP_SIGNAL)
-
-    batch_info['completed_files'] = 0
-
-    # 3) 工作节点定义
-    async def worker_node(server_id, server_info):
-        server_name = server_info.get('name', f"Server-{server_id}")
-        server_url = server_info.get('url')
-        api_key = server_info.get('apiKey', server_info.get('api_key', ''))
-        stats = {'success': 0, 'fail': 0, 'total_time': 0.0}
-
-        print(f"👷 工作节点 {server_name} 已启动并待命。")
-
-        async with aiohttp.ClientSession() as session:
-            while True:
-                task = await task_queue.get()
-
-                if task is STOP_SIGNAL:
-                    task_queue.task_done()
-                    break
-
-                file_id, retry_count = task
-                if batch_id not in batch_status or file_id not in batch_status[batch_id]['files']:
-                    task_queue.task_done()
-                    continue
-
-                filename = batch_info['files'][file_id]['filename']
-                batch_info['files'][file_id]['stage'] = f'处理中 @{server_name}'
-                batch_info['files'][file_id]['status'] = 'processing'
-
-                # WebUI：节点负载更新
-                batch_info['server_statuses'][server_id]['status'] = 'busy'
-                batch_info['server_statuses'][server_id]['load'] = 1
-
-                print(f"  -> 节点 {server_name} 接收任务: {filename} (第 {retry_count + 1} 次尝试)")
-
-                start_time = time.time()
-                success = False
-                status_code = None
-                try:
-                    input_path = os.path.join(batch_upload_dir, filename)
-                    output_path = os.path.join(batch_upload_dir, filename.replace('.md', '.mp3'))
-                    with open(input_path, 'r', encoding='utf-8') as f:
-                        text = f.read()
-
-                    # 若设置GLOBAL_CONCURRENCY_LIMIT>0，则启用总闸门；否则直接调用
-                    if global_api_semaphore is not None:
-                        async with global_api_semaphore:
-                            success, status_code, error_detail = await async_text_to_speech(
-                                session, text, output_path, voice, speed, server_url, api_key, timeout_seconds=300
-                            )
-                    else:
-                        success, status_code, error_detail = await async_text_to_speech(
-                            session, text, output_path, voice, speed, server_url, api_key, timeout_seconds=300
-                        )
-                    if not success:
-                        raise Exception("API返回非200状态码")
-
-                except Exception as e:
-                    if status_code is not None:
-                        print(f"❌ 节点 {server_name} 任务失败: {filename}, 状态码: {status_code}, 原因: {type(e).__name__}")
-                    else:
-                        print(f"❌ 节点 {server_name} 任务失败: {filename}, 原因: {type(e).__name__}")
-
-                processing_time = time.time() - start_time
-
-                # 统计与UI更新
-                batch_info['server_statuses'][server_id]['total_time'] += processing_time
-
-                if success:
-                    stats['success'] += 1
-                    stats['total_time'] += processing_time
-                    batch_info['files'][file_id]['status'] = 'completed'
-                    batch_info['files'][file_id]['stage'] = '✅ 完成'
-                    batch_info['completed_files'] += 1
-                    batch_info['current_file'] = batch_info['completed_files']
-                    batch_info['server_statuses'][server_id]['completed_tasks'] += 1
-                    print(f"✅ 任务完成: {filename} (服务器: {server_name}, 耗时: {processing_time:.2f}秒)")
-                else:
-                    stats['fail'] += 1
-                    if retry_count < MAX_RETRIES:
-                        # 指数退避 + 抖动
-                        delay = (2 ** retry_count) + random.uniform(0, 1)
-                        print(f"🔄 任务将重试 (第 {retry_count+1} 次)，将在 {delay:.2f} 秒后执行... [{filename}]")
-                        # 延迟后放回队列，不绑定同一节点
-                        async def requeue_after_delay(delay_s: float, item):
-                            await asyncio.sleep(delay_s)
-                            await task_queue.put(item)
-                        asyncio.create_task(requeue_after_delay(delay, (file_id, retry_count + 1)))
-                        batch_info['files'][file_id]['stage'] = f'等待重试 ({retry_count+1}/{MAX_RETRIES})'
-                    else:
-                        batch_info['files'][file_id]['status'] = 'failed'
-                        batch_info['files'][file_id]['stage'] = '❌ 失败 (已达上限)'
-                        batch_info['completed_files'] += 1
-                        batch_info['current_file'] = batch_info['completed_files']
-
-                task_queue.task_done()
-                # WebUI：节点恢复空闲
-                batch_info['server_statuses'][server_id]['load'] = 0
-                batch_info['server_statuses'][server_id]['status'] = 'idle'
-
-        print(f"🏁 节点 {server_name} 停止。统计: 成功 {stats['success']}, 失败 {stats['fail']}.")
-
-    # 4) 启动所有工作节点（每台服务器一个并发=1的节点）
-    worker_tasks = [asyncio.create_task(worker_node(i, s)) for i, s in enumerate(api_servers)]
-
-    # 5) 等待所有任务完成
-    await task_queue.join()
-    await asyncio.gather(*worker_tasks)
-
-    print("🎉 V4 动态负载均衡器处理完成！")
-
-async def dynamic_worker_balancer_v4_1(batch_id, batch_upload_dir, voice, speed, api_servers, specific_files=None):
-    """V4.1：修复工作节点生命周期，使用stop_event实现动态竞争与优雅退出。"""
-    if batch_id not in batch_status:
-        return
-
-    batch_info = batch_status[batch_id]
-
-    MAX_RETRIES = 3
-    files_to_process = specific_files or list(batch_info['files'].keys())
-    total_tasks_count = len(files_to_process)
-
-    print("🚀 启动动态工作节点负载均衡器 (V4.1 - 补丁版):")
-    print(f"  📊 总任务数: {total_tasks_count}")
-    print(f"  🖥️ 服务器节点数: {len(api_servers)}")
-
-    # 初始化 WebUI 服务器状态
-    batch_info['server_statuses'] = {}
-    for i, server in enumerate(api_servers):
-        batch_info['server_statuses'][i] = {
-            'name': server.get('name', f'Server-{i}'),
-            'status': 'idle',
-            'load': 0,
-            'max_load': 1,
-            'completed_tasks': 0,
-            'timeout_tasks': 0,
-            'failed_tasks': 0,
-            'total_time': 0.0,
-        }
-
-    # 任务队列：仅放普通任务
-    task_queue = asyncio.Queue()
-    for file_id in files_to_process:
-        task_queue.put_nowait((file_id, 0))
-
-    # 停止事件：由监控协程在队列完成后统一发出
-    stop_event = asyncio.Event()
-
-    batch_info['completed_files'] = 0
-
-    async def worker_node(server_id, server_info):
-        server_name = server_info.get('name', f"Server-{server_id}")
-        server_url = server_info.get('url')
-        api_key = server_info.get('apiKey', server_info.get('api_key', ''))
-        stats = {'success': 0, 'fail': 0, 'total_time': 0.0}
-
-        print(f"👷 工作节点 {server_name} 已启动并进入监听循环。")
-
-        async with aiohttp.ClientSession() as session:
-            while not stop_event.is_set():
-                try:
-                    task = await asyncio.wait_for(task_queue.get(), timeout=1.0)
-                except asyncio.TimeoutError:
-                    continue
-                except asyncio.CancelledError:
-                    break
-
-                # 解析任务
-                try:
-                    file_id, retry_count = task
-                except Exception:
-                    task_queue.task_done()
-                    continue
-
-                if batch_id not in batch_status or file_id not in batch_status[batch_id]['files']:
-                    task_queue.task_done()
-                    continue
-
-                filename = batch_info['files'][file_id]['filename']
-                batch_info['files'][file_id]['stage'] = f'处理中 @{server_name}'
-                batch_info['files'][file_id]['status'] = 'processing'
-
-                # WebUI：节点置为忙碌
-                batch_info['server_statuses'][server_id]['status'] = 'busy'
-                batch_info['server_statuses'][server_id]['load'] = 1
-
-                print(f"  -> 节点 {server_name} 接收任务: {filename} (第 {retry_count + 1} 次尝试)")
-
-                start_time = time.time()
-                success = False
-                status_code = None
-                try:
-                    input_path = os.path.join(batch_upload_dir, filename)
-                    output_path = os.path.join(batch_upload_dir, filename.replace('.md', '.mp3'))
-                    with open(input_path, 'r', encoding='utf-8') as f:
-                        text = f.read()
-
-                    success, status_code, error_detail = await async_text_to_speech(
-                        session, text, output_path, voice, speed, server_url, api_key, timeout_seconds=300
-                    )
-                    if not success:
-                        raise Exception("API返回非200状态码")
-
-                except Exception as e:
-                    if status_code is not None:
-                        print(f"❌ 节点 {server_name} 任务失败: {filename}, 状态码: {status_code}, 原因: {type(e).__name__}")
-                    else:
-                        print(f"❌ 节点 {server_name} 任务失败: {filename}, 原因: {type(e).__name__}")
-
-                processing_time = time.time() - start_time
-
-                # 统计时间
-                batch_info['server_statuses'][server_id]['total_time'] += processing_time
-
-                if success:
-                    stats['success'] += 1
-                    stats['total_time'] += processing_time
-                    batch_info['files'][file_id]['status'] = 'completed'
-                    batch_info['files'][file_id]['stage'] = '✅ 完成'
-                    batch_info['completed_files'] += 1
-                    batch_info['current_file'] = batch_info['completed_files']
-                    batch_info['server_statuses'][server_id]['completed_tasks'] += 1
-                    print(f"✅ 任务完成: {filename} (服务器: {server_name}, 耗时: {processing_time:.2f}秒)")
-                else:
-                    stats['fail'] += 1
-                    if retry_count < MAX_RETRIES:
-                        delay = (2 ** retry_count) + random.uniform(0, 1)
-                        print(f"🔄 任务将重试 (第 {retry_count+1} 次)，将在 {delay:.2f} 秒后执行... [{filename}]")
-                        async def requeue_after_delay(delay_s: float, item):
-                            await asyncio.sleep(delay_s)
-                            await task_queue.put(item)
-                        asyncio.create_task(requeue_after_delay(delay, (file_id, retry_count + 1)))
-                        batch_info['files'][file_id]['stage'] = f'等待重试 ({retry_count+1}/{MAX_RETRIES})'
-                    else:
-                        batch_info['files'][file_id]['status'] = 'failed'
-                        batch_info['files'][file_id]['stage'] = '❌ 失败 (已达上限)'
-                        batch_info['completed_files'] += 1
-                        batch_info['current_file'] = batch_info['completed_files']
-
-                # 标记任务处理完成（无论成功失败）
-                task_queue.task_done()
-                # 节点恢复空闲
-                batch_info['server_statuses'][server_id]['load'] = 0
-                batch_info['server_statuses'][server_id]['status'] = 'idle'
-
-        print(f"🏁 节点 {server_name} 收到停止信号并退出。统计: 成功 {stats['success']}, 失败 {stats['fail']}")
-
-    # 启动所有工作节点
-    worker_tasks = [asyncio.create_task(worker_node(i, s)) for i, s in enumerate(api_servers)]
-
-    # 监控完成：队列清空后发出停止事件
-    async def monitor_completion():
-        await task_queue.join()
-        print("✅ 所有任务已处理完成，向所有工作节点发送停止信号...")
-        stop_event.set()
-
-    await monitor_completion()
-
-    # 等待所有工作者优雅退出
-    await asyncio.gather(*worker_tasks, return_exceptions=True)
-
-    print("🎉 V4.1 负载均衡器处理完成！")
-
 async def dispatcher_balancer_v5(batch_id, batch_upload_dir, voice, speed, api_servers, concurrency, specific_files=None):
     return await dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api_servers, concurrency, specific_files)
 
@@ -1033,18 +1181,21 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
             print(f"⚠️ 无法解析 BALANCER_MAX_CONCURRENCY={env_limit_raw!r}，忽略该限制。")
             env_limit = 0
 
+    # 每台服务器的并发由 AIMD 自适应，全局上限只在显式配置时收紧
     if env_limit > 0:
-        MAX_CONCURRENCY = max(1, min(env_limit, total_workers))
+        MAX_CONCURRENCY = max(1, env_limit)
     else:
-        MAX_CONCURRENCY = total_workers
+        MAX_CONCURRENCY = total_workers * max(1, SERVER_MAX_CONCURRENCY)
 
 
     INITIAL_DISPATCH_INTERVAL = 1.0
     SECOND_STAGE_INTERVAL = 0.5
-    NORMAL_DISPATCH_INTERVAL = 0.2
+    # 稳态不节流：有空闲服务器就立即派发，只在预热或失败率升高时拉开派发间隔
+    NORMAL_DISPATCH_INTERVAL = 0.0
     MAX_RETRIES = 6
     RATE_LIMIT_MAX_RETRIES = 10
     TIMEOUT_MAX_RETRIES = 6
+    DISPATCH_WINDOW = 32  # 按吞吐模型挑选任务时考察的队首任务数
 
     # 预热阶段任务数量根据并发和总任务自适应
     WARMUP_COUNT = 0
@@ -1063,31 +1214,294 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
     files_to_process = specific_files or list(batch_info['files'].keys())
     total_tasks_count = len(files_to_process)
 
-    warmup_primary = max(10, MAX_CONCURRENCY * 2)
-    warmup_secondary = max(10, MAX_CONCURRENCY)
-    WARMUP_COUNT = min(total_tasks_count, warmup_primary)
-    SECOND_STAGE_COUNT = max(0, min(total_tasks_count - WARMUP_COUNT, warmup_secondary))
+    # 派发前预处理：音频缓存命中的文件直接完成，不占用服务器；
+    # 分段合成：超出字符预算的文件拆成多个分段任务，分段并行派发后按序合并；
+    # 增量合成：按段落分段并复用目录内已有的分段音频，只派发内容变化的段落；
+    # 客户端清洗：本地清洗一次后只提交清洗结果，服务端清洗全部关闭；
+    # 同时统计每个任务的字符数，供最长任务优先派发与完成时间预测
+    chunk_max_chars = int(batch_info.get('chunk_max_chars', CHUNK_MAX_CHARS) or 0)
+    incremental = bool(batch_info.get('incremental'))
+    client_cleaning = bool(batch_info.get('client_cleaning', CLIENT_SIDE_CLEANING))
+    request_cleaning = CLIENT_CLEANING_DISABLED if client_cleaning else None
+    segment_store = SegmentStore(batch_upload_dir) if incremental else None
+    synthesis_params = {'voice': voice, 'speed': float(speed)}
+    chunk_texts = {}
+    chunk_paths = {}
+    pending_chunks = {}
+    prepared_texts = {}  # file_id -> 客户端清洗后待提交的整文件文本
+    incremental_plans = {}  # file_id -> (源内容哈希, 分段键列表)
+    cached_files = []
+    rebuild_files = []
+    empty_files = []
+    task_ids = []
+    task_chars = {}  # task_id -> 提交字符数
+    total_chars = 0
+
+    async def load_sources(file_ids):
+        """按窗口并行读取文件（客户端清洗时一并清洗），按原顺序产出 (file_id, 原文, 清洗结果)"""
+        loop = asyncio.get_running_loop()
+        # 大批次用进程池并行清洗，小批次放在默认线程池，省去进程间传输
+        executor = (
+            get_cleaning_pool()
+            if client_cleaning and len(file_ids) >= CLIENT_CLEANING_POOL_THRESHOLD else None
+        )
+
+        async def load(file_id):
+            path = os.path.join(batch_upload_dir, batch_info['files'][file_id]['filename'])
+            text = await loop.run_in_executor(None, read_text_file, path)
+            prepared = None
+            if client_cleaning:
+                prepared = await loop.run_in_executor(executor, clean_text_client, text, CLIENT_CLEANING_OPTIONS)
+            return text, prepared
+
+        for start in range(0, len(file_ids), PREPASS_WINDOW):
+            window = file_ids[start:start + PREPASS_WINDOW]
+            results = await asyncio.gather(*(load(file_id) for file_id in window), return_exceptions=True)
+            for file_id, result in zip(window, results):
+                if isinstance(result, BaseException):
+                    yield file_id, result, None
+                else:
+                    yield file_id, *result
+
+    prepass_files = [file_id for file_id in files_to_process if file_id in batch_info['files']]
+    task_ids.extend(file_id for file_id in files_to_process if file_id not in batch_info['files'])
+
+    # 事件循环由所有批次共用：预处理中的分段规划、缓存键计算、文件读写与缓存查找都放到线程池，不阻塞其他批次
+    loop = asyncio.get_running_loop()
+    if segment_store is not None:
+        # 创建分段目录并登记为活动批次；清单只在这里读取一次，之后的检查都使用内存中的副本
+        await loop.run_in_executor(None, segment_store.attach)
+
+    def missing_segments(keys, paths):
+        """目录存储与音频缓存中都没有的分段编号（有缓存时复制到目录存储）"""
+        return {
+            index for index, (key, path) in enumerate(zip(keys, paths))
+            if not os.path.exists(path)
+            and not (audio_cache is not None and audio_cache.fetch(key, path))
+        }
+
+    def plan_file(filename, text, prepared):
+        """单个文件的派发计划（在线程池中执行：清洗、分段、缓存键哈希与文件检查都不占用事件循环）
+
+        返回 ('cached',)、('chunks', 分段文本, 分段路径, 待合成编号, 增量计划) 或 ('whole', 提交文本)
+        """
+        output_path = os.path.join(batch_upload_dir, filename.replace('.md', '.mp3'))
+        if incremental:
+            source_hash = text_digest(text)
+            if segment_store.is_current(filename, source_hash, synthesis_params) and os.path.exists(output_path):
+                return ('cached',)
+            segments = plan_paragraph_segments(
+                prepared if client_cleaning else text,
+                chunk_max_chars or INCREMENTAL_SEGMENT_MAX_CHARS,
+                precleaned=client_cleaning,
+            )
+            if segments:
+                keys = [audio_cache_key(segment, voice, speed, cleaning_options=request_cleaning) for segment in segments]
+                paths = [segment_store.segment_path(key) for key in keys]
+                return ('chunks', segments, paths, missing_segments(keys, paths), (source_hash, keys))
+        request_text = collapse_whitespace(prepared) if client_cleaning else text
+        if audio_cache is not None and not incremental:
+            cache_key = audio_cache_key(request_text, voice, speed, cleaning_options=request_cleaning)
+            if audio_cache.fetch(cache_key, output_path):
+                return ('cached',)
+        if chunk_max_chars > 0:
+            chunks = plan_text_chunks(prepared if client_cleaning else text, chunk_max_chars, precleaned=client_cleaning)
+        else:
+            chunks = []
+        if len(chunks) > 1:
+            segment_dir = chunk_segment_dir(batch_upload_dir, filename)
+            paths = [os.path.join(segment_dir, f'{index:05d}.mp3') for index in range(len(chunks))]
+            # 分段目录按序号命名、内容可能已过时，先清空；再逐段查音频缓存，只派发未命中的分段
+            remove_chunk_segments(batch_upload_dir, filename)
+            if audio_cache is not None:
+                keys = [audio_cache_key(chunk, voice, speed, cleaning_options=request_cleaning) for chunk in chunks]
+                os.makedirs(segment_dir, exist_ok=True)
+                missing = missing_segments(keys, paths)
+            else:
+                missing = set(range(len(chunks)))
+            return ('chunks', chunks, paths, missing, None)
+        return ('whole', request_text)
+
+    async for file_id, text, prepared in load_sources(prepass_files):
+        filename = batch_info['files'][file_id]['filename']
+        if isinstance(text, BaseException):
+            print(f"⚠️ 预处理读取失败，按整文件处理: {filename} -> {text}")
+            task_ids.append(file_id)
+            continue
+        if client_cleaning and not prepared:
+            empty_files.append(file_id)
+            continue
+        plan = await loop.run_in_executor(None, plan_file, filename, text, prepared)
+        if plan[0] == 'cached':
+            cached_files.append(file_id)
+        elif plan[0] == 'chunks':
+            _, chunks, paths, missing, incremental_plan = plan
+            chunk_texts[file_id] = chunks
+            chunk_paths[file_id] = paths
+            pending_chunks[file_id] = missing
+            if incremental_plan is not None:
+                incremental_plans[file_id] = incremental_plan
+            for index in missing:
+                task_chars[(file_id, index)] = len(chunks[index])
+                total_chars += len(chunks[index])
+            if missing:
+                task_ids.extend((file_id, index) for index in sorted(missing))
+            else:
+                rebuild_files.append(file_id)
+        else:
+            request_text = plan[1]
+            if client_cleaning:
+                prepared_texts[file_id] = request_text
+            task_chars[file_id] = len(request_text)
+            total_chars += len(request_text)
+            task_ids.append(file_id)
+
+    batch_info['total_chars'] = total_chars
+
+    warmup_primary = max(10, total_workers * 2)
+    warmup_secondary = max(10, total_workers)
+    WARMUP_COUNT = min(len(task_ids), warmup_primary)
+    SECOND_STAGE_COUNT = max(0, min(len(task_ids) - WARMUP_COUNT, warmup_secondary))
+    if HEALTH_PROBE_ENABLED:
+        # 服务器的可用性与速度由开跑前的健康探测校准，不再用真实文件慢速预热
+        WARMUP_COUNT = SECOND_STAGE_COUNT = 0
 
     if env_limit > 0:
         concurrency_source = f"环境限制 {env_limit}"
     else:
-        concurrency_source = f"可用节点 {total_workers}"
+        concurrency_source = f"可用节点 {total_workers} × 单机上限 {SERVER_MAX_CONCURRENCY}"
 
     print("🚀 启动精细化调度官 (V5.1):")
     print(f"  🎯 全局并发上限: {MAX_CONCURRENCY} ({concurrency_source})")
     print(f"  ⏱️ 预热/正常间隔: {INITIAL_DISPATCH_INTERVAL}s / {NORMAL_DISPATCH_INTERVAL}s")
-    print(f"  🔄 次级预热间隔: 前{WARMUP_COUNT}个 -> {INITIAL_DISPATCH_INTERVAL}s, 后续{SECOND_STAGE_COUNT}个 -> {SECOND_STAGE_INTERVAL}s")
+    print(f"  🏷️ 批次优先级: {parse_priority(batch_info.get('priority'))}")
+    if HEALTH_PROBE_ENABLED:
+        print(f"  🩺 健康探测: 开跑前校准各服务器，空闲服务器每 {HEALTH_PROBE_INTERVAL:.0f}s 复查 (取代预热)")
+    else:
+        print(f"  🔄 次级预热间隔: 前{WARMUP_COUNT}个 -> {INITIAL_DISPATCH_INTERVAL}s, 后续{SECOND_STAGE_COUNT}个 -> {SECOND_STAGE_INTERVAL}s")
+    if chunk_texts:
+        chunk_count = sum(len(chunks) for chunks in chunk_texts.values())
+        pending_count = sum(1 for task_id in task_ids if isinstance(task_id, tuple))
+        print(f"  ✂️ 分段合成: {len(chunk_texts)} 个文件拆分为 {chunk_count} 个分段 (待合成 {pending_count} 个)")
+    if client_cleaning:
+        print(f"  🧹 客户端清洗: 待提交 {total_chars} 字符，服务端清洗已关闭")
+    if HEDGING_ENABLED:
+        print(f"  🪁 对冲请求: 超过 P{HEDGE_QUANTILE * 100:.0f} 耗时后补发副本，预算 {HEDGE_BUDGET:.0%}")
 
     # --- 2. 初始化队列和控制器 ---
-    task_queue = asyncio.Queue()
-    for file_id in files_to_process:
-        task_queue.put_nowait((file_id, 0))
-
-    worker_queue = asyncio.Queue()
+    # 最长任务优先：大文件/大分段先派发，小任务在批次尾部填补空闲服务器，缩短整体完成时间
+    task_queue = LongestFirstQueue(task_chars)
+    for task_id in task_ids:
+        task_queue.put_nowait((task_id, 0))
+
+    # 每台服务器的并发上限由 AIMD 学习：成功且延迟平稳时加性增加，429/503/超时时减半。
+    # idle_tokens 中每个元素是一个并发令牌（服务器编号），令牌数跟随上限增减
+    concurrency_limiter = AIMDLimiter(len(api_servers), max_limit=SERVER_MAX_CONCURRENCY)
+    idle_tokens = []
+    server_tokens = [0] * len(api_servers)    # 已发放的令牌数（空闲令牌 + 在途）
+    server_inflight = [0] * len(api_servers)  # 在途请求数
+
+    def sync_tokens(server_id):
+        """上限提高时补发令牌"""
+        while server_tokens[server_id] < concurrency_limiter.limit(server_id):
+            server_tokens[server_id] += 1
+            idle_tokens.append(server_id)
+            wakeup.notify()
+
+    def release_token(server_id):
+        """请求结束归还令牌；上限已下调时回收多余的令牌，并归还共享调度器的全局并发位"""
+        share.release(server_id)
+        if server_tokens[server_id] > concurrency_limiter.limit(server_id):
+            server_tokens[server_id] -= 1
+        else:
+            idle_tokens.append(server_id)
+        sync_tokens(server_id)
+        wakeup.notify()
+
+    def enqueue(item):
+        """任务（重新）入队并唤醒调度器"""
+        task_queue.put_nowait(item)
+        wakeup.notify()
+
+    def deliver_retry(item):
+        batch_info['retry_backlog'] = len(retry_queue)
+        enqueue(item)
+
+    def schedule_retry(item, delay):
+        """退避 delay 秒后重新入队；所有待重试任务共用一个按到期时刻排序的堆和一个定时器"""
+        retry_queue.schedule(item, delay)
+        batch_info['retry_backlog'] = len(retry_queue)
+
+    retry_queue = DelayedRetryQueue(deliver_retry)
+    batch_info['retry_backlog'] = 0
+
+    # 事件驱动调度：入队、令牌归还、上限变化都会唤醒调度器，任务与空位同时具备时立即派发
+    wakeup = WakeupSignal()
+    # 共享调度器的全局并发位：其他批次也在使用同一台服务器时按批次公平分配，归还时唤醒本批次
+    share = scheduler.attach(batch_id, api_servers, wakeup, priority=parse_priority(batch_info.get('priority')))
     for i in range(len(api_servers)):
-        worker_queue.put_nowait(i)
+        sync_tokens(i)
+
+    active_requests = 0  # 全局在途请求数，不超过 MAX_CONCURRENCY
+
+    # 对冲请求：task_id -> 可对冲的在途请求；副本数受 HEDGE_BUDGET 约束
+    hedge_records = {}
+    hedges_launched = 0
+    batch_info['hedge_stats'] = {'launched': 0, 'won': 0}
+
+    # 每台服务器的字符吞吐估计：派发时为任务挑选预计完成时间最早的服务器
+    throughput = ThroughputModel(len(api_servers))
+
+    # 按服务器限流：429/503 时按 Retry-After 暂停整台服务器，并用令牌桶约束其请求/字符速率
+    rate_limiter = ServerRateLimiter(len(api_servers))
+
+    # 熔断：连续失败的服务器不再接收真实文件，冷却后由探测请求确认恢复
+    def on_breaker_change(server_id):
+        refresh_server_load(server_id)
+        wakeup.notify()
+
+    breaker = CircuitBreaker(
+        len(api_servers),
+        probe=lambda server_id: probe_tts_server(
+            session_pool.session_for(server_id), api_servers[server_id], voice, speed,
+            on_throttled=lambda meta: rate_limiter.pause(server_id, meta)
+        ),
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        open_seconds=BREAKER_OPEN_SECONDS,
+        max_open_seconds=BREAKER_MAX_OPEN_SECONDS,
+        on_change=on_breaker_change,
+    )
 
-    concurrency_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    # 健康探测：开跑前校准各服务器并预置吞吐估计，校准完成前不分配文件；探测失败即熔断
+    def on_probe_result(server_id, result):
+        server_name = api_servers[server_id].get('name')
+        status = batch_info['server_statuses'][server_id]
+        status.update(prober.snapshot(server_id))
+        if result.get('status_code') == 429:
+            # 探测请求不经过令牌桶，没有发送记录可供学习速率，只按 Retry-After 暂停
+            pause = rate_limiter.pause(server_id, result.get('meta'))
+            print(f"🩺 {server_name} 探测被限流，暂停 {pause:.0f}s")
+        elif result['ok']:
+            throughput.seed(server_id, result.get('chars_per_sec') or 0)
+            print(f"🩺 {server_name} 探测正常: 首字节 {result.get('ttfb') or 0:.2f}s，吞吐 {result.get('chars_per_sec') or 0:.1f} 字/秒")
+        elif breaker.trip(server_id):
+            print(f"🩺 {server_name} 探测失败 ({result.get('error')})，熔断，暂不分配文件")
+        refresh_server_load(server_id)
+        wakeup.notify()
+
+    prober = HealthProber(
+        len(api_servers),
+        measure=lambda server_id: measure_tts_server(session_pool.session_for(server_id), api_servers[server_id], HEALTH_PROBE_TEXT, voice, speed),
+        on_result=on_probe_result,
+        interval=HEALTH_PROBE_INTERVAL,
+        should_probe=lambda server_id: breaker.allows(server_id) and server_inflight[server_id] == 0,
+    )
+
+    def available_at(server_id, now=None):
+        """服务器最早可接收真实文件的时刻：熔断中或尚未完成校准视为不可用，否则取限流器的时刻"""
+        if not breaker.allows(server_id) or prober.calibrating(server_id):
+            return float('inf')
+        return rate_limiter.ready_at(server_id, now)
 
     batch_info['server_statuses'] = {}
     for i, server in enumerate(api_servers):
@@ -1095,13 +1509,22 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
             'name': server.get('name', f'Server-{i}'),
             'status': 'idle',
             'load': 0,
-            'max_load': 1,
             'completed_tasks': 0,
             'timeout_tasks': 0,
             'failed_tasks': 0,
             'total_time': 0.0,
+            **concurrency_limiter.snapshot(i),
+            **throughput.snapshot(i),
+            **rate_limiter.snapshot(i),
+            **breaker.snapshot(i),
+            **prober.snapshot(i),
         }
 
+    # 批次级连接池：每台服务器复用一个长连接会话，连接数按并发天花板预留
+    session_pool = ServerSessionPool(api_servers, default_capacity=SERVER_MAX_CONCURRENCY)
+    for i in range(len(api_servers)):
+        session_pool.set_capacity(i, SERVER_MAX_CONCURRENCY)
+
     completion_event = asyncio.Event()
     finished_files = set()
 
@@ -1111,6 +1534,25 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
     rate_limit_counters = defaultdict(int)
     timeout_counters = defaultdict(int)
 
+    # 预计完成时间：按已完成字符的整体吞吐外推剩余字符
+    remaining_chars = sum(task_chars.get(task_id, 0) for task_id in task_ids)
+    done_chars = 0
+    dispatch_started = time.time()
+    batch_info['eta_seconds'] = None
+    batch_info['projected_finish'] = None
+
+    def account_chars(chars, done):
+        """登记任务离开队列（完成或放弃）的字符数并刷新完成时间预测"""
+        nonlocal remaining_chars, done_chars
+        remaining_chars = max(0, remaining_chars - chars)
+        if done:
+            done_chars += chars
+        elapsed = time.time() - dispatch_started
+        if done_chars > 0 and elapsed > 0:
+            eta = remaining_chars / (done_chars / elapsed)
+            batch_info['eta_seconds'] = round(eta, 1)
+            batch_info['projected_finish'] = time.time() + eta
+
     async def update_rate_metrics(success: bool):
         nonlocal adaptive_interval
         async with metrics_lock:
@@ -1135,124 +1577,399 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
                     print(f"✅ 失败率回落至 {failure_rate:.0%}，派发间隔回调至 {new_interval:.2f}s")
                 adaptive_interval = new_interval
 
-    batch_info['completed_files'] = 0
+    # 只处理部分文件（重试、恢复中断的批次）时，其余文件已处于终态，计入已完成
+    batch_info['completed_files'] = max(0, batch_info['total_files'] - total_tasks_count)
+    batch_info['current_file'] = batch_info['completed_files']
+
+    def finish_file(file_id):
+        """文件进入终态（成功或失败）：计数并释放分段数据"""
+        if file_id in finished_files:
+            return
+        if batch_info['files'][file_id].get('status') != 'completed':
+            # 失败的文件不再合成，剩余字符从预测中扣除
+            if file_id in pending_chunks:
+                account_chars(sum(task_chars.get((file_id, index), 0) for index in pending_chunks[file_id]), False)
+            else:
+                account_chars(task_chars.get(file_id, 0), False)
+        finished_files.add(file_id)
+        batch_info['completed_files'] += 1
+        batch_info['current_file'] = batch_info['completed_files']
+        prepared_texts.pop(file_id, None)
+        if chunk_texts.pop(file_id, None) is not None:
+            pending_chunks.pop(file_id, None)
+            chunk_paths.pop(file_id, None)
+            # 增量分段保留在目录存储中，供下次复用；普通分段合并后即删除
+            if incremental_plans.pop(file_id, None) is None:
+                asyncio.get_running_loop().run_in_executor(
+                    None, remove_chunk_segments, batch_upload_dir, batch_info['files'][file_id]['filename']
+                )
+
+    for file_id in cached_files:
+        batch_info['files'][file_id]['status'] = 'completed'
+        batch_info['files'][file_id]['stage'] = '✅ 完成 (内容未变化)' if incremental else '✅ 完成 (缓存命中)'
+        finish_file(file_id)
+    if cached_files:
+        print(f"  💾 无需调用API: {len(cached_files)} 个文件已有可复用音频")
+
+    for file_id in empty_files:
+        batch_info['files'][file_id]['status'] = 'failed'
+        batch_info['files'][file_id]['stage'] = '❌ 清洗后没有可朗读的文本'
+        finish_file(file_id)
+    if empty_files:
+        print(f"  ⚠️ 清洗后为空: {len(empty_files)} 个文件未提交")
+
+    async def complete_chunk(file_id, chunk_index):
+        """登记分段完成；全部分段就绪后按序合并为最终音频"""
+        if file_id in finished_files:
+            return
+        pending = pending_chunks[file_id]
+        pending.discard(chunk_index)
+        chunks = chunk_texts[file_id]
+        file_info = batch_info['files'][file_id]
+        file_info['stage'] = f'分段完成 ({len(chunks) - len(pending)}/{len(chunks)})'
+        if pending:
+            return
+
+        await assemble_file(file_id)
+
+    async def assemble_file(file_id):
+        """按序合并分段音频为最终文件；增量模式下同时更新目录清单"""
+        file_info = batch_info['files'][file_id]
+        filename = file_info['filename']
+        segment_paths = chunk_paths[file_id]
+        output_path = os.path.join(batch_upload_dir, filename.replace('.md', '.mp3'))
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, concat_audio_segments, segment_paths, output_path)
+            if file_id in incremental_plans:
+                source_hash, keys = incremental_plans[file_id]
+                await loop.run_in_executor(
+                    None, segment_store.record, filename, source_hash, synthesis_params, keys
+                )
+            file_info['status'] = 'completed'
+            file_info['stage'] = '✅ 完成'
+            print(f"✅ 任务完成: {filename} ({len(segment_paths)} 个分段已合并)")
+        except Exception as e:
+            file_info['status'] = 'failed'
+            file_info['stage'] = '❌ 分段合并失败'
+            print(f"❌ 分段合并失败: {filename} -> {e}")
+        finish_file(file_id)
+
+    for file_id in rebuild_files:
+        await assemble_file(file_id)
+    if rebuild_files:
+        print(f"  ♻️ 分段重建: {len(rebuild_files)} 个文件的分段均已存在或缓存命中，直接合并")
+    if len(finished_files) >= total_tasks_count:
+        completion_event.set()
+
+    def refresh_server_load(server_id):
+        server_status = batch_info['server_statuses'][server_id]
+        server_status['load'] = server_inflight[server_id]
+        server_status.update(concurrency_limiter.snapshot(server_id))
+        server_status.update(rate_limiter.snapshot(server_id))
+        server_status.update(breaker.snapshot(server_id))
+        server_status.update(share.snapshot(server_id))
+        if server_inflight[server_id] == 0:
+            server_status['status'] = 'idle'
+        elif server_inflight[server_id] >= server_status['max_load']:
+            server_status['status'] = 'full'
+        else:
+            server_status['status'] = 'busy'
+
+    def failure_kind(status_code, error_detail):
+        """返回 (是否超时, 是否限流)"""
+        error_text = (error_detail or "").lower()
+        is_timeout = (error_detail == 'timeout') or ('timeout' in error_text)
+        is_rate_limited = (
+            status_code in {429, 503}
+            or 'too many requests' in error_text
+            or 'too many subrequests' in error_text
+            or 'rate limit' in error_text
+        )
+        if status_code == 500 and 'too many' in error_text:
+            is_rate_limited = True
+        return is_timeout, is_rate_limited
+
+    async def call_tts(server_id, text, output_path, response_meta):
+        server_info = api_servers[server_id]
+        session = session_pool.session_for(server_id)
+        api_key = server_info.get('apiKey', server_info.get('api_key', ''))
+        # 超时按文本长度与该服务器的实测吞吐计算
+        timeouts = request_timeouts(len(text), throughput.observed_rate(server_id))
+        if global_api_semaphore is not None:
+            async with global_api_semaphore:
+                return await async_text_to_speech(
+                    session, text, output_path, voice, speed, server_info.get('url'), api_key,
+                    cleaning_options=request_cleaning, response_meta=response_meta, **timeouts,
+                )
+        return await async_text_to_speech(
+            session, text, output_path, voice, speed, server_info.get('url'), api_key,
+            cleaning_options=request_cleaning, response_meta=response_meta, **timeouts,
+        )
+
+    async def hedge_attempt(server_id, task_id, record):
+        """对冲副本：占用空闲服务器的一个并发位，结束或被取消时归还"""
+        nonlocal active_requests
+        hedge = record['hedge']
+        try:
+            server_inflight[server_id] += 1
+            refresh_server_load(server_id)
+            result = await call_tts(server_id, record['text'], record['output_path'], hedge['meta'])
+            if not result[0]:
+                is_timeout, is_rate_limited = failure_kind(result[1], result[2])
+                if (is_rate_limited or is_timeout) and concurrency_limiter.on_congestion(server_id, hedge['started']):
+                    print(f"📉 {api_servers[server_id].get('name')} 对冲请求拥塞，并发上限下调至 {concurrency_limiter.limit(server_id)}")
+                if is_rate_limited:
+                    rate_limiter.on_throttled(server_id, hedge['meta'])
+                elif breaker.on_failure(server_id):
+                    print(f"🔌 {api_servers[server_id].get('name')} 连续失败，熔断后等待探测")
+            return result
+        finally:
+            server_inflight[server_id] -= 1
+            active_requests -= 1
+            throughput.finish(server_id, ('hedge', task_id))
+            # 先归还全局并发位，展示的全局在途才是最新的
+            release_token(server_id)
+            refresh_server_load(server_id)
+
+    async def race_attempts(worker_id, task_id, text, output_path, response_meta):
+        """发出主请求；超过高分位耗时后由调度器补发副本，取第一个成功的结果，其余取消。
+
+        返回 (success, status_code, error_detail, 胜出的副本信息或 None)；都失败时返回主请求的结果。
+        """
+        primary = asyncio.create_task(call_tts(worker_id, text, output_path, response_meta))
+        record = {
+            'server': worker_id,
+            'started': time.time(),
+            'chars': task_chars.get(task_id, 0),
+            'text': text,
+            'output_path': output_path,
+            'hedge': None,
+            'hedge_task': None,
+            'changed': asyncio.Event(),
+        }
+        hedge_records[task_id] = record
+        wakeup.notify()
+        winner = None
+        try:
+            while True:
+                attempts = [attempt for attempt in (primary, record['hedge_task']) if attempt is not None]
+                finished = [attempt for attempt in attempts if attempt.done()]
+                winner = next((attempt for attempt in finished if attempt.result()[0]), None)
+                if winner is not None or len(finished) == len(attempts):
+                    break
+                # 等待任一请求结束，或调度器补发了副本
+                changed = asyncio.ensure_future(record['changed'].wait())
+                await asyncio.wait(
+                    [attempt for attempt in attempts if not attempt.done()] + [changed],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                changed.cancel()
+                record['changed'].clear()
+        finally:
+            hedge_records.pop(task_id, None)
+            losers = [attempt for attempt in (primary, record['hedge_task']) if attempt is not None and not attempt.done()]
+            for attempt in losers:
+                attempt.cancel()  # 被取消的请求在 async_text_to_speech 中删除自己的临时文件
+            for attempt in losers:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await attempt
+        if winner is not None and winner is record['hedge_task']:
+            batch_info['hedge_stats']['won'] += 1
+            return (*winner.result(), record['hedge'])
+        return (*primary.result(), None)
+
+    def hedge_time(record):
+        """请求的对冲时刻：开始时刻 + 同长度请求耗时的高分位；样本不足时为 None"""
+        threshold = throughput.latency_quantile(record['chars'], HEDGE_QUANTILE)
+        return None if threshold is None else record['started'] + max(HEDGE_MIN_DELAY, threshold)
+
+    def launch_hedge(now, dispatched_count):
+        """队列已空时，为已超过对冲时刻的在途请求向另一台空闲服务器发送副本；返回是否发出"""
+        nonlocal active_requests, hedges_launched
+        if active_requests >= MAX_CONCURRENCY or hedges_launched + 1 > HEDGE_BUDGET * dispatched_count:
+            return False
+        due = sorted(
+            (hedge_at, task_id) for task_id, hedge_at in (
+                (task_id, hedge_time(record)) for task_id, record in hedge_records.items()
+                if record['hedge_task'] is None
+            )
+            if hedge_at is not None and hedge_at <= now
+        )
+        for _, task_id in due:
+            record = hedge_records[task_id]
+            servers = [
+                server_id for server_id in set(idle_tokens)
+                if server_id != record['server'] and available_at(server_id, now) <= now
+                and share.has_room(server_id)
+            ]
+            if not servers:
+                continue
+            server_id = max(servers, key=throughput.rate)
+            chars = task_chars.get(task_id, 0)
+            idle_tokens.remove(server_id)
+            share.acquire(server_id)
+            active_requests += 1
+            hedges_launched += 1
+            batch_info['hedge_stats']['launched'] = hedges_launched
+            throughput.start(server_id, ('hedge', task_id), chars)
+            rate_limiter.acquire(server_id, chars)
+            record['hedge'] = {'server': server_id, 'started': time.time(), 'meta': {}}
+            record['hedge_task'] = asyncio.create_task(hedge_attempt(server_id, task_id, record))
+            record['changed'].set()
+            print(
+                f"🪁 对冲请求: {task_id} 已运行 {now - record['started']:.1f}s，"
+                f"副本发往 {api_servers[server_id].get('name')} (已发 {hedges_launched} 个，预算 {HEDGE_BUDGET:.0%})"
+            )
+            return True
+        return False
+
+    def next_hedge_at(now, dispatched_count):
+        """下一个待对冲请求的对冲时刻；预算已用完或没有时返回 None"""
+        if hedges_launched + 1 > HEDGE_BUDGET * dispatched_count:
+            return None
+        upcoming = [
+            hedge_at for hedge_at in (
+                hedge_time(record) for record in hedge_records.values() if record['hedge_task'] is None
+            )
+            if hedge_at is not None and hedge_at > now
+        ]
+        return min(upcoming) if upcoming else None
 
-    async def worker(worker_id, file_id, retry_count):
+    async def worker(worker_id, task_id, retry_count):
+        nonlocal active_requests
         server_info = api_servers[worker_id]
         server_name = server_info.get('name', f"Server-{worker_id}")
-        server_url = server_info.get('url')
-        api_key = server_info.get('apiKey', server_info.get('api_key', ''))
 
+        file_id, chunk_index = task_id if isinstance(task_id, tuple) else (task_id, None)
         success = False
         skip_metrics = False
+        counted = False  # 是否已计入服务器在途数
 
         try:
             if batch_id not in batch_status or file_id not in batch_status[batch_id]['files']:
                 skip_metrics = True
                 return
+            if file_id in finished_files:
+                # 同一文件的其他分段已失败，剩余分段不再提交
+                skip_metrics = True
+                return
 
             filename = batch_info['files'][file_id]['filename']
             batch_info['files'][file_id]['status'] = 'processing'
-            batch_info['files'][file_id]['stage'] = f'处理中 @{server_name}'
-            batch_info['server_statuses'][worker_id]['status'] = 'busy'
-            batch_info['server_statuses'][worker_id]['load'] = 1
+            server_inflight[worker_id] += 1
+            counted = True
+            refresh_server_load(worker_id)
 
-            input_path = os.path.join(batch_upload_dir, filename)
-            output_path = os.path.join(batch_upload_dir, filename.replace('.md', '.mp3'))
-            with open(input_path, 'r', encoding='utf-8') as f:
-                text = f.read()
+            if chunk_index is None:
+                batch_info['files'][file_id]['stage'] = f'处理中 @{server_name}'
+                input_path = os.path.join(batch_upload_dir, filename)
+                output_path = os.path.join(batch_upload_dir, filename.replace('.md', '.mp3'))
+                text = prepared_texts.get(file_id)
+                if text is None:
+                    text = await asyncio.get_running_loop().run_in_executor(None, read_text_file, input_path)
+            else:
+                chunks = chunk_texts[file_id]
+                done = len(chunks) - len(pending_chunks[file_id])
+                batch_info['files'][file_id]['stage'] = f'分段处理中 ({done}/{len(chunks)}) @{server_name}'
+                text = chunks[chunk_index]
+                output_path = chunk_paths[file_id][chunk_index]
+                await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                )
 
             await asyncio.sleep(random.uniform(0.0, 0.05))
 
             start_time = time.time()
-            status_code = None
-            error_detail = None
-            async with aiohttp.ClientSession() as session:
-                if global_api_semaphore is not None:
-                    async with global_api_semaphore:
-                        success, status_code, error_detail = await async_text_to_speech(
-                            session, text, output_path, voice, speed, server_url, api_key, timeout_seconds=300
-                        )
-                else:
-                    success, status_code, error_detail = await async_text_to_speech(
-                        session, text, output_path, voice, speed, server_url, api_key, timeout_seconds=300
-                    )
+            response_meta = {}
+            hedge = None
+            if HEDGING_ENABLED:
+                success, status_code, error_detail, hedge = await race_attempts(
+                    worker_id, task_id, text, output_path, response_meta
+                )
+            else:
+                success, status_code, error_detail = await call_tts(worker_id, text, output_path, response_meta)
 
-            error_text = (error_detail or "").lower()
-            is_timeout = (error_detail == 'timeout') or ('timeout' in error_text)
-            is_rate_limited = (
-                status_code in {429, 503}
-                or 'too many requests' in error_text
-                or 'too many subrequests' in error_text
-                or 'rate limit' in error_text
-            )
-            if status_code == 500 and 'too many' in error_text:
-                is_rate_limited = True
+            is_timeout, is_rate_limited = failure_kind(status_code, error_detail)
 
             cost = time.time() - start_time
             batch_info['server_statuses'][worker_id]['total_time'] += cost
 
             if success:
-                rate_limit_counters.pop(file_id, None)
-                timeout_counters.pop(file_id, None)
-                batch_info['files'][file_id]['status'] = 'completed'
-                batch_info['files'][file_id]['stage'] = '✅ 完成'
+                # 对冲副本胜出时，成功与吞吐计入副本所在的服务器
+                credit_id, credit_cost, credit_meta = worker_id, cost, response_meta
+                if hedge is not None:
+                    credit_id, credit_cost, credit_meta = hedge['server'], time.time() - hedge['started'], hedge['meta']
+                    batch_info['server_statuses'][credit_id]['total_time'] += credit_cost
+                    print(f"🪁 对冲副本胜出: {task_id} @ {api_servers[credit_id].get('name')}")
+                rate_limit_counters.pop(task_id, None)
+                timeout_counters.pop(task_id, None)
+                batch_info['server_statuses'][credit_id]['completed_tasks'] += 1
+                throughput.observe(credit_id, task_chars.get(task_id, 0), credit_cost)
+                batch_info['server_statuses'][credit_id].update(throughput.snapshot(credit_id))
+                rate_limiter.on_success(credit_id, credit_meta)
+                breaker.on_success(credit_id)
+                prober.touch(credit_id)
+                if concurrency_limiter.on_success(credit_id, task_chars.get(task_id, 0), credit_cost):
+                    print(f"📈 {api_servers[credit_id].get('name')} 并发上限提升至 {concurrency_limiter.limit(credit_id)}")
                 if file_id not in finished_files:
-                    finished_files.add(file_id)
-                    batch_info['completed_files'] += 1
-                    batch_info['current_file'] = batch_info['completed_files']
-                batch_info['server_statuses'][worker_id]['completed_tasks'] += 1
-                print(f"✅ 任务完成: {filename} (服务器: {server_name}, 耗时: {cost:.2f}秒)")
+                    account_chars(task_chars.get(task_id, 0), True)
+                if chunk_index is None:
+                    batch_info['files'][file_id]['status'] = 'completed'
+                    batch_info['files'][file_id]['stage'] = '✅ 完成'
+                    finish_file(file_id)
+                    print(f"✅ 任务完成: {filename} (服务器: {api_servers[credit_id].get('name')}, 耗时: {cost:.2f}秒)")
+                else:
+                    print(f"✅ 分段完成: {filename} #{chunk_index + 1} (服务器: {api_servers[credit_id].get('name')}, 耗时: {cost:.2f}秒)")
+                    await complete_chunk(file_id, chunk_index)
             else:
                 batch_info['server_statuses'][worker_id]['status'] = 'error'
+                if not is_rate_limited and breaker.on_failure(worker_id):
+                    print(
+                        f"🔌 {server_name} 连续失败 {BREAKER_FAILURE_THRESHOLD} 次，熔断，"
+                        f"{breaker.snapshot(worker_id)['breaker_open_until'] - time.time():.0f}s 后探测"
+                    )
+                if (is_rate_limited or is_timeout) and concurrency_limiter.on_congestion(worker_id, start_time):
+                    print(f"📉 {server_name} 拥塞 ({status_code or error_detail})，并发上限下调至 {concurrency_limiter.limit(worker_id)}")
                 if is_rate_limited:
-                    rate_limit_counters[file_id] += 1
-                    rate_limit_attempt = rate_limit_counters[file_id]
+                    pause = rate_limiter.on_throttled(worker_id, response_meta)
+                    refresh_server_load(worker_id)
+                    rate_limit_counters[task_id] += 1
+                    rate_limit_attempt = rate_limit_counters[task_id]
                     if rate_limit_attempt > RATE_LIMIT_MAX_RETRIES:
                         stage_msg = f'❌ 限流失败 (已重试{RATE_LIMIT_MAX_RETRIES}次)'
                         batch_info['files'][file_id]['status'] = 'failed'
                         batch_info['files'][file_id]['stage'] = stage_msg
-                        rate_limit_counters.pop(file_id, None)
-                        timeout_counters.pop(file_id, None)
+                        rate_limit_counters.pop(task_id, None)
+                        timeout_counters.pop(task_id, None)
                         batch_info['server_statuses'][worker_id]['failed_tasks'] += 1
-                        if file_id not in finished_files:
-                            finished_files.add(file_id)
-                            batch_info['completed_files'] += 1
-                            batch_info['current_file'] = batch_info['completed_files']
+                        finish_file(file_id)
                         print(
                             f"❌ 限流重试耗尽: {filename} (服务器: {server_name}, 状态码: {status_code}, 耗时: {cost:.2f}秒)"
                         )
                     else:
-                        delay_exponent = min(6, rate_limit_attempt + 1)
-                        delay = (2 ** delay_exponent) + random.uniform(0, 2.0)
+                        # 暂停的是整台服务器：任务立即回到队列，由未被限流的服务器接手或等待暂停结束
                         print(
-                            f"🛑 限流 {status_code}: {filename} @ {server_name}，第{rate_limit_attempt}次等待，{delay:.2f}s 后重试"
+                            f"🛑 限流 {status_code}: {filename} @ {server_name}，第{rate_limit_attempt}次，"
+                            f"服务器暂停 {pause:.1f}s，任务重新排队"
                         )
-
-                        async def requeue_rate_limit(delay_s: float, item):
-                            await asyncio.sleep(delay_s)
-                            await task_queue.put(item)
-
-                        asyncio.create_task(requeue_rate_limit(delay, (file_id, retry_count)))
+                        enqueue((task_id, retry_count))
                         batch_info['files'][file_id]['stage'] = (
                             f'等待限流恢复 ({rate_limit_attempt}/{RATE_LIMIT_MAX_RETRIES})'
                         )
                 elif is_timeout:
                     batch_info['server_statuses'][worker_id]['timeout_tasks'] += 1
-                    timeout_counters[file_id] += 1
-                    timeout_attempt = timeout_counters[file_id]
+                    timeout_counters[task_id] += 1
+                    timeout_attempt = timeout_counters[task_id]
                     if timeout_attempt > TIMEOUT_MAX_RETRIES:
                         batch_info['files'][file_id]['status'] = 'failed'
                         batch_info['files'][file_id]['stage'] = (
                             f'❌ 超时超出上限 ({TIMEOUT_MAX_RETRIES}次)'
                         )
-                        rate_limit_counters.pop(file_id, None)
-                        timeout_counters.pop(file_id, None)
+                        rate_limit_counters.pop(task_id, None)
+                        timeout_counters.pop(task_id, None)
                         batch_info['server_statuses'][worker_id]['failed_tasks'] += 1
-                        if file_id not in finished_files:
-                            finished_files.add(file_id)
-                            batch_info['completed_files'] += 1
-                            batch_info['current_file'] = batch_info['completed_files']
+                        finish_file(file_id)
                         print(
                             f"❌ 超时重试耗尽: {filename} (服务器: {server_name}, 耗时: {cost:.2f}秒)"
                         )
@@ -1261,12 +1978,7 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
                         print(
                             f"⏳ 超时重试: {filename} @ {server_name} 第{timeout_attempt}次，将在 {delay:.2f}s 后重试"
                         )
-
-                        async def requeue_timeout(delay_s: float, item):
-                            await asyncio.sleep(delay_s)
-                            await task_queue.put(item)
-
-                        asyncio.create_task(requeue_timeout(delay, (file_id, retry_count)))
+                        schedule_retry((task_id, retry_count), delay)
                         batch_info['files'][file_id]['stage'] = (
                             f'等待超时恢复 ({timeout_attempt}/{TIMEOUT_MAX_RETRIES})'
                         )
@@ -1276,96 +1988,113 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
                     print(
                         f"❌ 任务失败: {filename} (服务器: {server_name}, 状态码: {status_code}, 耗时: {cost:.2f}秒)，将在 {delay:.2f}s 后重试"
                     )
-
-                    async def requeue_general(delay_s: float, item):
-                        await asyncio.sleep(delay_s)
-                        await task_queue.put(item)
-
-                    asyncio.create_task(requeue_general(delay, (file_id, retry_count + 1)))
+                    schedule_retry((task_id, retry_count + 1), delay)
                     batch_info['files'][file_id]['stage'] = f'等待重试 ({retry_count+1}/{MAX_RETRIES})'
                 else:
-                    rate_limit_counters.pop(file_id, None)
-                    timeout_counters.pop(file_id, None)
+                    rate_limit_counters.pop(task_id, None)
+                    timeout_counters.pop(task_id, None)
                     batch_info['server_statuses'][worker_id]['failed_tasks'] += 1
                     batch_info['files'][file_id]['status'] = 'failed'
                     batch_info['files'][file_id]['stage'] = '❌ 失败 (已达上限)'
-                    if file_id not in finished_files:
-                        finished_files.add(file_id)
-                        batch_info['completed_files'] += 1
-                        batch_info['current_file'] = batch_info['completed_files']
+                    finish_file(file_id)
         except Exception as e:
-            print(f"💥 工人 {server_name} 异常: {file_id} -> {e}")
+            print(f"💥 工人 {server_name} 异常: {task_id} -> {e}")
             batch_info['server_statuses'][worker_id]['status'] = 'error'
             batch_info['server_statuses'][worker_id]['failed_tasks'] += 1
             if retry_count < MAX_RETRIES:
                 delay = (2 ** (retry_count + 1)) + random.uniform(0, 2.0)
-
-                async def requeue_exception(delay_s: float, item):
-                    await asyncio.sleep(delay_s)
-                    await task_queue.put(item)
-
-                asyncio.create_task(requeue_exception(delay, (file_id, retry_count + 1)))
+                schedule_retry((task_id, retry_count + 1), delay)
                 batch_info['files'][file_id]['stage'] = f'等待重试 ({retry_count+1}/{MAX_RETRIES})'
             else:
                 if batch_id in batch_status and file_id in batch_status[batch_id]['files']:
-                    rate_limit_counters.pop(file_id, None)
-                    timeout_counters.pop(file_id, None)
+                    rate_limit_counters.pop(task_id, None)
+                    timeout_counters.pop(task_id, None)
                     batch_info['files'][file_id]['status'] = 'failed'
                     batch_info['files'][file_id]['stage'] = '💥 处理异常'
-                    if file_id not in finished_files:
-                        finished_files.add(file_id)
-                        batch_info['completed_files'] += 1
-                        batch_info['current_file'] = batch_info['completed_files']
+                    finish_file(file_id)
         finally:
+            throughput.finish(worker_id, task_id)
             if not skip_metrics:
                 await update_rate_metrics(success)
 
-            batch_info['server_statuses'][worker_id]['load'] = 0
-            batch_info['server_statuses'][worker_id]['status'] = 'idle'
-
-            await worker_queue.put(worker_id)
-            concurrency_semaphore.release()
+            if counted:
+                server_inflight[worker_id] -= 1
+            active_requests -= 1
+            # 先归还全局并发位，展示的全局在途才是最新的
+            release_token(worker_id)
+            refresh_server_load(worker_id)
 
             if len(finished_files) >= total_tasks_count:
                 completion_event.set()
 
+    def abandon_queue():
+        """所有服务器都长期熔断：队列中的任务直接判定失败，批次得以结束"""
+        while not task_queue.empty():
+            task_id, _ = task_queue.get_nowait()
+            task_queue.task_done()
+            file_id = task_id[0] if isinstance(task_id, tuple) else task_id
+            if file_id in finished_files or file_id not in batch_info['files']:
+                continue
+            batch_info['files'][file_id]['status'] = 'failed'
+            batch_info['files'][file_id]['stage'] = '❌ 所有服务器熔断'
+            finish_file(file_id)
+        if len(finished_files) >= total_tasks_count:
+            completion_event.set()
+
     async def dispatcher():
+        nonlocal active_requests
         dispatched_count = 0
         try:
             while not completion_event.is_set():
-                await concurrency_semaphore.acquire()
-
-                if completion_event.is_set():
-                    concurrency_semaphore.release()
-                    break
-
-                try:
-                    worker_id = await worker_queue.get()
-                except asyncio.CancelledError:
-                    concurrency_semaphore.release()
-                    raise
-
-                if completion_event.is_set():
-                    await worker_queue.put(worker_id)
-                    concurrency_semaphore.release()
-                    break
-
-                try:
-                    file_id, retry_count = task_queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    await worker_queue.put(worker_id)
-                    concurrency_semaphore.release()
-                    if completion_event.is_set():
-                        break
-                    await asyncio.sleep(0.1)
+                # 收集当前全部空闲服务器，按吞吐模型挑选 (任务, 服务器)：
+                # 大任务可能更适合等待忙碌的快服务器，此时空闲的慢服务器改拿较小的任务
+                now = time.time()
+                idle_servers = idle_tokens if active_requests < MAX_CONCURRENCY else []
+                # 熔断中、被限流暂停或令牌不足的服务器本轮不参与派发
+                ready_servers = [idle_id for idle_id in set(idle_servers) if available_at(idle_id, now) <= now]
+                candidates = task_queue.peek(DISPATCH_WINDOW)
+                # 其他批次正在等待同一台服务器、且本批次已占得更多时让出；队列为空时不参与争用
+                ready_servers = share.claimable(ready_servers if candidates else [])
+                choice = throughput.choose(
+                    [(item, task_chars.get(item[0], 0)) for item in candidates], ready_servers,
+                    now=now, slots=concurrency_limiter.limit, not_before=available_at,
+                ) if candidates and ready_servers else None
+                if choice is None:
+                    if candidates and all(breaker.exhausted(i) for i in range(len(api_servers))):
+                        print("💥 所有服务器探测多次失败，放弃队列中剩余的任务")
+                        abandon_queue()
+                        continue
+                    # 队列已空、有空闲服务器时，为慢得反常的在途请求补发副本
+                    if HEDGING_ENABLED and not candidates and launch_hedge(now, dispatched_count):
+                        continue
+                    # 无事可做：等待入队/令牌归还的通知；有服务器处于限流暂停时最晚在暂停结束时醒来
+                    paused_until = [
+                        ready for ready in (available_at(i, now) for i in range(len(api_servers)))
+                        if now < ready < float('inf')
+                    ]
+                    deadlines = [min(paused_until)] if candidates and paused_until else []
+                    if HEDGING_ENABLED and not candidates:
+                        hedge_at = next_hedge_at(now, dispatched_count)
+                        if hedge_at is not None:
+                            deadlines.append(hedge_at)
+                    await wakeup.wait(min(deadlines) if deadlines else None)
                     continue
 
+                item, worker_id = choice
+                task_queue.take(item, DISPATCH_WINDOW)
+                idle_tokens.remove(worker_id)
+                share.acquire(worker_id)
+                active_requests += 1
+                file_id, retry_count = item
+                throughput.start(worker_id, file_id, task_chars.get(file_id, 0))
+                rate_limiter.acquire(worker_id, task_chars.get(file_id, 0))
+
                 asyncio.create_task(worker(worker_id, file_id, retry_count))
                 task_queue.task_done()
                 dispatched_count += 1
 
                 remaining = task_queue.qsize()
-                idle_workers = worker_queue.qsize()
+                idle_workers = len(idle_tokens)
 
                 if dispatched_count <= WARMUP_COUNT:
                     base_interval = INITIAL_DISPATCH_INTERVAL
@@ -1380,16 +2109,41 @@ async def dispatcher_balancer_v5_1(batch_id, batch_upload_dir, voice, speed, api
                     f"🧭 派发任务: {dispatched_count} | 剩余队列: {remaining} | 空闲服务器: {idle_workers} | 当前间隔: {interval:.2f}s"
                 )
 
+                # 派发间隔是有意的节流（预热/失败率自适应），不是轮询；稳态间隔为 0，直接派发下一个任务
                 if interval > 0:
                     await asyncio.sleep(interval)
         except asyncio.CancelledError:
             pass
 
+    if HEALTH_PROBE_ENABLED and task_queue.qsize():
+        prober.calibrate()
     dispatcher_task = asyncio.create_task(dispatcher())
-    await completion_event.wait()
-    dispatcher_task.cancel()
-    with contextlib.suppress(asyncio.CancelledError):
-        await dispatcher_task
+    try:
+        await completion_event.wait()
+    finally:
+        dispatcher_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await dispatcher_task
+        retry_queue.close()
+        breaker.close()
+        prober.close()
+        share.close()
+        batch_info['retry_backlog'] = 0
+        await session_pool.close()
+        prune_keep = None
+        if segment_store is not None:
+            # 写入尚未落盘的清单登记（批次异常结束时也不丢失）并注销；同一目录没有其他批次时才清理过期分段
+            keep = {key for _, keys in incremental_plans.values() for key in keys}
+            prune_keep = await loop.run_in_executor(None, segment_store.detach, keep)
+
+    batch_info['eta_seconds'] = 0
+    batch_info['projected_finish'] = time.time()
+
+    if prune_keep is not None:
+        # 清理不再被清单引用的旧分段；各批次未完成文件的分段保留以便下次复用
+        removed = await loop.run_in_executor(None, segment_store.prune, prune_keep)
+        if removed:
+            print(f"🧹 已清理 {removed} 个过期分段")
 
     print("🎉 V5.1 精细化调度处理完成！")
 
@@ -1763,19 +2517,154 @@ def process_files_with_load_balancing(batch_id, batch_upload_dir, voice, speed,
     print(f"🎉 批量处理完成: {batch_info['completed_files']}/{batch_info['total_files']} 个文件")
     print(f"📊 使用了 {len(api_servers)} 个服务器，并发度: {max_workers}")
 
+def progress_payload(batch_id, status, since=None, epoch=None, statuses=None, page=None, limit=None,
+                     summary=False):
+    """进度数据
+
+    - since 与 epoch 都给出且 epoch 与当前文件表一致时只含 since 之后变化的文件（增量），否则含全部文件；
+      不带 epoch 时无法确认序号属于当前文件表（如恢复或重启后），一律返回全部文件
+    - statuses 只保留这些状态的文件；page/limit 对非增量结果分页（page 从 1 开始）
+    - summary 只返回计数，不含文件
+    各状态计数由文件表随状态变化增量维护，不扫描文件。
+    """
+    files = status['files']
+    delta = since is not None and epoch == files.epoch and since <= files.seq
+    extra = {}
+    if summary:
+        seq, changed = files.seq, None
+    elif delta:
+        seq, changed = files.changes(since)
+        if statuses:
+            changed = {file_id: record for file_id, record in changed.items() if record.get('status') in statuses}
+    else:
+        seq = files.seq
+        if limit is None and page is not None:
+            limit = PROGRESS_PAGE_SIZE
+        page = max(1, page or 1)
+        matched, changed = files.select(statuses, (page - 1) * limit if limit else 0, limit)
+        extra = {'matched_files': matched, 'page': page, 'limit': limit}
+    payload = {
+        'batch_id': batch_id,
+        'total_files': status['total_files'],
+        'completed_files': status['completed_files'],
+        'current_file': status.get('current_file', 0),
+        'total_chars': status.get('total_chars'),
+        'eta_seconds': status.get('eta_seconds'),
+        'projected_finish': status.get('projected_finish'),
+        'retry_backlog': status.get('retry_backlog', 0),
+        'processing': bool(status.get('processing')),
+        'status_counts': files.counts(),
+        'seq': seq,
+        'epoch': files.epoch,
+        'delta': delta,
+        **extra
+    }
+    if changed is not None:
+        payload['files'] = changed
+    return payload
+
+def server_status_payload(batch_id, status):
+    return {
+        'batch_id': batch_id,
+        'server_statuses': status.get('server_statuses', {}),
+        'audio_cache': audio_cache.stats() if audio_cache is not None else None,
+        'hedge_stats': status.get('hedge_stats'),
+        'timestamp': time.time()
+    }
+
 @app.route('/progress/<batch_id>')
 def get_progress(batch_id):
-    """获取批量处理进度"""
+    """获取批量处理进度
+
+    带 ?since=N&epoch=E 时只返回修改序号 N 之后变化的文件（增量）；epoch 缺失或与当前文件表不一致
+    （如服务重启）、或未带 since 时返回全部文件 (delta=false)。响应中的 seq/epoch 供下次查询使用。
+    ?status=failed,processing 按状态筛选，?page=&limit= 分页，?summary=1 只返回计数。
+    """
     if batch_id not in batch_status:
         return jsonify({'error': '批次不存在'}), 404
     
     status = batch_status[batch_id]
-    return jsonify({
-        'batch_id': batch_id,
-        'total_files': status['total_files'],
-        'completed_files': status['completed_files'],
-        'current_file': status.get('current_file', 0),
-        'files': status['files']
+    statuses = [value.strip() for value in request.args.get('status', '').split(',') if value.strip()]
+    limit = request.args.get('limit', type=int)
+    return jsonify(progress_payload(
+        batch_id, status,
+        since=request.args.get('since', type=int),
+        epoch=request.args.get('epoch'),
+        statuses=statuses or None,
+        page=request.args.get('page', type=int),
+        limit=min(max(1, limit), PROGRESS_MAX_PAGE_SIZE) if limit is not None else None,
+        summary=request.args.get('summary', '').lower() in ('1', 'true'),
+    ))
+
+def sse_event(event, data, event_id=None):
+    """一条 Server-Sent Events 消息"""
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@app.route('/events/<batch_id>')
+def stream_progress(batch_id):
+    """批次进度事件流 (Server-Sent Events)
+
+    - progress：文件状态变化（增量，含汇总计数），事件 id 为 "epoch:seq"
+    - servers：服务器负载/熔断/限流等状态变化
+    - done：批次处理结束（携带最后的增量进度），随后关闭连接；提前结束（失败、中断）的批次同样发送
+    断线重连时浏览器带上 Last-Event-ID，从该序号续传；也可用 ?since=N&epoch=E 指定起点。
+    空闲时定期发送心跳注释，避免代理断开连接。
+    """
+    if batch_id not in batch_status:
+        return jsonify({'error': '批次不存在'}), 404
+
+    status = batch_status[batch_id]
+    files = status['files']
+    since, epoch = request.args.get('since', type=int), request.args.get('epoch')
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if ':' in last_event_id:
+        epoch, _, seq_text = last_event_id.partition(':')
+        since = int(seq_text) if seq_text.isdigit() else None
+
+    def generate():
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        position, start_epoch = since, epoch
+        last_counters = last_servers = None
+        last_sent = time.time()
+        while True:
+            sent = False
+            # 汇总计数（完成数、待重试数）可能在文件记录之后才更新，计数变化同样推送
+            counters = (status['completed_files'], status['total_files'], status.get('retry_backlog', 0))
+            if position is None or files.seq > position or counters != last_counters:
+                payload = progress_payload(batch_id, status, position, start_epoch)
+                position, start_epoch, last_counters = payload['seq'], payload['epoch'], counters
+                yield sse_event('progress', payload, f"{payload['epoch']}:{payload['seq']}")
+                sent = True
+            servers = server_status_payload(batch_id, status)
+            try:
+                fingerprint = json.dumps([servers['server_statuses'], servers['hedge_stats']], default=str, sort_keys=True)
+                message = sse_event('servers', servers) if fingerprint != last_servers else None
+            except RuntimeError:
+                # 处理线程恰好在修改服务器状态，下一轮再比较
+                message = None
+            if message:
+                last_servers = fingerprint
+                yield message
+                sent = True
+            if not status.get('processing'):
+                # 批次不再处理（全部完成，或失败/中断提前结束）即发送结束事件并关闭连接；
+                # 结束事件携带最后一次增量进度，客户端据此收尾
+                payload = progress_payload(batch_id, status, position, start_epoch)
+                yield sse_event('done', payload, f"{payload['epoch']}:{payload['seq']}")
+                return
+            now = time.time()
+            if sent:
+                last_sent = now
+            elif now - last_sent >= SSE_HEARTBEAT_SECONDS:
+                last_sent = now
+                yield ": ping\n\n"
+            # 文件变化立即唤醒；服务器状态与心跳按固定间隔检查
+            files.wait(position, SSE_POLL_SECONDS)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
     })
 
 @app.route('/server_status/<batch_id>')
@@ -1785,14 +2674,7 @@ def get_server_status(batch_id):
         return jsonify({'error': '批次不存在'}), 404
     
     # 从batch_status中获取服务器状态信息
-    status = batch_status[batch_id]
-    server_statuses = status.get('server_statuses', {})
-    
-    return jsonify({
-        'batch_id': batch_id,
-        'server_statuses': server_statuses,
-        'timestamp': time.time()
-    })
+    return jsonify(server_status_payload(batch_id, batch_status[batch_id]))
 
 @app.route('/retry_failed', methods=['POST'])
 def retry_failed_files():
@@ -1819,6 +2701,7 @@ def retry_failed_files():
             return jsonify({'error': '没有启用的API服务器'}), 400
         
         batch_info = batch_status[batch_id]
+        batch_info['priority'] = parse_priority(request.form.get('priority'), batch_info.get('priority'))
         
         # 找出失败的文件
         failed_files = []
@@ -1851,13 +2734,8 @@ def retry_failed_files():
         # 获取批次目录
         batch_upload_dir = batch_info['upload_dir']
         
-        # 启动异步重试处理
-        retry_thread = threading.Thread(
-            target=run_async_processing,
-            args=(batch_id, batch_upload_dir, voice, speed, enabled_servers, concurrency, failed_files)
-        )
-        retry_thread.daemon = True
-        retry_thread.start()
+        # 提交异步重试处理
+        run_async_processing(batch_id, batch_upload_dir, voice, speed, enabled_servers, concurrency, failed_files)
         
         return jsonify({
             'success': True,
@@ -1879,6 +2757,8 @@ def get_folders():
         
         folders = []
         for item in os.listdir(upload_dir):
+            if item.startswith('.'):
+                continue  # 跳过音频缓存等内部目录
             item_path = os.path.join(upload_dir, item)
             if os.path.isdir(item_path):
                 # 获取文件夹信息
@@ -1986,6 +2866,9 @@ def continue_folder(folder_name):
         concurrency = int(request.form.get('concurrency', 1))
         voice = request.form.get('voice', 'zh-CN-XiaoxiaoNeural')
         speed = float(request.form.get('speed', 1.0))
+        chunk_max_chars = int(request.form.get('chunk_chars', CHUNK_MAX_CHARS) or 0)
+        client_cleaning = request.form.get('client_cleaning', str(CLIENT_SIDE_CLEANING)).lower() == 'true'
+        priority = parse_priority(request.form.get('priority'))
 
         try:
             api_servers = json.loads(api_servers_json)
@@ -2005,6 +2888,17 @@ def continue_folder(folder_name):
             if mp3 not in files:
                 missing_md_files.append(md)
 
+        # 增量目录：MP3 已存在但 MD 内容相对清单已变化的文件也需要重新合成
+        incremental = SegmentStore.exists(folder_path)
+        if incremental:
+            sources = {}
+            for md in md_files:
+                if md in missing_md_files:
+                    continue
+                with open(os.path.join(folder_path, md), 'r', encoding='utf-8') as f:
+                    sources[md] = text_digest(f.read())
+            missing_md_files.extend(SegmentStore(folder_path).stale_files(sources))
+
         if not missing_md_files:
             return jsonify({'success': True, 'message': '没有缺失的任务，全部已完成', 'batch_id': None, 'retry_files': 0})
 
@@ -2016,7 +2910,11 @@ def continue_folder(folder_name):
             'current_file': 0,
             'files': {},
             'server_statuses': {},
-            'upload_dir': folder_path
+            'upload_dir': folder_path,
+            'chunk_max_chars': chunk_max_chars,
+            'client_cleaning': client_cleaning,
+            'incremental': incremental,
+            'priority': priority
         }
 
         # 初始化文件状态并构造specific_files列表（使用batch_id前缀的file_id）
@@ -2031,13 +2929,8 @@ def continue_folder(folder_name):
             }
             specific_files.append(file_id)
 
-        # 启动异步处理，仅处理缺失项
-        thread = threading.Thread(
-            target=run_async_processing,
-            args=(batch_id, folder_path, voice, speed, enabled_servers, concurrency, specific_files)
-        )
-        thread.daemon = True
-        thread.start()
+        # 提交异步处理，仅处理缺失项
+        run_async_processing(batch_id, folder_path, voice, speed, enabled_servers, concurrency, specific_files)
 
         return jsonify({
             'success': True,
@@ -2053,369 +2946,6 @@ def continue_folder(folder_name):
 # 简化的负载均衡器配置
 USE_SIMPLE_BALANCER = os.environ.get('USE_SIMPLE_BALANCER', 'true').lower() == 'true'
 
-async def simple_load_balancer(batch_id, batch_upload_dir, voice, speed, api_servers, concurrency, specific_files=None):
-    """超简单的负载均衡器：派发任务 → 300秒超时监控 → 轮询检查"""
-    if batch_id not in batch_status:
-        return
-    
-    batch_info = batch_status[batch_id]
-    
-    # 确定要处理的文件
-    if specific_files:
-        files_to_process = specific_files
-        print(f"🔄 重试模式: 处理指定的 {len(files_to_process)} 个文件")
-    else:
-        # 从batch_info中获取文件列表
-        files_to_process = list(batch_info['files'].keys())
-        print(f"🆕 全新处理: 处理所有 {len(files_to_process)} 个文件")
-    
-    if not files_to_process:
-        print("📁 没有找到要处理的文件")
-        return
-    
-    # 全局并发控制 - 核心优化
-    GLOBAL_CONCURRENCY_LIMIT = 8  # 全局并发限制，避免触发API速率限制
-    global_semaphore = asyncio.Semaphore(GLOBAL_CONCURRENCY_LIMIT)
-    
-    print(f"🚀 启动超简单负载均衡器:")
-    print(f"  📊 总任务数: {len(files_to_process)}")
-    print(f"  🖥️ 可用服务器: {len(api_servers)}")
-    print(f"  ⏰ 超时时间: 300秒")
-    print(f"  ⚡ 并发度: {concurrency}")
-    print(f"  🎯 全局并发限制: {GLOBAL_CONCURRENCY_LIMIT} (防止API速率限制)")
-
-    # 服务器状态管理（容量=每台服务器允许的并发，默认使用全局concurrency，可被单台覆盖）
-    num_servers = len(api_servers)
-    server_capacity = [int(api_servers[i].get('concurrency', concurrency)) for i in range(num_servers)]
-    server_active = [0] * num_servers  # 当前活跃任务数
-    server_used_count = [0] * num_servers  # 被派发过次数
-    server_last_used = [0.0] * num_servers  # 最后一次派发时间
-    server_completed = [0] * num_servers
-    server_failed = [0] * num_servers
-    server_consecutive_failures = [0] * num_servers  # 连续失败次数（用于熔断）
-    last_dispatch_index = 0  # 轮询指针，打散同等条件服务器的选择
-
-    # 初始化WebUI的服务器状态（简化模式也上报）
-    for i in range(num_servers):
-        batch_info['server_statuses'][i] = {
-            'name': api_servers[i]['name'],
-            'status': 'idle',
-            'load': 0,
-            'max_load': server_capacity[i],
-            'completed_tasks': 0,
-            'total_time': 0
-        }
-
-    # 任务队列和状态
-    task_queue = asyncio.Queue()
-    retry_queue = asyncio.Queue()
-    active_tasks = set()
-    completed_tasks = 0
-    total_tasks = len(files_to_process)
-    task_retries = {}
-    max_retries = 3
-    server_cooldown_until = [0.0] * num_servers  # 故障冷却截止时间戳
-
-    # 初始化任务队列
-    for file_id in files_to_process:
-        await task_queue.put(file_id)
-
-    def find_available_server():
-        """找可用服务器：未用过优先 → 最小负载 → 失败率低 → 最久未用（含熔断检查）"""
-        now_ts = time.time()
-        candidates = [
-            i for i in range(num_servers)
-            if server_active[i] < server_capacity[i] and now_ts >= server_cooldown_until[i]
-        ]
-        if not candidates:
-            return None
-
-        # 轮询打散，避免总是选到相同索引
-        rotated = candidates[last_dispatch_index % len(candidates):] + candidates[:last_dispatch_index % len(candidates)]
-
-        # 计算排序键
-        def sort_key(i: int):
-            total = server_completed[i] + server_failed[i]
-            fail_rate = (server_failed[i] / total) if total > 0 else 0.0
-            return (
-                0 if server_used_count[i] == 0 else 1,  # 未用过优先
-                server_active[i],                          # 当前负载越小越优先
-                server_used_count[i],                      # 使用次数更少更优先（促均衡）
-                fail_rate,                                  # 失败率更低优先
-                server_last_used[i]                         # 最久未用优先（时间更早）
-            )
-
-        return min(rotated, key=sort_key)
-    
-    async def process_task(file_id, server_id, pre_reserved: bool = False):
-        """处理单个任务：派发 → 300秒超时监控 → 轮询检查"""
-        nonlocal completed_tasks
-        
-        # 全局并发控制 - 获取信号量许可
-        async with global_semaphore:
-            server_name = api_servers[server_id]['name']
-            print(f"📤 派发任务: {file_id} → {server_name} (全局并发: {GLOBAL_CONCURRENCY_LIMIT - global_semaphore._value}/{GLOBAL_CONCURRENCY_LIMIT})")
-            
-            # 更新文件状态
-            if file_id in batch_info['files']:
-                file_info = batch_info['files'][file_id]
-                file_info['status'] = 'processing'
-                file_info['progress'] = 10
-                file_info['stage'] = f'🎵 正在转换 (服务器: {server_name})...'
-            
-            # 预占容量：若未在派发环节预占，这里补充占用
-            if not pre_reserved:
-                server_active[server_id] += 1
-            server_used_count[server_id] += 1
-            server_last_used[server_id] = time.time()
-            active_tasks.add(file_id)
-
-            # 更新WebUI服务器状态
-            batch_info['server_statuses'][server_id]['load'] = server_active[server_id]
-            batch_info['server_statuses'][server_id]['status'] = (
-                'full' if server_active[server_id] >= server_capacity[server_id] else 'busy'
-            )
-            
-            start_time = time.time()
-            success = False
-            
-            try:
-                # 读取文件内容
-                filename = batch_info['files'][file_id]['filename']
-                input_path = os.path.join(batch_upload_dir, filename)
-                output_path = os.path.join(batch_upload_dir, filename.replace('.md', '.mp3'))
-                
-                if os.path.exists(input_path):
-                    with open(input_path, 'r', encoding='utf-8') as f:
-                        text = f.read()
-                    
-                    # 创建HTTP会话并调用TTS
-                    async with aiohttp.ClientSession() as session:
-                        success, status_code, error_detail = await async_text_to_speech(
-                            session, text, output_path, voice, speed,
-                            api_servers[server_id]['url'], 
-                            api_servers[server_id].get('apiKey', api_servers[server_id].get('api_key', '')),
-                            timeout_seconds=300  # 明确传递超时参数
-                        )
-                    
-                    processing_time = time.time() - start_time
-                    
-                    if success:
-                        server_completed[server_id] += 1
-                        completed_tasks += 1
-                        batch_info['completed_files'] = completed_tasks
-                        batch_info['current_file'] = completed_tasks
-                        
-                        # 更新文件状态
-                        if file_id in batch_info['files']:
-                            file_info = batch_info['files'][file_id]
-                            file_info['status'] = 'completed'
-                            file_info['progress'] = 100
-                            file_info['stage'] = '✅ 转换完成'
-                        
-                        # 成功后清除该服务器的冷却、重试计数和连续失败计数
-                        server_cooldown_until[server_id] = 0.0
-                        server_consecutive_failures[server_id] = 0  # 重置连续失败计数
-                        if file_id in task_retries:
-                            task_retries[file_id] = 0
-                        
-                        print(f"✅ 任务完成: {filename} (服务器: {server_name}, 耗时: {processing_time:.2f}秒)")
-                    else:
-                        server_failed[server_id] += 1
-                        server_consecutive_failures[server_id] += 1  # 增加连续失败计数
-                        if status_code is not None:
-                            print(f"❌ 任务失败: {filename} (服务器: {server_name}, 状态码: {status_code}, 耗时: {processing_time:.2f}秒)")
-                        else:
-                            print(f"❌ 任务失败: {filename} (服务器: {server_name}, 耗时: {processing_time:.2f}秒)")
-                        
-                        # 服务器熔断：连续失败3次后熔断60秒
-                        if server_consecutive_failures[server_id] >= 3:
-                            server_cooldown_until[server_id] = time.time() + 60.0
-                            print(f"🔥 服务器 {server_name} 熔断60秒 (连续失败{server_consecutive_failures[server_id]}次)")
-                        else:
-                            # 短暂冷却该服务器，避免持续派发到不健康节点
-                            server_cooldown_until[server_id] = time.time() + 10.0
-                        
-                        # 更新文件状态
-                        if file_id in batch_info['files']:
-                            file_info = batch_info['files'][file_id]
-                            file_info['status'] = 'failed'
-                            file_info['progress'] = 100
-                            file_info['stage'] = f'❌ 转换失败 (服务器: {server_name})'
-                        
-                        # 智能重试：指数退避
-                        current_retry = task_retries.get(file_id, 0)
-                        if current_retry < max_retries:
-                            task_retries[file_id] = current_retry + 1
-                            # 计算退避时间：2^retry + 随机抖动
-                            backoff_time = (2 ** current_retry) + random.uniform(0, 1)
-                            print(f"🔄 任务将重试 (第 {current_retry+1} 次)，将在 {backoff_time:.2f} 秒后执行...")
-                            # 延迟重试
-                            await asyncio.sleep(backoff_time)
-                            await retry_queue.put(file_id)
-                else:
-                    print(f"❌ 文件不存在: {filename}")
-                    current_retry = task_retries.get(file_id, 0)
-                    if current_retry < max_retries:
-                        task_retries[file_id] = current_retry + 1
-                        await retry_queue.put(file_id)
-                    
-            except asyncio.TimeoutError:
-                processing_time = time.time() - start_time
-                server_failed[server_id] += 1
-                server_consecutive_failures[server_id] += 1  # 增加连续失败计数
-                print(f"⏰ 任务超时: {filename} (服务器: {server_name}, 耗时: {processing_time:.2f}秒)")
-                
-                # 服务器熔断：连续失败3次后熔断60秒
-                if server_consecutive_failures[server_id] >= 3:
-                    server_cooldown_until[server_id] = time.time() + 60.0
-                    print(f"🔥 服务器 {server_name} 熔断60秒 (连续失败{server_consecutive_failures[server_id]}次)")
-                else:
-                    server_cooldown_until[server_id] = time.time() + 10.0
-                
-                # 更新文件状态
-                if file_id in batch_info['files']:
-                    file_info = batch_info['files'][file_id]
-                    file_info['status'] = 'failed'
-                    file_info['progress'] = 100
-                    file_info['stage'] = f'⏰ 转换超时 (服务器: {server_name})'
-                
-                # 智能重试：指数退避
-                current_retry = task_retries.get(file_id, 0)
-                if current_retry < max_retries:
-                    task_retries[file_id] = current_retry + 1
-                    backoff_time = (2 ** current_retry) + random.uniform(0, 1)
-                    print(f"🔄 任务将重试 (第 {current_retry+1} 次)，将在 {backoff_time:.2f} 秒后执行...")
-                    await asyncio.sleep(backoff_time)
-                    await retry_queue.put(file_id)
-                
-            except Exception as e:
-                processing_time = time.time() - start_time
-                server_failed[server_id] += 1
-                server_consecutive_failures[server_id] += 1  # 增加连续失败计数
-                print(f"❌ 任务异常: {filename} (服务器: {server_name}, 耗时: {processing_time:.2f}秒, 错误: {e})")
-                
-                # 服务器熔断：连续失败3次后熔断60秒
-                if server_consecutive_failures[server_id] >= 3:
-                    server_cooldown_until[server_id] = time.time() + 60.0
-                    print(f"🔥 服务器 {server_name} 熔断60秒 (连续失败{server_consecutive_failures[server_id]}次)")
-                else:
-                    server_cooldown_until[server_id] = time.time() + 10.0
-                
-                # 更新文件状态
-                if file_id in batch_info['files']:
-                    file_info = batch_info['files'][file_id]
-                    file_info['status'] = 'failed'
-                    file_info['progress'] = 100
-                    file_info['stage'] = f'💥 处理异常: {str(e)}'
-                
-                # 智能重试：指数退避
-                current_retry = task_retries.get(file_id, 0)
-                if current_retry < max_retries:
-                    task_retries[file_id] = current_retry + 1
-                    backoff_time = (2 ** current_retry) + random.uniform(0, 1)
-                    print(f"🔄 任务将重试 (第 {current_retry+1} 次)，将在 {backoff_time:.2f} 秒后执行...")
-                    await asyncio.sleep(backoff_time)
-                    await retry_queue.put(file_id)
-            
-            finally:
-                # 释放服务器（与派发时的预占对应，仅减一次）
-                server_active[server_id] = max(0, server_active[server_id] - 1)
-                active_tasks.discard(file_id)
-                # 更新WebUI服务器状态
-                batch_info['server_statuses'][server_id]['load'] = server_active[server_id]
-                batch_info['server_statuses'][server_id]['completed_tasks'] = server_completed[server_id]
-                if server_active[server_id] == 0:
-                    batch_info['server_statuses'][server_id]['status'] = 'idle'
-                elif server_active[server_id] >= server_capacity[server_id]:
-                    batch_info['server_statuses'][server_id]['status'] = 'full'
-                else:
-                    batch_info['server_statuses'][server_id]['status'] = 'busy'
-                print(f"🔄 服务器 {server_name} 已释放 (负载: {server_active[server_id]}/{server_capacity[server_id]})")
-    
-    # 主处理循环
-    print(f"🎯 开始任务分配循环...")
-    
-    while completed_tasks < total_tasks:
-        assigned_any = False
-        # 尽可能在同一循环内填满所有可用容量
-        while True:
-            server_id = find_available_server()
-            if server_id is None:
-                break
-
-            # 选择任务：重试优先
-            file_id = None
-            if not retry_queue.empty():
-                try:
-                    file_id = retry_queue.get_nowait()
-                    print(f"🔄 重试任务: {file_id}")
-                except asyncio.QueueEmpty:
-                    pass
-            if file_id is None and not task_queue.empty():
-                try:
-                    file_id = task_queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    pass
-            if file_id is None:
-                break
-
-            # 指数退避（重试任务）
-            retries = task_retries.get(file_id, 0)
-            if retries > 0:
-                backoff = min(60.0, (2 ** (retries - 1)) + random.uniform(0, 0.5))
-                await asyncio.sleep(backoff)
-
-            # 预占容量
-            server_active[server_id] += 1
-            batch_info['server_statuses'][server_id]['load'] = server_active[server_id]
-            batch_info['server_statuses'][server_id]['status'] = (
-                'full' if server_active[server_id] >= server_capacity[server_id] else 'busy'
-            )
-            asyncio.create_task(process_task(file_id, server_id, pre_reserved=True))
-            last_dispatch_index = (last_dispatch_index + 1) % max(1, len([i for i in range(num_servers) if server_capacity[i] > 0]))
-            assigned_any = True
-
-        if not assigned_any:
-            # 无可派发则等待
-            active_count = sum(server_active)
-            total_capacity = sum(server_capacity)
-            idle_count = total_capacity - active_count
-            
-            if active_count >= total_capacity:
-                print(f"⏳ 所有服务器容量已满 ({active_count}/{total_capacity})，等待任务完成...")
-                await asyncio.sleep(1)
-            elif task_queue.empty() and retry_queue.empty():
-                if active_count > 0:
-                    print(f"📭 队列为空，等待 {active_count} 个正在运行的任务完成...")
-                else:
-                    print(f"✅ 所有任务处理完毕，系统空闲。")
-                await asyncio.sleep(1)
-            else:
-                print(f"🔄 部分服务器空闲 ({idle_count}/{total_capacity})，继续分配任务...")
-                await asyncio.sleep(0.2)
-    
-    # 等待所有活跃任务完成
-    while active_tasks:
-        print(f"⏳ 等待 {len(active_tasks)} 个活跃任务完成...")
-        await asyncio.sleep(1)
-    
-    print(f"🎉 超简单负载均衡器处理完成")
-    print(f"📊 最终统计: 完成 {completed_tasks}/{total_tasks} 个任务")
-    
-    # 输出详细的服务器统计
-    print(f"📊 服务器性能统计:")
-    for i in range(len(api_servers)):
-        server_name = api_servers[i]['name']
-        total_used = server_completed[i] + server_failed[i]
-        if total_used > 0:
-            success_rate = (server_completed[i] / total_used) * 100
-            print(f"  🖥️ {server_name}:")
-            print(f"    ✅ 完成任务: {server_completed[i]} 个")
-            print(f"    ❌ 失败任务: {server_failed[i]} 个")
-            print(f"    📈 成功率: {success_rate:.1f}%")
-            print(f"    🔄 总使用: {total_used} 次")
-
 if __name__ == '__main__':
     # 支持Docker部署，监听所有接口
     import os
@@ -2430,5 +2960,9 @@ if __name__ == '__main__':
         print(f"⚡ 使用动态工作节点负载均衡器 (V4)")
     else:
         print(f"⚡ 使用复杂负载均衡器（旧版路径）")
+
+    # 调试模式的重载器会先启动一个只负责监控的父进程，只在实际提供服务的进程中恢复
+    if AUTO_RESUME and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        resume_interrupted_batches()
     
     app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,162 @@
+"""
+内容寻址的音频缓存
+- 以 (文本, 声音, 语速, 音调, 格式, 清洗配置) 的哈希为键
+- 命中时硬链接（跨设备时复制）到批次目录
+- 按总大小做 LRU 淘汰，并统计命中/未命中次数
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def make_cache_key(text: str, voice: str, speed: float, pitch: float,
+                   response_format: str, cleaning_options: Optional[Dict]) -> str:
+    """计算缓存键：参数规范化为 JSON 后取 SHA-256。"""
+    payload = json.dumps({
+        'text': text,
+        'voice': voice,
+        'speed': float(speed),
+        'pitch': float(pitch),
+        'response_format': response_format or '',
+        'cleaning_options': cleaning_options or {},
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _link_or_copy(src: str, dest: str):
+    """经同目录临时文件把 src 原子地放到 dest：优先硬链接，失败时复制。"""
+    directory, name = os.path.split(dest)
+    temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        try:
+            os.link(src, temp_path)
+        except OSError:
+            shutil.copyfile(src, temp_path)
+        os.replace(temp_path, dest)
+    except Exception:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+class AudioCache:
+    """磁盘音频缓存，总大小超过上限时淘汰最久未使用的条目。"""
+
+    def __init__(self, root_dir: str, max_bytes: int, suffix: str = '.mp3'):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()  # key -> 字节数，按最近使用排序
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+        self._load()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], key + self.suffix)
+
+    def _load(self):
+        """启动时扫描缓存目录，按修改时间恢复 LRU 顺序。"""
+        found = []
+        for sub in os.listdir(self.root_dir):
+            sub_dir = os.path.join(self.root_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                path = os.path.join(sub_dir, name)
+                if name.startswith('.'):
+                    # 上次异常退出残留的临时文件
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+                    continue
+                if not name.endswith(self.suffix):
+                    continue
+                with contextlib.suppress(OSError):
+                    st = os.stat(path)
+                    found.append((st.st_mtime, name[:-len(self.suffix)], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            with contextlib.suppress(OSError):
+                os.remove(self._path(key))
+
+    def fetch(self, key: str, dest_path: str) -> bool:
+        """命中则把缓存音频放到 dest_path 并返回 True。"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            _link_or_copy(path, dest_path)
+            with contextlib.suppress(OSError):
+                os.utime(path)
+            return True
+        except OSError:
+            # 缓存文件已被外部删除：移除索引并按未命中处理
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+                self.hits -= 1
+                self.misses += 1
+            return False
+
+    def store(self, key: str, src_path: str):
+        """把新生成的音频登记入缓存。"""
+        try:
+            size = os.path.getsize(src_path)
+        except OSError:
+            return
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            _link_or_copy(src_path, path)
+        except OSError as e:
+            print(f"⚠️ 写入音频缓存失败: {e}")
+            return
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = size
+                self._total_bytes += size
+            self._evict_locked()
+
+    def stats(self) -> Dict:
+        """缓存统计，供 /server_status 展示。"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,159 @@
+"""
+进程级共享调度器
+- 所有批次（上传、重试失败、继续未完成）都提交到同一个后台事件循环，不再各自开线程和事件循环
+- 按服务器地址维护全局在途上限：多个批次同时使用同一台服务器时，总在途请求数不超过上限
+- 批次分优先级（interactive > normal > bulk）：有更高优先级的批次在等待时，低优先级批次不再获得新的并发位，
+  已在途的文件照常完成后让出（在文件边界让位），因此 bulk 只使用其他批次用剩的容量
+- 同一优先级的批次按权重公平分配：空出的并发位优先给"在途数/权重"最小的等待批次
+  （同值时先到先得，效果等同加权轮转）；没有其他批次在等待时，单个批次可以用满全部容量
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, Dict, Hashable, Iterable, List, Optional, Tuple
+
+DEFAULT_SERVER_LIMIT = 8  # 单台服务器的全局在途上限
+
+# 批次优先级：数值越小越优先
+PRIORITY_CLASSES = {'interactive': 0, 'normal': 1, 'bulk': 2}
+DEFAULT_PRIORITY = 'normal'
+
+
+def server_key(server: Dict) -> str:
+    """服务器的全局标识：规范化后的接口地址（同一地址的多个配置共用份额与连接池）。"""
+    url = (server.get('url') or '').strip().rstrip('/')
+    if url.endswith('/v1/audio/speech'):
+        url = url[:-len('/v1/audio/speech')]
+    return url.lower() or 'default'
+
+
+class ServerShare:
+    """一台服务器在各批次间的全局在途份额（只在调度器事件循环内使用）。"""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self._inflight: Dict[Hashable, int] = {}
+        self._waiting: Dict[Hashable, Tuple[int, float, object]] = {}  # 批次 -> (优先级, 权重, 唤醒信号)
+
+    @property
+    def inflight(self) -> int:
+        return sum(self._inflight.values())
+
+    def admits(self, batch: Hashable, priority: int, weight: float, wakeup, register: bool = True) -> bool:
+        """批次此刻能否再占用一个并发位；不能时（register 为真）登记等待，空出时唤醒。
+
+        有更高优先级的批次在等待时一律让出；同优先级的等待批次之间比较 在途数/权重。
+        """
+        if self.inflight < self.limit:
+            rivals = [(other_priority, self._inflight.get(other, 0) / other_weight)
+                      for other, (other_priority, other_weight, _) in self._waiting.items()
+                      if other != batch and other_priority <= priority]
+            mine = self._inflight.get(batch, 0) / weight
+            if not rivals or (min(rivals)[0] == priority and mine <= min(rivals)[1]):
+                self.withdraw(batch)
+                return True
+        if register:
+            self._waiting[batch] = (priority, weight, wakeup)
+        return False
+
+    def acquire(self, batch: Hashable):
+        self._inflight[batch] = self._inflight.get(batch, 0) + 1
+        self._waiting.pop(batch, None)
+
+    def release(self, batch: Hashable):
+        count = self._inflight.get(batch, 0) - 1
+        if count > 0:
+            self._inflight[batch] = count
+        else:
+            self._inflight.pop(batch, None)
+        self._notify()
+
+    def withdraw(self, batch: Hashable):
+        """批次不再等待该服务器（队列已空、熔断等），让其他批次不必再让位。"""
+        if self._waiting.pop(batch, None) is not None:
+            self._notify()
+
+    def _notify(self):
+        for _, _, wakeup in list(self._waiting.values()):
+            wakeup.notify()
+
+
+class BatchShare:
+    """单个批次对共享服务器份额的视图，服务器按批次内编号访问。
+
+    wakeup 是批次调度循环的唤醒信号（scheduler_core.WakeupSignal），其他批次归还并发位时 notify。
+    """
+
+    def __init__(self, shares: List[ServerShare], batch: Hashable, weight: float, wakeup,
+                 priority: str = DEFAULT_PRIORITY):
+        self._shares = shares
+        self.batch = batch
+        self.priority = PRIORITY_CLASSES.get(priority, PRIORITY_CLASSES[DEFAULT_PRIORITY])
+        self.weight = max(0.01, float(weight))
+        self.wakeup = wakeup
+
+    def claimable(self, server_ids: Iterable[int]) -> List[int]:
+        """server_ids 是批次此刻想用的服务器，返回其中可以占用并发位的。
+
+        被拒绝的登记等待（其他批次归还并发位时唤醒本批次），不在其中的撤销等待。
+        """
+        wanted = set(server_ids)
+        claimable = []
+        for server_id, share in enumerate(self._shares):
+            if server_id not in wanted:
+                share.withdraw(self.batch)
+            elif share.admits(self.batch, self.priority, self.weight, self.wakeup):
+                claimable.append(server_id)
+        return claimable
+
+    def has_room(self, server_id: int) -> bool:
+        """不登记等待地检查能否占用（对冲等可有可无的请求用）。"""
+        return self._shares[server_id].admits(self.batch, self.priority, self.weight, self.wakeup, register=False)
+
+    def acquire(self, server_id: int):
+        self._shares[server_id].acquire(self.batch)
+
+    def release(self, server_id: int):
+        self._shares[server_id].release(self.batch)
+
+    def snapshot(self, server_id: int) -> Dict:
+        """供 /server_status 展示的全局占用（含其他批次）。"""
+        share = self._shares[server_id]
+        return {'global_inflight': share.inflight, 'global_limit': share.limit}
+
+    def close(self):
+        for share in self._shares:
+            share.withdraw(self.batch)
+
+
+class SharedScheduler:
+    """进程内唯一的后台事件循环与服务器份额表。"""
+
+    def __init__(self, server_limit: int = DEFAULT_SERVER_LIMIT):
+        self.server_limit = server_limit
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._shares: Dict[str, ServerShare] = {}
+
+    def submit(self, coro: Coroutine) -> Future:
+        """把协程提交到调度器事件循环（线程安全，立即返回）。"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def attach(self, batch: Hashable, servers: List[Dict], wakeup, weight: float = 1.0,
+               priority: str = DEFAULT_PRIORITY) -> BatchShare:
+        """为批次建立服务器份额视图（须在调度器事件循环内调用）。"""
+        shares = []
+        for server in servers:
+            key = server_key(server)
+            if key not in self._shares:
+                self._shares[key] = ServerShare(self.server_limit)
+            shares.append(self._shares[key])
+        return BatchShare(shares, batch, weight, wakeup, priority)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='tts-scheduler', daemon=True).start()
+            return self._loop
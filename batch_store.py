@@ -0,0 +1,467 @@
+"""
+批次状态的持久化存储
+- 批次、文件、服务器统计写入 SQLite（WAL 模式），服务重启或容器重新部署后仍可查询进度、重试失败文件
+- 热路径（文件状态、进度、服务器负载）照常修改内存中的字典，不直接写库；后台线程按固定间隔
+  比较各记录与上次写入的内容，只把变化的记录在一个事务内批量写入，不会每次状态变化都 fsync
+- 内存中只保留运行中与最近访问过的批次：已结束且闲置超过期限的批次写库后移出内存，再次访问时从库中载入
+- 每个批次的文件表维护递增的修改序号：进度查询与写库都只读取某个序号之后变化的文件，开销随活跃度而非批次大小增长
+- 文件表随状态变化增量维护各状态的计数与文件索引：取计数是 O(1)，按状态筛选分页只读取所需的一页
+- 文件记录按整数编号存放在并列数组中（状态、阶段文本在表内去重为编号），十万级文件的批次也只占少量内存；
+  只在 API 响应与写库时还原为普通字典，JSON 格式不变
+"""
+
+import bisect
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_FLUSH_SECONDS = 1.0        # 后台写库间隔
+DEFAULT_MEMORY_TTL_SECONDS = 600.0  # 已结束的批次闲置多久后移出内存
+
+# 批次记录中单独成表的部分，其余字段作为批次元信息整体存储
+FILES_KEY = 'files'
+SERVERS_KEY = 'server_statuses'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    meta TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    batch_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (batch_id, file_id)
+);
+CREATE TABLE IF NOT EXISTS servers (
+    batch_id TEXT NOT NULL,
+    server_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (batch_id, server_id)
+);
+"""
+
+
+_MISSING = object()  # 记录中没有该字段
+_FIXED_FIELDS = ('filename', 'status', 'progress', 'stage')  # 单独占槽位的字段（亦即序列化时的字段顺序）
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def _server_key(key: str):
+    """服务器编号写库时成了字符串，载入时还原为整数。"""
+    return int(key) if key.isdigit() else key
+
+
+class FileRecord(MutableMapping):
+    """文件表中一个文件的视图：用法与字典相同，读写直接作用于文件表的并列数组。"""
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: 'FileTable', index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        value = self._table._get(self._index, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._table._set(self._index, {key: value})
+
+    def __delitem__(self, key):
+        if self._table._get(self._index, key) is _MISSING:
+            raise KeyError(key)
+        self._table._set(self._index, {key: _MISSING})
+
+    def __iter__(self):
+        return iter(self._table._fields(self._index))
+
+    def __len__(self):
+        return len(self._table._fields(self._index))
+
+    def update(self, *args, **kwargs):
+        self._table._set(self._index, dict(*args, **kwargs))
+
+    def __repr__(self):
+        return repr(self._table._render(self._index))
+
+
+class FileTable(MutableMapping):
+    """批次的文件表（file_id -> 文件记录），按修改序号增量读取变化的文件，按状态计数与筛选。
+
+    每个文件有一个整数编号，固定字段按编号存放在并列数组中：状态、阶段文本在表内去重为编号，
+    filename 通常就是 file_id 的后缀、只记起始位置，其余偶尔出现的字段（如 error）按文件单独存放。
+    取出的记录 (FileRecord) 只是视图；只在 API 响应与写库时还原为普通字典。
+    epoch 标识这张表：服务重启后表重新建立、序号从头计数，调用方据 epoch 不同判断需要全量读取。
+    """
+
+    def __init__(self, records: Optional[Dict] = None):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._cond = threading.Condition()
+        self._index: Dict[str, int] = {}                   # file_id -> 文件编号
+        self._ids: List[str] = []                          # 文件编号 -> file_id
+        self._texts: List = []                             # 文本编号 -> 状态/阶段文本
+        self._codes: Dict = {}                             # 状态/阶段文本 -> 文本编号
+        self._status = array('i')                          # 文件编号 -> 状态文本编号（-1 表示无此字段）
+        self._stage = array('i')                           # 文件编号 -> 阶段文本编号
+        self._progress: List = []                          # 文件编号 -> 进度
+        self._filename: List = []                          # 文件编号 -> 文件名在 file_id 中的起始位置，或文件名本身
+        self._extra: Dict[int, Dict] = {}                  # 文件编号 -> 其余字段
+        self._seqs = array('q')                            # 文件编号 -> 最近修改序号
+        self._log = array('i')                             # 修改日志：文件编号（按序号递增）
+        self._log_seqs = array('q')                        # 修改日志：对应的序号
+        self._by_status: Dict[int, Dict[int, None]] = {}   # 状态文本编号 -> 处于该状态的文件编号（按进入先后）
+        for file_id, record in (records or {}).items():
+            self[file_id] = record
+
+    # ---- 映射接口 ----
+
+    def __getitem__(self, file_id) -> FileRecord:
+        return FileRecord(self, self._index[file_id])
+
+    def __setitem__(self, file_id, record):
+        with self._cond:
+            index = self._index.get(file_id)
+            if index is None:
+                index = self._index[file_id] = len(self._ids)
+                self._ids.append(file_id)
+                self._status.append(-1)
+                self._stage.append(-1)
+                self._progress.append(_MISSING)
+                self._filename.append(_MISSING)
+                self._seqs.append(0)
+            values = dict.fromkeys(self._fields(index), _MISSING)
+            values.update(record)
+            self._set(index, values)
+
+    def __delitem__(self, file_id):
+        raise TypeError('文件表不支持删除文件')
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, file_id) -> bool:
+        return file_id in self._index
+
+    def keys(self):
+        return self._index.keys()
+
+    # ---- 字段存取 ----
+
+    def _code(self, text) -> int:
+        code = self._codes.get(text)
+        if code is None:
+            code = self._codes[text] = len(self._texts)
+            self._texts.append(text)
+        return code
+
+    def _get(self, index: int, key):
+        if key == 'status':
+            code = self._status[index]
+            return self._texts[code] if code >= 0 else _MISSING
+        if key == 'stage':
+            code = self._stage[index]
+            return self._texts[code] if code >= 0 else _MISSING
+        if key == 'progress':
+            return self._progress[index]
+        if key == 'filename':
+            filename = self._filename[index]
+            return self._ids[index][filename:] if isinstance(filename, int) else filename
+        return self._extra.get(index, {}).get(key, _MISSING)
+
+    def _set(self, index: int, values: Dict):
+        """写入一个文件的若干字段（值为 _MISSING 表示删除该字段），并登记一次修改。"""
+        with self._cond:
+            for key, value in values.items():
+                if key in ('status', 'stage'):
+                    code = -1 if value is _MISSING else self._code(value)
+                    if key == 'status':
+                        self._recount(index, code)
+                    getattr(self, '_' + key)[index] = code
+                elif key == 'progress':
+                    self._progress[index] = value
+                elif key == 'filename':
+                    file_id = self._ids[index]
+                    offset = len(file_id) - len(value) if isinstance(value, str) else -1
+                    self._filename[index] = offset if offset >= 0 and file_id[offset:] == value else value
+                elif value is _MISSING:
+                    extra = self._extra.get(index, {})
+                    extra.pop(key, None)
+                    if not extra:
+                        self._extra.pop(index, None)
+                else:
+                    self._extra.setdefault(index, {})[key] = value
+            self.seq += 1
+            self._seqs[index] = self.seq
+            self._log.append(index)
+            self._log_seqs.append(self.seq)
+            if len(self._log) > 2 * len(self._ids) + 1024:
+                self._compact_log()
+            self._cond.notify_all()
+
+    def _fields(self, index: int) -> List[str]:
+        fields = [key for key in _FIXED_FIELDS if self._get(index, key) is not _MISSING]
+        return fields + list(self._extra.get(index, ()))
+
+    def _render(self, index: int) -> Dict:
+        return {key: self._get(index, key) for key in self._fields(index)}
+
+    def _recount(self, index: int, status: int):
+        previous = self._status[index]
+        if status == previous:
+            return
+        if previous >= 0:
+            bucket = self._by_status[previous]
+            bucket.pop(index, None)
+            if not bucket:
+                # 字典删除元素后不会缩小，状态清空时整个丢弃
+                del self._by_status[previous]
+        if status >= 0:
+            self._by_status.setdefault(status, {})[index] = None
+
+    def _compact_log(self):
+        """修改日志只保留每个文件最近的一条。"""
+        kept = [(index, seq) for index, seq in zip(self._log, self._log_seqs) if self._seqs[index] == seq]
+        self._log = array('i', (index for index, _ in kept))
+        self._log_seqs = array('q', (seq for _, seq in kept))
+
+    # ---- 查询 ----
+
+    def touch(self, file_id: str):
+        """登记文件有变化。"""
+        self._set(self._index[file_id], {})
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的文件数。"""
+        with self._cond:
+            return {self._texts[status]: len(files) for status, files in self._by_status.items() if files}
+
+    def select(self, statuses: Optional[Iterable[str]] = None, offset: int = 0,
+               limit: Optional[int] = None) -> Tuple[int, Dict[str, Dict]]:
+        """返回 (匹配的文件数, 其中 [offset, offset + limit) 范围的文件记录副本)。
+
+        statuses 为空时按加入顺序取全部文件，否则按状态索引取（同一状态内按进入该状态的先后）。
+        """
+        with self._cond:
+            if statuses:
+                codes = [self._codes[status] for status in dict.fromkeys(statuses) if status in self._codes]
+                buckets = [self._by_status.get(code, {}) for code in codes]
+                matched = sum(len(bucket) for bucket in buckets)
+                indexes = itertools.chain.from_iterable(buckets)
+            else:
+                matched = len(self._ids)
+                indexes = range(len(self._ids))
+            stop = None if limit is None else offset + limit
+            return matched, {self._ids[index]: self._render(index)
+                             for index in itertools.islice(indexes, offset, stop)}
+
+    def wait(self, since: int, timeout: float) -> bool:
+        """等待序号超过 since（有文件变化）或超时；返回是否有变化。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.seq > since, timeout)
+
+    def changes(self, since: int = 0) -> Tuple[int, Dict[str, Dict]]:
+        """返回 (当前序号, since 之后修改过的文件记录副本)，按修改先后排列。"""
+        with self._cond:
+            start = bisect.bisect_right(self._log_seqs, since)
+            return self.seq, {self._ids[index]: self._render(index)
+                              for index, seq in zip(self._log[start:], self._log_seqs[start:])
+                              if self._seqs[index] == seq}
+
+
+class BatchStore(dict):
+    """以 SQLite 为后端的 batch_status：用法与普通字典相同。
+
+    读取内存中没有的批次时从库中载入；写入与修改由后台线程批量落盘。
+    mark_active/mark_idle 标记批次是否在处理中，处理中的批次不会移出内存。
+    """
+
+    def __init__(self, path: str, flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+                 memory_ttl: float = DEFAULT_MEMORY_TTL_SECONDS):
+        super().__init__()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.memory_ttl = memory_ttl
+        self._db_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._written: Dict[Tuple[str, str, str], int] = {}  # (表, 批次, 键) -> 上次写入内容的哈希（批次元信息与服务器）
+        self._flushed: Dict[str, Tuple[str, int]] = {}       # 批次 -> 已写库的文件表 (epoch, 序号)
+        self._active = set()
+        self._touched: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='batch-store', daemon=True)
+        self._thread.start()
+
+    # ---- 字典接口：内存未命中时从库中载入 ----
+
+    def __missing__(self, batch_id):
+        batch = self._load(batch_id)
+        if batch is None:
+            raise KeyError(batch_id)
+        return batch
+
+    def __getitem__(self, batch_id):
+        self._touched[batch_id] = time.time()
+        return super().__getitem__(batch_id)
+
+    def __setitem__(self, batch_id, batch):
+        if not isinstance(batch.get(FILES_KEY), FileTable):
+            batch[FILES_KEY] = FileTable(batch.get(FILES_KEY))
+        self._touched[batch_id] = time.time()
+        super().__setitem__(batch_id, batch)
+
+    def __contains__(self, batch_id) -> bool:
+        return super().__contains__(batch_id) or self._load(batch_id) is not None
+
+    def get(self, batch_id, default=None):
+        return self[batch_id] if batch_id in self else default
+
+    def __delitem__(self, batch_id):
+        with self._flush_lock:
+            super().__delitem__(batch_id)
+            self._forget(batch_id)
+            with self._db_lock, self._conn:
+                for table in ('batches', 'files', 'servers'):
+                    self._conn.execute(f'DELETE FROM {table} WHERE batch_id = ?', (batch_id,))
+
+    def flagged(self, field: str) -> List[str]:
+        """库中批次元信息 field 为真的批次（含已移出内存的），按更新时间排序。"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                'SELECT batch_id FROM batches WHERE json_extract(meta, ?) ORDER BY updated_at', (f'$.{field}',)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # ---- 生命周期 ----
+
+    def mark_active(self, batch_id: str):
+        """批次开始处理：常驻内存。"""
+        self._active.add(batch_id)
+        self._touched[batch_id] = time.time()
+
+    def mark_idle(self, batch_id: str):
+        """批次处理结束：闲置超过期限后可移出内存。"""
+        self._active.discard(batch_id)
+        self._touched[batch_id] = time.time()
+
+    def flush(self, evict: bool = False):
+        """把内存中变化的记录写入库（一个事务）；evict 为真时顺带移出闲置已久且无未写变化的批次。"""
+        with self._flush_lock:
+            rows = {'batches': [], 'files': [], 'servers': []}
+            now = time.time()
+            for batch_id, batch in list(super().items()):
+                try:
+                    changed = self._collect(batch_id, batch, now, rows)
+                except RuntimeError:
+                    # 处理线程恰好在修改该批次（字典大小变化），下一轮再写
+                    continue
+                if evict and not changed and self._expired(batch_id, now):
+                    super().pop(batch_id, None)
+                    self._forget(batch_id)
+            if any(rows.values()):
+                self._write(rows)
+
+    def _write(self, rows: Dict):
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO batches (batch_id, meta, updated_at) VALUES (?, ?, ?)', rows['batches'])
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO files (batch_id, file_id, data) VALUES (?, ?, ?)', rows['files'])
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO servers (batch_id, server_id, data) VALUES (?, ?, ?)', rows['servers'])
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    # ---- 内部 ----
+
+    def _collect(self, batch_id: str, batch: Dict, now: float, rows: Dict) -> bool:
+        """把批次中与上次写入不同的记录加入 rows；返回是否有变化。"""
+        pending = []
+        meta = {key: value for key, value in list(batch.items()) if key not in (FILES_KEY, SERVERS_KEY)}
+        pending.append(('batches', batch_id, '', _dumps(meta)))
+        for server_id, record in list(batch.get(SERVERS_KEY, {}).items()):
+            pending.append(('servers', batch_id, str(server_id), _dumps(record)))
+        changed = [item for item in pending if self._written.get(item[:3]) != hash(item[3])]
+        files = batch[FILES_KEY]
+        epoch, since = self._flushed.get(batch_id, (None, 0))
+        seq, changed_files = files.changes(since if epoch == files.epoch else 0)
+        if not changed and not changed_files:
+            return False
+        if not changed or changed[0][0] != 'batches':
+            # 文件或服务器有变化时同时刷新批次的更新时间
+            changed.insert(0, pending[0])
+        for table, _, key, data in changed:
+            self._written[(table, batch_id, key)] = hash(data)
+            if table == 'batches':
+                rows[table].append((batch_id, data, now))
+            else:
+                rows[table].append((batch_id, key, data))
+        rows['files'].extend((batch_id, file_id, _dumps(record)) for file_id, record in changed_files.items())
+        self._flushed[batch_id] = (files.epoch, seq)
+        return True
+
+    def _load(self, batch_id) -> Optional[Dict]:
+        if not isinstance(batch_id, str):
+            return None
+        with self._db_lock:
+            meta = self._conn.execute('SELECT meta FROM batches WHERE batch_id = ?', (batch_id,)).fetchone()
+            if meta is None:
+                return None
+            files = self._conn.execute('SELECT file_id, data FROM files WHERE batch_id = ?', (batch_id,)).fetchall()
+            servers = self._conn.execute('SELECT server_id, data FROM servers WHERE batch_id = ?', (batch_id,)).fetchall()
+        batch = json.loads(meta[0])
+        batch[FILES_KEY] = FileTable({file_id: json.loads(data) for file_id, data in files})
+        batch[SERVERS_KEY] = {_server_key(server_id): json.loads(data) for server_id, data in servers}
+        with self._flush_lock:
+            if super().__contains__(batch_id):
+                return super().__getitem__(batch_id)
+            self._written[('batches', batch_id, '')] = hash(meta[0])
+            self._flushed[batch_id] = (batch[FILES_KEY].epoch, batch[FILES_KEY].seq)
+            self._written.update({('servers', batch_id, server_id): hash(data) for server_id, data in servers})
+            self[batch_id] = batch
+        return batch
+
+    def _expired(self, batch_id: str, now: float) -> bool:
+        return batch_id not in self._active and now - self._touched.get(batch_id, now) >= self.memory_ttl
+
+    def _forget(self, batch_id: str):
+        self._touched.pop(batch_id, None)
+        self._flushed.pop(batch_id, None)
+        for key in [key for key in self._written if key[1] == batch_id]:
+            del self._written[key]
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush(evict=True)
+            except Exception as e:
+                print(f"⚠️ 批次状态写库失败: {e}")
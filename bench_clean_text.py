@@ -0,0 +1,207 @@
+"""
+clean_text 微基准
+- 对比原逐趟 re.sub 实现与预编译清洗引擎 (text_cleaner) 的耗时
+- 在大规模中英文 Markdown 语料上，逐一校验所有清洗开关组合的输出完全一致
+
+用法:
+    python bench_clean_text.py                 # 使用内置合成语料
+    python bench_clean_text.py a.md b.md ...   # 追加自定义语料
+    python bench_clean_text.py --size-mb 8     # 调整合成语料大小
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+import itertools
+
+from text_cleaner import clean_text
+
+OPTION_NAMES = (
+    "remove_markdown",
+    "remove_emoji",
+    "remove_urls",
+    "remove_line_breaks",
+    "remove_citation_numbers",
+)
+
+
+def reference_clean_text(text, options=None):
+    """原逐趟 re.sub 实现（基准与等价性参照）"""
+    if not isinstance(text, str):
+        text = str(text) if text is not None else ""
+    
+    cleaned_text = text
+    options = options or {}
+    
+    # 移除 Markdown 语法
+    if options.get('remove_markdown', True):
+        # 移除图片链接
+        cleaned_text = re.sub(r'!\[.*?\]\(.*?\)', '', cleaned_text)
+        # 移除链接，保留文本内容
+        cleaned_text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', cleaned_text)
+        # 移除粗体标记
+        cleaned_text = re.sub(r'\*\*(.*?)\*\*', r'\1', cleaned_text)
+        cleaned_text = re.sub(r'__(.*?)__', r'\1', cleaned_text)
+        # 移除斜体标记
+        cleaned_text = re.sub(r'\*(.*?)\*', r'\1', cleaned_text)
+        cleaned_text = re.sub(r'_(.*?)_', r'\1', cleaned_text)
+        # 移除代码块标记
+        cleaned_text = re.sub(r'`([^`]+)`', r'\1', cleaned_text)
+        # 移除标题标记
+        cleaned_text = re.sub(r'^#{1,6}\s*', '', cleaned_text, flags=re.MULTILINE)
+        # 移除列表标记
+        cleaned_text = re.sub(r'^\s*[-*+]\s*', '', cleaned_text, flags=re.MULTILINE)
+        # 移除数字列表标记
+        cleaned_text = re.sub(r'^\s*\d+\.\s*', '', cleaned_text, flags=re.MULTILINE)
+    
+    # 移除 URL 链接
+    if options.get('remove_urls', True):
+        cleaned_text = re.sub(r'https?://[^\s]+', '', cleaned_text)
+    
+    # 移除表情符号
+    if options.get('remove_emoji', True):
+        # 使用更精确的表情符号范围，避免误删中文字符
+        emoji_pattern = re.compile(
+            "["
+            "\U0001F600-\U0001F64F"  # emoticons
+            "\U0001F300-\U0001F5FF"  # symbols & pictographs
+            "\U0001F680-\U0001F6FF"  # transport & map symbols
+            "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+            "\U00002702-\U000027B0"
+            "\U000024C2-\U0001F251"
+            "\U0001F900-\U0001F9FF"  # supplemental symbols
+            "\U0001FA70-\U0001FAFF"  # symbols and pictographs extended-a
+            "\U00002600-\U000026FF"  # miscellaneous symbols
+            "\U00002700-\U000027BF"  # dingbats
+            "]+", flags=re.UNICODE)
+        cleaned_text = emoji_pattern.sub('', cleaned_text)
+    
+    # 移除引用标记
+    if options.get('remove_citation_numbers', True):
+        cleaned_text = re.sub(r'\[\d+\]', '', cleaned_text)
+        cleaned_text = re.sub(r'【\d+】', '', cleaned_text)
+    
+    # 合并为单行文本
+    if options.get('remove_line_breaks', True):
+        # 移除所有换行符
+        cleaned_text = re.sub(r'(\r\n|\n|\r)', ' ', cleaned_text)
+        # 合并多个连续空格为单个空格
+        cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
+    else:
+        # 只合并非换行的连续空格
+        cleaned_text = re.sub(r'[ \t]+', ' ', cleaned_text)
+    
+    return cleaned_text.strip()
+
+
+ZH_BLOCKS = [
+    "# 第{n}章 系统概述\n\n",
+    "本章介绍**批量语音合成**的整体架构，以及 *调度器* 如何在多台服务器之间分配任务[{n}]。\n\n",
+    "- 第一项：读取 `Markdown` 文件\n- 第二项：清洗文本 🎉\n+ 第三项：提交到 TTS 接口【{n}】\n\n",
+    "1. 打开 [项目主页](https://example.com/docs/{n}) 查看说明\n2. 下载 ![示意图](https://example.com/img/{n}.png)\n\n",
+    "> 注意：__高并发__ 时请关注 _限流_ 与超时设置，详见 http://example.org/faq?id={n} 。\r\n\r\n",
+    "天气不错☀️，适合出门🚀。数据统计显示完成率为 {n}%，平均耗时 {n}.5 秒。\n\n",
+]
+
+EN_BLOCKS = [
+    "## Section {n}: Architecture\n\n",
+    "The **dispatcher** assigns files to *servers* based on load and history [{n}].\n\n",
+    "* Read the `input` file\n* Clean the text \U0001F600\n- Submit to the API\n\n",
+    "See the [docs](https://example.com/en/{n}) and ![diagram](http://example.com/d{n}.svg) for details.\n\n",
+    "Use __bold__ and _italic_ sparingly; tabs\tand   spaces   are collapsed.\n\n",
+    "{n}. Numbered item with a trailing URL https://example.net/path/{n}\n\n",
+]
+
+
+def build_corpus(blocks, size_bytes, seed):
+    """按模板随机拼接出指定大小的 Markdown 语料"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    n = 0
+    while total < size_bytes:
+        n += 1
+        block = rng.choice(blocks).format(n=n)
+        parts.append(block)
+        total += len(block.encode("utf-8"))
+    return "".join(parts)
+
+
+def all_option_combinations():
+    for values in itertools.product((True, False), repeat=len(OPTION_NAMES)):
+        yield dict(zip(OPTION_NAMES, values))
+
+
+def timed(func, text, options, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text, options)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="clean_text 微基准")
+    parser.add_argument("files", nargs="*", help="额外的 Markdown 语料文件")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="每份合成语料大小 (MB)")
+    parser.add_argument("--repeat", type=int, default=3, help="每项计时重复次数（取最优）")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    corpora = {
+        "中文": build_corpus(ZH_BLOCKS, size, seed=1),
+        "English": build_corpus(EN_BLOCKS, size, seed=2),
+        "混合": build_corpus(ZH_BLOCKS + EN_BLOCKS, size, seed=3),
+    }
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            corpora[path] = f.read()
+
+    # 1) 等价性：每份语料 × 全部 32 种开关组合
+    mismatches = 0
+    for name, text in corpora.items():
+        for options in all_option_combinations():
+            if clean_text(text, options) != reference_clean_text(text, options):
+                mismatches += 1
+                print(f"❌ 输出不一致: {name} {options}")
+        if clean_text(text, None) != reference_clean_text(text, None):
+            mismatches += 1
+            print(f"❌ 输出不一致: {name} (默认配置)")
+    if mismatches:
+        print(f"❌ 共 {mismatches} 处不一致")
+        return 1
+    print(f"✅ 等价性校验通过: {len(corpora)} 份语料 × 32 种开关组合")
+
+    # 2) 耗时：默认配置与保留换行配置
+    profiles = {
+        "默认配置": None,
+        "保留换行": {"remove_line_breaks": False},
+    }
+    print(f"\n{'语料':<10}{'配置':<10}{'大小':>10}{'原实现':>12}{'新引擎':>12}{'加速':>8}")
+    for name, text in corpora.items():
+        for profile, options in profiles.items():
+            old = timed(reference_clean_text, text, options, args.repeat)
+            new = timed(clean_text, text, options, args.repeat)
+            size_mb = len(text.encode("utf-8")) / 1024 / 1024
+            print(f"{name[:10]:<10}{profile:<10}{size_mb:>8.2f}MB{old * 1000:>10.1f}ms{new * 1000:>10.1f}ms{old / new:>7.2f}x")
+
+    # 3) 小文本调用开销（原实现每次调用都会重新编译表情正则）
+    short = "这是一段**简短**的文本 🎉 [1] https://example.com"
+    calls = 20000
+    start = time.perf_counter()
+    for _ in range(calls):
+        reference_clean_text(short)
+    old = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        clean_text(short)
+    new = time.perf_counter() - start
+    print(f"\n短文本 × {calls}: 原实现 {old * 1000:.1f}ms, 新引擎 {new * 1000:.1f}ms ({old / new:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
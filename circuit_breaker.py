@@ -0,0 +1,165 @@
+"""
+服务器熔断器（各调度器共用）
+- closed：正常派发；连续失败达到阈值后熔断 (open)
+- open：不再派发真实文件；冷却结束后进入 half-open
+- half-open：发送一个极短的探测请求，成功即恢复 closed，失败则重新 open 且冷却时间翻倍（有上限）
+- 限流 (429) 不计入失败，由限流器单独处理；冷却与探测由事件循环定时器驱动，调度器无需轮询
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 3     # 连续失败多少次后熔断
+DEFAULT_OPEN_SECONDS = 30.0       # 首次熔断的冷却时间
+DEFAULT_MAX_OPEN_SECONDS = 300.0  # 探测连续失败时冷却时间的上限
+
+
+class CircuitBreaker:
+    """批次内各服务器的熔断状态。
+
+    probe(server_id) 是半开状态下的探测协程，返回服务是否恢复；
+    on_change(server_id) 在状态变化时同步回调（通常用于唤醒调度器）。
+    """
+
+    def __init__(self, server_count: int, probe: Callable[[int], Awaitable[bool]],
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 open_seconds: float = DEFAULT_OPEN_SECONDS,
+                 max_open_seconds: float = DEFAULT_MAX_OPEN_SECONDS,
+                 on_change: Optional[Callable[[int], None]] = None):
+        self.probe = probe
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max(open_seconds, max_open_seconds)
+        self.on_change = on_change
+        self._state: Dict[int, str] = {i: CLOSED for i in range(server_count)}
+        self._failures: Dict[int, int] = {i: 0 for i in range(server_count)}
+        self._open_seconds: Dict[int, float] = {i: open_seconds for i in range(server_count)}
+        self._open_until: Dict[int, float] = {i: 0.0 for i in range(server_count)}
+        self._trips: Dict[int, int] = {i: 0 for i in range(server_count)}
+        self._closed_events: Dict[int, asyncio.Event] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._probes: Dict[int, asyncio.Task] = {}
+
+    def state(self, server_id: int) -> str:
+        return self._state[server_id]
+
+    def allows(self, server_id: int) -> bool:
+        """是否可以向该服务器派发真实文件。"""
+        return self._state[server_id] == CLOSED
+
+    def on_success(self, server_id: int):
+        """登记成功请求；熔断前已发出的请求成功同样说明服务可用，直接恢复。"""
+        self._failures[server_id] = 0
+        if self._state[server_id] != CLOSED:
+            self._close(server_id)
+
+    def on_failure(self, server_id: int) -> bool:
+        """登记失败请求（不含限流）；返回是否因此熔断。"""
+        if self._state[server_id] != CLOSED:
+            return False
+        self._failures[server_id] += 1
+        if self._failures[server_id] < self.failure_threshold:
+            return False
+        self._trip(server_id)
+        return True
+
+    def trip(self, server_id: int) -> bool:
+        """直接熔断（如批次开始前的探测失败）；返回是否由闭合转为熔断。"""
+        if self._state[server_id] != CLOSED:
+            return False
+        self._trip(server_id)
+        return True
+
+    def exhausted(self, server_id: int) -> bool:
+        """熔断中且冷却时间已升到上限（探测多次失败），视为长期不可用。"""
+        return self._state[server_id] != CLOSED and self._open_seconds[server_id] >= self.max_open_seconds
+
+    async def wait_closed(self, server_id: int):
+        """等待服务器恢复可派发（供每台服务器一个工作节点的调度器使用）。"""
+        if self._state[server_id] == CLOSED:
+            return
+        await self._event(server_id).wait()
+
+    def close(self):
+        """批次结束：取消冷却定时器与进行中的探测。"""
+        for timer in self._timers.values():
+            timer.cancel()
+        for task in self._probes.values():
+            task.cancel()
+        self._timers.clear()
+        self._probes.clear()
+
+    def snapshot(self, server_id: int) -> Dict:
+        """供 /server_status 展示的熔断状态。"""
+        state = self._state[server_id]
+        return {
+            'breaker_state': state,
+            'breaker_failures': self._failures[server_id],
+            'breaker_trips': self._trips[server_id],
+            'breaker_open_until': self._open_until[server_id] if state == OPEN else None,
+        }
+
+    def _event(self, server_id: int) -> asyncio.Event:
+        event = self._closed_events.get(server_id)
+        if event is None:
+            event = self._closed_events[server_id] = asyncio.Event()
+            if self._state[server_id] == CLOSED:
+                event.set()
+        return event
+
+    def _trip(self, server_id: int):
+        seconds = self._open_seconds[server_id]
+        self._state[server_id] = OPEN
+        self._trips[server_id] += 1
+        self._open_until[server_id] = time.time() + seconds
+        self._event(server_id).clear()
+        timer = self._timers.pop(server_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[server_id] = asyncio.get_running_loop().call_later(seconds, self._half_open, server_id)
+        self._notify(server_id)
+
+    def _half_open(self, server_id: int):
+        self._timers.pop(server_id, None)
+        if self._state[server_id] != OPEN:
+            return
+        self._state[server_id] = HALF_OPEN
+        self._probes[server_id] = asyncio.get_running_loop().create_task(self._run_probe(server_id))
+        self._notify(server_id)
+
+    async def _run_probe(self, server_id: int):
+        try:
+            recovered = bool(await self.probe(server_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            recovered = False
+        finally:
+            self._probes.pop(server_id, None)
+        if self._state[server_id] != HALF_OPEN:
+            return
+        if recovered:
+            self._close(server_id)
+        else:
+            self._open_seconds[server_id] = min(self.max_open_seconds, self._open_seconds[server_id] * 2)
+            self._trip(server_id)
+
+    def _close(self, server_id: int):
+        self._state[server_id] = CLOSED
+        self._failures[server_id] = 0
+        self._open_seconds[server_id] = self.base_open_seconds
+        self._open_until[server_id] = 0.0
+        timer = self._timers.pop(server_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._event(server_id).set()
+        self._notify(server_id)
+
+    def _notify(self, server_id: int):
+        if self.on_change is not None:
+            self.on_change(server_id)
@@ -0,0 +1,61 @@
+"""
+服务器并发上限的 AIMD 自适应控制
+- 请求成功且单字耗时没有明显劣化时加性增加（约每完成一个窗口的请求 +1）
+- 遇到 429/503/超时时乘性减少；同一次拥塞只下调一次（拥塞前已发出的请求不再重复触发）
+"""
+
+import time
+from typing import Dict, Optional
+
+DEFAULT_MAX_LIMIT = 8           # 单台服务器并发上限的天花板
+INCREASE_STEP = 1.0             # 每个窗口增加的并发数
+DECREASE_FACTOR = 0.5           # 拥塞时的乘性系数
+LATENCY_TOLERANCE = 2.0         # 单字耗时超过基线的倍数即视为延迟劣化，暂停增长
+BASELINE_DRIFT = 1.01           # 基线每次观测缓慢上浮，避免偶发的极快请求永久压住增长
+
+
+class AIMDLimiter:
+    """批次内各服务器的并发上限（浮点窗口，向下取整后作为可用并发数）。"""
+
+    def __init__(self, server_count: int, initial: float = 1.0,
+                 max_limit: float = DEFAULT_MAX_LIMIT, min_limit: float = 1.0):
+        self.max_limit = max(min_limit, float(max_limit))
+        self.min_limit = float(min_limit)
+        initial = min(self.max_limit, max(self.min_limit, float(initial)))
+        self._limits: Dict[int, float] = {i: initial for i in range(server_count)}
+        self._baseline: Dict[int, Optional[float]] = {i: None for i in range(server_count)}  # 秒/字
+        self._last_decrease: Dict[int, float] = {i: 0.0 for i in range(server_count)}
+
+    def limit(self, server_id: int) -> int:
+        """当前允许的在途请求数。"""
+        return max(int(self.min_limit), int(self._limits[server_id]))
+
+    def on_success(self, server_id: int, chars: int, seconds: float) -> bool:
+        """登记成功请求；返回整数上限是否变化。"""
+        before = self.limit(server_id)
+        if chars > 0 and seconds > 0:
+            per_char = seconds / chars
+            baseline = self._baseline[server_id]
+            baseline = per_char if baseline is None else min(per_char, baseline * BASELINE_DRIFT)
+            self._baseline[server_id] = baseline
+            if per_char > baseline * LATENCY_TOLERANCE:
+                return False
+        window = self._limits[server_id]
+        self._limits[server_id] = min(self.max_limit, window + INCREASE_STEP / window)
+        return self.limit(server_id) != before
+
+    def on_congestion(self, server_id: int, started_at: float) -> bool:
+        """登记 429/503/超时；返回是否执行了下调。"""
+        if started_at < self._last_decrease[server_id]:
+            return False
+        self._limits[server_id] = max(self.min_limit, self._limits[server_id] * DECREASE_FACTOR)
+        self._last_decrease[server_id] = time.time()
+        return True
+
+    def snapshot(self, server_id: int) -> Dict:
+        """供 /server_status 展示的上限。"""
+        return {
+            'max_load': self.limit(server_id),
+            'concurrency_limit': round(self._limits[server_id], 2),
+            'concurrency_ceiling': int(self.max_limit),
+        }
@@ -0,0 +1,112 @@
+"""
+服务器健康探测
+- 批次开始时向每台服务器并发合成一段短文本，测量可用性、首字节耗时 (TTFB) 与字符吞吐，
+  结果用于预置调度器的吞吐估计；探测失败的服务器由调用方熔断，不分配任何文件
+- 批次运行期间，长时间没有真实请求完成的空闲服务器定期重新探测，及时发现掉线
+- 探测本身由调用方提供的 measure 协程完成，本模块只负责调度与记录结果
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+DEFAULT_INTERVAL = 60.0  # 空闲服务器的重新探测间隔（秒），0 表示只在批次开始时校准
+RECHECK_SECONDS = 5.0    # 到期但暂不适合探测（忙碌/熔断）的服务器多久后再检查
+
+
+class HealthProber:
+    """批次内各服务器的校准与定期健康探测。
+
+    measure(server_id) 返回探测结果字典（至少含 ok，可含 ttfb / chars_per_sec / error）；
+    on_result(server_id, result) 在每次探测结束时同步回调；
+    should_probe(server_id) 决定到期的服务器此刻是否适合探测（如熔断中或有在途请求时跳过）。
+    """
+
+    def __init__(self, server_count: int, measure: Callable[[int], Awaitable[Dict]],
+                 on_result: Callable[[int, Dict], None],
+                 interval: float = DEFAULT_INTERVAL,
+                 should_probe: Optional[Callable[[int], bool]] = None):
+        self.measure = measure
+        self.on_result = on_result
+        self.interval = interval
+        self.should_probe = should_probe
+        self._servers = range(server_count)
+        self._calibrating = set()
+        self._last_seen: Dict[int, float] = {i: 0.0 for i in self._servers}
+        self._results: Dict[int, Optional[Dict]] = {i: None for i in self._servers}
+        self._probes: Dict[int, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def calibrate(self):
+        """为所有服务器发起校准探测（不等待结果），并启动定期探测。"""
+        for server_id in self._servers:
+            self._calibrating.add(server_id)
+            self._launch(server_id)
+        if self.interval > 0 and self._loop_task is None:
+            self._loop_task = asyncio.get_running_loop().create_task(self._run())
+
+    def calibrating(self, server_id: int) -> bool:
+        """服务器的首次校准是否尚未完成。"""
+        return server_id in self._calibrating
+
+    def touch(self, server_id: int):
+        """登记一次真实请求成功，推迟该服务器的下一次探测。"""
+        self._last_seen[server_id] = time.time()
+
+    def close(self):
+        """批次结束：停止定期探测并取消进行中的探测。"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for task in self._probes.values():
+            task.cancel()
+        self._probes.clear()
+        self._calibrating.clear()
+
+    def snapshot(self, server_id: int) -> Dict:
+        """供 /server_status 展示的最近一次探测结果。"""
+        result = self._results[server_id]
+        if result is None:
+            return {'probe_ok': None, 'probe_ttfb': None, 'probe_chars_per_sec': None, 'probed_at': None}
+        ttfb, rate = result.get('ttfb'), result.get('chars_per_sec')
+        return {
+            'probe_ok': bool(result.get('ok')),
+            'probe_ttfb': round(ttfb, 3) if ttfb is not None else None,
+            'probe_chars_per_sec': round(rate, 1) if rate is not None else None,
+            'probed_at': result['at'],
+        }
+
+    def _launch(self, server_id: int):
+        if server_id not in self._probes:
+            self._probes[server_id] = asyncio.get_running_loop().create_task(self._probe(server_id))
+
+    async def _probe(self, server_id: int):
+        try:
+            result = await self.measure(server_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result = {'ok': False, 'error': str(e)}
+        finally:
+            self._probes.pop(server_id, None)
+        now = time.time()
+        self._results[server_id] = {**result, 'at': now}
+        self._last_seen[server_id] = now
+        self._calibrating.discard(server_id)
+        self.on_result(server_id, result)
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            next_at = now + self.interval
+            for server_id in self._servers:
+                if server_id in self._probes:
+                    continue
+                due_at = self._last_seen[server_id] + self.interval
+                if due_at > now:
+                    next_at = min(next_at, due_at)
+                elif self.should_probe is None or self.should_probe(server_id):
+                    self._launch(server_id)
+                else:
+                    next_at = min(next_at, now + RECHECK_SECONDS)
+            await asyncio.sleep(max(0.0, next_at - now))
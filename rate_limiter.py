@@ -0,0 +1,193 @@
+"""
+按服务器的限流控制
+- 解析 Retry-After 与 RateLimit 响应头，限流时整台服务器暂停派发，而不是逐个文件退避
+- 每台服务器维护请求数与字符数两个令牌桶；首次被限流前不设限，
+  被限流时以最近一分钟的实际速率为基准学习可持续速率，之后平稳时缓慢上调，
+  但不超过被限流时的实际速率；
+  最近一分钟请求过少（如只有探测请求）时只暂停，不学习速率
+"""
+
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+OBSERVE_WINDOW = 60.0        # 统计实际速率的时间窗口（秒）
+BACKOFF_FACTOR = 0.8         # 被限流时可持续速率取实际速率的比例
+RECOVERY_FACTOR = 1.05       # 每次成功后速率上调比例（上限为被限流时的实际速率）
+RECOVERY_RESET = 600.0       # 连续这么久未被限流则取消速率限制
+DEFAULT_PAUSE = 2.0          # 没有 Retry-After 时的首次暂停秒数，连续限流时翻倍
+MAX_PAUSE = 120.0
+MIN_REQUEST_RATE = 1.0 / 30  # 请求速率下限（次/秒）
+BURST_SECONDS = 2.0          # 令牌桶容量：可持续速率下若干秒的量
+MIN_RATE_SAMPLES = 5         # 窗口内至少有这么多次请求才据此学习速率，否则只暂停
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """把 Retry-After（秒数或 HTTP 日期）解析为需要等待的秒数。"""
+    if not value:
+        return None
+    value = value.strip()
+    now = time.time() if now is None else now
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str], now: Optional[float] = None) -> Dict:
+    """提取限流相关响应头：retry_after（秒）、remaining、reset_after（秒）。"""
+    now = time.time() if now is None else now
+    info = {'retry_after': parse_retry_after(headers.get('Retry-After'), now)}
+    remaining = headers.get('X-RateLimit-Remaining') or headers.get('RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset') or headers.get('RateLimit-Reset')
+    try:
+        info['remaining'] = int(float(remaining)) if remaining is not None else None
+    except ValueError:
+        info['remaining'] = None
+    try:
+        reset_value = float(reset) if reset is not None else None
+    except ValueError:
+        reset_value = None
+    if reset_value is not None and reset_value > 1e9:
+        reset_value = max(0.0, reset_value - now)  # 以 Unix 时间戳表示的重置时刻
+    info['reset_after'] = reset_value
+    return info
+
+
+class _Bucket:
+    """令牌桶；允许透支，余额为负时暂停到补回为止。"""
+
+    def __init__(self, rate: float, ceiling: float, now: float):
+        self.rate = rate
+        self.ceiling = ceiling  # 回升上限：被限流时的实际速率
+        self.tokens = rate * BURST_SECONDS
+        self.updated = now
+
+    def throttle(self, rate: float, ceiling: float, now: float):
+        """再次被限流：速率与回升上限都只降不升"""
+        self.refill(now)
+        self.rate = min(self.rate, rate)
+        self.ceiling = min(self.ceiling, ceiling)
+
+    def recover(self):
+        self.rate = min(self.ceiling, self.rate * RECOVERY_FACTOR)
+
+    def refill(self, now: float):
+        capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float, need: float) -> float:
+        self.refill(now)
+        if self.tokens >= need:
+            return now
+        return now + (need - self.tokens) / self.rate
+
+
+class ServerRateLimiter:
+    """批次内各服务器的限流暂停与令牌桶。"""
+
+    def __init__(self, server_count: int):
+        self._paused_until: Dict[int, float] = {i: 0.0 for i in range(server_count)}
+        self._throttle_streak: Dict[int, int] = {i: 0 for i in range(server_count)}
+        self._last_throttled: Dict[int, float] = {i: 0.0 for i in range(server_count)}
+        self._requests: Dict[int, Optional[_Bucket]] = {i: None for i in range(server_count)}
+        self._chars: Dict[int, Optional[_Bucket]] = {i: None for i in range(server_count)}
+        self._history: Dict[int, deque] = {i: deque() for i in range(server_count)}  # (时刻, 字符数)
+
+    def ready_at(self, server_id: int, now: Optional[float] = None) -> float:
+        """服务器最早可以接收下一个请求的时刻。"""
+        now = time.time() if now is None else now
+        ready = max(now, self._paused_until[server_id])
+        requests, chars = self._requests[server_id], self._chars[server_id]
+        if requests is not None:
+            ready = max(ready, requests.ready_at(now, 1.0))
+        if chars is not None:
+            ready = max(ready, chars.ready_at(now, 0.0))
+        return ready
+
+    def acquire(self, server_id: int, chars: int, now: Optional[float] = None):
+        """派发请求时扣减令牌（字符桶允许透支）。"""
+        now = time.time() if now is None else now
+        history = self._history[server_id]
+        history.append((now, chars))
+        while history and history[0][0] < now - OBSERVE_WINDOW:
+            history.popleft()
+        for bucket, amount in ((self._requests[server_id], 1.0), (self._chars[server_id], float(chars))):
+            if bucket is not None:
+                bucket.refill(now)
+                bucket.tokens -= amount
+
+    def on_success(self, server_id: int, headers: Optional[Dict] = None, now: Optional[float] = None):
+        """请求成功：速率缓慢回升（不超过被限流时的实际速率）；响应头显示配额耗尽时提前暂停到重置时刻。"""
+        now = time.time() if now is None else now
+        self._throttle_streak[server_id] = 0
+        if now - self._last_throttled[server_id] > RECOVERY_RESET:
+            self._requests[server_id] = None
+            self._chars[server_id] = None
+        else:
+            for bucket in (self._requests[server_id], self._chars[server_id]):
+                if bucket is not None:
+                    bucket.recover()
+        if headers and headers.get('remaining') == 0 and headers.get('reset_after'):
+            self._paused_until[server_id] = max(self._paused_until[server_id], now + headers['reset_after'])
+
+    def pause(self, server_id: int, headers: Optional[Dict] = None, now: Optional[float] = None) -> float:
+        """按 Retry-After 暂停整台服务器（不学习速率，用于未经 acquire 的探测请求），返回暂停秒数。"""
+        now = time.time() if now is None else now
+        headers = headers or {}
+        self._throttle_streak[server_id] += 1
+        self._last_throttled[server_id] = now
+        pause = headers.get('retry_after')
+        if pause is None:
+            pause = headers.get('reset_after')
+        if pause is None:
+            pause = DEFAULT_PAUSE * (2 ** (self._throttle_streak[server_id] - 1))
+        pause = min(MAX_PAUSE, pause)
+        self._paused_until[server_id] = max(self._paused_until[server_id], now + pause)
+        return pause
+
+    def on_throttled(self, server_id: int, headers: Optional[Dict] = None, now: Optional[float] = None) -> float:
+        """请求被限流：整台服务器暂停并下调可持续速率，返回暂停秒数。"""
+        now = time.time() if now is None else now
+        pause = self.pause(server_id, headers, now)
+
+        # 以最近窗口内的实际速率为基准学习可持续速率；请求太少时算出的速率没有意义，只暂停不学习
+        history = self._history[server_id]
+        if len(history) < MIN_RATE_SAMPLES:
+            return pause
+        span = max(1.0, min(OBSERVE_WINDOW, now - history[0][0])) if history else OBSERVE_WINDOW
+        request_rate = max(MIN_REQUEST_RATE, len(history) / span)
+        char_rate = sum(chars for _, chars in history) / span
+        self._set_rate(server_id, request_rate, char_rate, now)
+        return pause
+
+    def _set_rate(self, server_id: int, request_rate: float, char_rate: float, now: float):
+        """按被限流时的实际速率设置令牌桶：速率取其 BACKOFF_FACTOR，回升以实际速率为上限"""
+        requests, chars = self._requests[server_id], self._chars[server_id]
+        backoff_requests = max(MIN_REQUEST_RATE, request_rate * BACKOFF_FACTOR)
+        if requests is None:
+            self._requests[server_id] = _Bucket(backoff_requests, request_rate, now)
+        else:
+            requests.throttle(backoff_requests, request_rate, now)
+        if char_rate > 0:
+            if chars is None:
+                self._chars[server_id] = _Bucket(char_rate * BACKOFF_FACTOR, char_rate, now)
+            else:
+                chars.throttle(char_rate * BACKOFF_FACTOR, char_rate, now)
+
+    def snapshot(self, server_id: int, now: Optional[float] = None) -> Dict:
+        """供 /server_status 展示的限流状态。"""
+        now = time.time() if now is None else now
+        paused = self._paused_until[server_id]
+        requests, chars = self._requests[server_id], self._chars[server_id]
+        return {
+            'throttled_until': paused if paused > now else None,
+            'request_rate_limit': round(requests.rate * 60, 1) if requests is not None else None,  # 次/分钟
+            'char_rate_limit': round(chars.rate, 1) if chars is not None else None,                # 字/秒
+        }
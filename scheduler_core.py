@@ -0,0 +1,107 @@
+"""
+事件驱动的调度核心
+- 任务入队、并发位释放、上限变化等状态变化时 notify()，调度循环立即醒来重新检查，不再定时轮询
+- 调度循环只在"有任务也有空位但需要等到某个时刻"（限流暂停、退避到期）时带截止时间等待
+- 多次 notify 在调度器下一次检查前合并为一次唤醒
+- 延迟重试统一放入按到期时刻排序的最小堆，由单个定时器按到期顺序投递回任务队列
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class WakeupSignal:
+    """可合并的唤醒信号（同一事件循环内使用）。"""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        """状态发生变化，唤醒等待中的调度循环。"""
+        self._event.set()
+
+    async def wait(self, deadline: Optional[float] = None) -> bool:
+        """等待下一次 notify 或到达 deadline（time.time() 时刻）；返回是否由 notify 唤醒。
+
+        调用方应在检查状态、确认无事可做后再调用：检查前到达的通知会让本次等待立即返回，
+        因此不会丢失唤醒。
+        """
+        try:
+            if self._event.is_set():
+                return True
+            if deadline is None:
+                await self._event.wait()
+                return True
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+        finally:
+            self._event.clear()
+
+
+class DelayedRetryQueue:
+    """批次内共享的延迟重试队列。
+
+    schedule() 把任务按到期时刻压入最小堆；事件循环上始终只挂一个定时器，指向堆顶的到期时刻，
+    到期后按到期顺序把所有已到期任务交给 deliver（同步回调，通常是 put_nowait 并唤醒调度器）。
+    取代"每次重试创建一个 sleep 协程"的做法。
+    """
+
+    def __init__(self, deliver: Callable[[Any], None]):
+        self._deliver = deliver
+        self._heap: List[Tuple[float, int, Any]] = []  # (到期时刻 loop.time(), 序号, 任务)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at: Optional[float] = None
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, item: Any, delay: float):
+        """delay 秒后把任务投递回队列。"""
+        loop = asyncio.get_running_loop()
+        due = loop.time() + max(0.0, delay)
+        heapq.heappush(self._heap, (due, next(self._seq), item))
+        self._drained.clear()
+        if self._timer_at is None or due < self._timer_at:
+            self._arm(loop)
+
+    async def join(self):
+        """等待所有待重试任务都已投递。"""
+        await self._drained.wait()
+
+    def close(self):
+        """取消定时器并丢弃尚未到期的任务（批次结束时调用）。"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._timer_at = None
+        self._heap.clear()
+        self._drained.set()
+
+    def _arm(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_at = self._heap[0][0]
+        self._timer = loop.call_at(self._timer_at, self._fire)
+
+    def _fire(self):
+        self._timer = self._timer_at = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, item = heapq.heappop(self._heap)
+            self._deliver(item)
+        if self._heap:
+            self._arm(loop)
+        else:
+            self._drained.set()
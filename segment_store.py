@@ -0,0 +1,162 @@
+"""
+增量合成的段落音频存储
+- 每个批次目录一个清单 (.manifest.json)，记录每个文件的源内容哈希与分段列表
+- 分段音频按内容寻址存放在 .segments/ 下，未变化的段落直接复用
+- 修改后的文件只需重新合成内容变化的段落，再由分段重建最终音频
+- 清单每个批次只读取一次；新登记的记录先留在内存，累积到一定数量或批次结束时合并写入
+- 同一目录可能有多个批次同时处理（继续处理、重试），过期分段只在最后一个批次结束时清理
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import threading
+import contextlib
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_NAME = '.manifest.json'
+SEGMENT_DIR_NAME = '.segments'
+FLUSH_MIN_RECORDS = 32     # 未写入的登记至少累积这么多条才写清单
+FLUSH_FRACTION = 0.1       # 且不少于清单文件数的这一比例（整批写入次数有上限，总开销随文件数线性增长）
+
+# 清单写入全局串行：同一目录可能被多个批次线程同时更新
+_manifest_lock = threading.Lock()
+# 目录 -> {'batches': 正在使用的批次数, 'keep': 这些批次要保留的分段}（受 _manifest_lock 保护）
+_active_folders: Dict[str, Dict] = {}
+
+
+def text_digest(text: str) -> str:
+    """源文档内容哈希。"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class SegmentStore:
+    """批次目录内的段落音频存储与清单。"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, MANIFEST_NAME)
+        self.segment_dir = os.path.join(folder, SEGMENT_DIR_NAME)
+        self._manifest: Optional[Dict] = None
+        self._dirty: Dict[str, Dict] = {}  # 尚未写入清单的登记
+        self._lock = threading.Lock()
+        self._attached = False
+
+    @staticmethod
+    def exists(folder: str) -> bool:
+        """目录是否已有增量清单。"""
+        return os.path.exists(os.path.join(folder, MANIFEST_NAME))
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {'files': {}}
+        manifest.setdefault('files', {})
+        return manifest
+
+    def _write(self, manifest: Dict):
+        temp_path = f"{self.manifest_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(temp_path, self.manifest_path)
+        except Exception:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+    def load(self) -> Dict:
+        """读取清单（每个实例只读一次，之后使用内存中的副本）。"""
+        with self._lock:
+            if self._manifest is None:
+                self._manifest = self._read()
+            return self._manifest
+
+    def attach(self) -> Dict:
+        """批次开始使用目录：创建分段目录、登记为活动批次并读取清单（有磁盘 I/O，应在线程池中调用）。"""
+        os.makedirs(self.segment_dir, exist_ok=True)
+        with _manifest_lock:
+            state = _active_folders.setdefault(os.path.abspath(self.folder), {'batches': 0, 'keep': set()})
+            state['batches'] += 1
+        self._attached = True
+        return self.load()
+
+    def detach(self, keep: Iterable[str] = ()) -> Optional[set]:
+        """批次结束：写入未落盘的登记并注销；是目录的最后一个活动批次时返回各批次要保留的分段，否则返回 None。"""
+        self.flush()
+        if not self._attached:
+            return None
+        self._attached = False
+        folder = os.path.abspath(self.folder)
+        with _manifest_lock:
+            state = _active_folders[folder]
+            state['keep'].update(keep)
+            state['batches'] -= 1
+            if state['batches'] > 0:
+                return None
+            del _active_folders[folder]
+            return state['keep']
+
+    def entry(self, filename: str) -> Optional[Dict]:
+        """读取文件的清单记录。"""
+        return self.load()['files'].get(filename)
+
+    def is_current(self, filename: str, source_hash: str, params: Dict) -> bool:
+        """清单记录的源内容与合成参数是否与当前一致。"""
+        entry = self.entry(filename)
+        return bool(entry) and entry.get('source_hash') == source_hash and entry.get('params') == params
+
+    def stale_files(self, sources: Dict[str, str]) -> List[str]:
+        """给定 {文件名: 源内容哈希}，返回清单中内容已变化的文件。"""
+        files = self.load()['files']
+        return [name for name, digest in sources.items()
+                if name in files and files[name].get('source_hash') != digest]
+
+    def segment_path(self, key: str) -> str:
+        return os.path.join(self.segment_dir, key + '.mp3')
+
+    def record(self, filename: str, source_hash: str, params: Dict, segment_keys: List[str]):
+        """最终音频重建成功后登记清单（累积到一定数量时写入，批次结束时由 flush 写入其余的）。"""
+        manifest = self.load()
+        with self._lock:
+            entry = {'source_hash': source_hash, 'params': params, 'segments': list(segment_keys)}
+            manifest['files'][filename] = entry
+            self._dirty[filename] = entry
+            due = len(self._dirty) >= max(FLUSH_MIN_RECORDS, len(manifest['files']) * FLUSH_FRACTION)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """把未写入的登记合并进磁盘上的清单（同一目录可能有其他批次同时登记）。"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        with _manifest_lock:
+            manifest = self._read()
+            manifest['files'].update(dirty)
+            self._write(manifest)
+
+    def prune(self, keep: Iterable[str] = ()):
+        """删除清单未引用的分段（keep 中的分段保留，供未完成的文件下次复用）。
+
+        同一目录还有其他批次在处理时不要调用：由 detach 判断是否为最后一个批次。
+        """
+        self.flush()
+        with _manifest_lock:
+            referenced = set(keep)
+            for entry in self._read()['files'].values():
+                referenced.update(entry.get('segments', []))
+            removed = 0
+            if not os.path.isdir(self.segment_dir):
+                return removed
+            for name in os.listdir(self.segment_dir):
+                key, ext = os.path.splitext(name)
+                if ext == '.mp3' and key not in referenced:
+                    with contextlib.suppress(OSError):
+                        os.remove(os.path.join(self.segment_dir, name))
+                        removed += 1
+            return removed
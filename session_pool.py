@@ -0,0 +1,85 @@
+"""
+批次级 HTTP 连接池管理
+- 每个 API 服务器在整个批次内复用一个长连接会话
+- 启用 keep-alive 与 DNS 缓存，避免每个文件重复握手
+- 每主机连接上限跟随服务器容量
+"""
+
+import aiohttp
+from typing import Dict, List
+
+from batch_scheduler import server_key
+
+# 连接池默认参数
+DEFAULT_KEEPALIVE_TIMEOUT = 60     # 空闲连接保活秒数
+DEFAULT_DNS_CACHE_TTL = 300        # DNS 缓存秒数
+
+
+class ServerSessionPool:
+    """为批次内每个 API 服务器维护一个长生命周期的 aiohttp 会话。
+
+    会话在首次使用时于当前事件循环内惰性创建，批次结束时统一关闭。
+    """
+
+    def __init__(self, api_servers: List[Dict], default_capacity: int = 1,
+                 keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+                 dns_cache_ttl: int = DEFAULT_DNS_CACHE_TTL):
+        self.api_servers = api_servers
+        self.default_capacity = max(1, int(default_capacity or 1))
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._capacity: Dict[str, int] = {}
+
+        # 同一 URL 的容量取最大值，作为该主机的连接上限
+        for server in api_servers:
+            key = server_key(server)
+            try:
+                capacity = int(server.get('concurrency', self.default_capacity))
+            except (TypeError, ValueError):
+                capacity = self.default_capacity
+            self._capacity[key] = max(self._capacity.get(key, 1), capacity, 1)
+
+    def capacity(self, server_id: int) -> int:
+        """返回指定服务器的每主机连接上限。"""
+        return self._capacity.get(server_key(self.api_servers[server_id]), self.default_capacity)
+
+    def set_capacity(self, server_id: int, capacity: int):
+        """调整服务器容量；仅对尚未建立的会话生效。"""
+        key = server_key(self.api_servers[server_id])
+        self._capacity[key] = max(1, int(capacity))
+
+    def session_for(self, server_id: int) -> aiohttp.ClientSession:
+        """获取（必要时创建）指定服务器的共享会话。"""
+        key = server_key(self.api_servers[server_id])
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=0,  # 总量不设限，由每主机上限约束
+                limit_per_host=self._capacity.get(key, self.default_capacity),
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+                enable_cleanup_closed=True,
+            )
+            # 单个请求的超时由请求级别控制，会话层不设总超时
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None),
+            )
+            self._sessions[key] = session
+        return session
+
+    async def close(self):
+        """关闭所有会话并释放连接。"""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+
+    async def __aenter__(self) -> 'ServerSessionPool':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
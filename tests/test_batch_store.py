@@ -0,0 +1,75 @@
+from batch_store import BatchStore, FileTable
+
+
+def record(name, status='waiting'):
+    return {'filename': name, 'status': status, 'progress': 0, 'stage': '等待处理'}
+
+
+def test_every_change_advances_seq():
+    table = FileTable({'b_1.md': record('1.md'), 'b_2.md': record('2.md')})
+    assert table.seq == 2
+    table['b_1.md']['status'] = 'processing'
+    table['b_1.md'].update({'progress': 50, 'stage': '处理中'})
+    assert table.seq == 4
+
+
+def test_changes_since_returns_latest_records_in_change_order():
+    table = FileTable({'b_1.md': record('1.md'), 'b_2.md': record('2.md'), 'b_3.md': record('3.md')})
+    since = table.seq
+    table['b_2.md']['status'] = 'processing'
+    table['b_1.md']['status'] = 'processing'
+    table['b_2.md']['status'] = 'completed'
+    seq, changed = table.changes(since)
+    assert seq == table.seq == since + 3
+    assert list(changed) == ['b_1.md', 'b_2.md']
+    assert changed['b_2.md']['status'] == 'completed'
+    assert table.changes(seq) == (seq, {})
+    assert list(table.changes(0)[1]) == ['b_3.md', 'b_1.md', 'b_2.md']
+
+
+def test_changes_are_copies():
+    table = FileTable({'b_1.md': record('1.md')})
+    _, changed = table.changes(0)
+    changed['b_1.md']['status'] = 'failed'
+    assert table['b_1.md']['status'] == 'waiting'
+    assert table.counts() == {'waiting': 1}
+
+
+def test_rebuilt_table_has_new_epoch_and_restarts_seq():
+    table = FileTable({'b_1.md': record('1.md')})
+    table['b_1.md']['status'] = 'completed'
+    reloaded = FileTable(table.select()[1])
+    assert reloaded.epoch != table.epoch
+    assert reloaded.seq == 1
+    # 旧 epoch 的序号可能大于新表的序号，调用方必须据 epoch 判断是否全量读取
+    assert table.seq > reloaded.seq
+
+
+def test_counts_and_select_follow_status_changes():
+    table = FileTable({f'b_{i}.md': record(f'{i}.md') for i in range(5)})
+    table['b_3.md']['status'] = 'failed'
+    table['b_1.md']['status'] = 'failed'
+    assert table.counts() == {'waiting': 3, 'failed': 2}
+    assert table.select(['failed']) == (2, {'b_3.md': record('3.md', 'failed'), 'b_1.md': record('1.md', 'failed')})
+    matched, page = table.select(offset=2, limit=2)
+    assert matched == 5 and list(page) == ['b_2.md', 'b_3.md']
+
+
+def test_store_persists_and_reloads_batches(tmp_path):
+    path = str(tmp_path / 'state.db')
+    store = BatchStore(path, flush_seconds=60)
+    store['batch'] = {'total_files': 1, 'completed_files': 0, 'files': {'batch_1.md': record('1.md')},
+                      'server_statuses': {0: {'load': 0}}}
+    store['batch']['files']['batch_1.md']['status'] = 'completed'
+    store['batch']['completed_files'] = 1
+    store.close()
+
+    reopened = BatchStore(path, flush_seconds=60)
+    try:
+        batch = reopened['batch']
+        assert batch['completed_files'] == 1
+        assert dict(batch['files']['batch_1.md']) == record('1.md', 'completed')
+        assert batch['server_statuses'] == {0: {'load': 0}}
+        assert 'missing' not in reopened
+    finally:
+        reopened.close()
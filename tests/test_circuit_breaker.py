@@ -0,0 +1,63 @@
+import asyncio
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def make_breaker(results, open_seconds=0.02, max_open_seconds=0.08):
+    """results 依次作为各次探测的结果；返回 (熔断器, 每次状态变化后的状态列表)"""
+    probes = iter(results)
+    changes = []
+
+    async def probe(server_id):
+        return next(probes)
+
+    breaker = CircuitBreaker(1, probe, failure_threshold=2, open_seconds=open_seconds,
+                             max_open_seconds=max_open_seconds,
+                             on_change=lambda server_id: changes.append(breaker.state(server_id)))
+    return breaker, changes
+
+
+def test_closed_open_half_open_closed():
+    async def scenario():
+        breaker, changes = make_breaker([True])
+        assert not breaker.on_failure(0)
+        assert breaker.allows(0)
+        assert breaker.on_failure(0)
+        assert breaker.state(0) == OPEN and not breaker.allows(0)
+        await asyncio.wait_for(breaker.wait_closed(0), 1)
+        breaker.close()
+        return changes, breaker.state(0), breaker.snapshot(0)
+
+    changes, state, snapshot = asyncio.run(scenario())
+    assert changes == [OPEN, HALF_OPEN, CLOSED]
+    assert state == CLOSED
+    assert snapshot['breaker_trips'] == 1 and snapshot['breaker_failures'] == 0
+
+
+def test_failed_probe_reopens_with_doubled_cooldown():
+    async def scenario():
+        breaker, changes = make_breaker([False, False, True])
+        assert breaker.trip(0)
+        assert not breaker.trip(0)
+        await asyncio.sleep(0.03)  # 0.02s 时首次探测失败，冷却翻倍为 0.04s，尚未到上限
+        exhausted_midway = breaker.exhausted(0)
+        await asyncio.wait_for(breaker.wait_closed(0), 1)
+        breaker.close()
+        return changes, exhausted_midway, breaker.snapshot(0)['breaker_trips']
+
+    changes, exhausted_midway, trips = asyncio.run(scenario())
+    assert changes == [OPEN, HALF_OPEN, OPEN, HALF_OPEN, OPEN, HALF_OPEN, CLOSED]
+    assert not exhausted_midway
+    assert trips == 3
+
+
+def test_success_while_open_closes_immediately():
+    async def scenario():
+        breaker, changes = make_breaker([], open_seconds=10.0, max_open_seconds=10.0)
+        breaker.trip(0)
+        assert breaker.exhausted(0)
+        breaker.on_success(0)
+        breaker.close()
+        return changes, breaker.allows(0)
+
+    assert asyncio.run(scenario()) == ([OPEN, CLOSED], True)
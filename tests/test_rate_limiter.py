@@ -0,0 +1,109 @@
+from email.utils import formatdate
+
+from rate_limiter import (BACKOFF_FACTOR, DEFAULT_PAUSE, MAX_PAUSE, MIN_RATE_SAMPLES,
+                          ServerRateLimiter, parse_rate_limit_headers, parse_retry_after)
+
+
+def test_parse_retry_after_seconds_and_date():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after(' 1.5 ') == 1.5
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after(formatdate(1030.0, usegmt=True), now=1000.0) == 30.0
+    assert parse_retry_after(formatdate(900.0, usegmt=True), now=1000.0) == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+
+
+def test_parse_rate_limit_headers_reset_timestamp():
+    info = parse_rate_limit_headers({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '2000000010'},
+                                    now=2000000000.0)
+    assert info == {'retry_after': None, 'remaining': 0, 'reset_after': 10.0}
+    assert parse_rate_limit_headers({'RateLimit-Reset': '5', 'RateLimit-Remaining': 'x'})['remaining'] is None
+
+
+def test_unthrottled_server_is_not_paced():
+    limiter = ServerRateLimiter(1)
+    for _ in range(100):
+        limiter.acquire(0, 1000, now=100.0)
+    assert limiter.ready_at(0, now=100.0) == 100.0
+
+
+def test_learned_bucket_paces_requests():
+    limiter = ServerRateLimiter(1)
+    for i in range(30):
+        limiter.acquire(0, 10, now=100.0 + i)
+    limiter.on_throttled(0, {'retry_after': 0.0}, now=130.0)
+    rate = 30 / 30 * BACKOFF_FACTOR
+    # 突发额度用完后，稳态下每个请求间隔 1/rate 秒
+    now = 130.0
+    sent = []
+    for _ in range(6):
+        now = limiter.ready_at(0, now=now)
+        limiter.acquire(0, 10, now=now)
+        sent.append(now)
+    assert sent[0] == 130.0
+    gaps = [later - earlier for earlier, later in zip(sent[2:], sent[3:])]
+    assert all(abs(gap - 1 / rate) < 1e-6 for gap in gaps)
+
+
+def test_default_pause_doubles_and_resets_on_success():
+    limiter = ServerRateLimiter(1)
+    assert limiter.pause(0, now=0.0) == DEFAULT_PAUSE
+    assert limiter.pause(0, now=0.0) == DEFAULT_PAUSE * 2
+    assert limiter.pause(0, {'retry_after': 10 ** 6}, now=0.0) == MAX_PAUSE
+    limiter.on_success(0, now=1.0)
+    assert limiter.pause(0, now=1.0) == DEFAULT_PAUSE
+
+
+def test_quota_exhausted_headers_pause_until_reset():
+    limiter = ServerRateLimiter(1)
+    limiter.on_success(0, {'remaining': 0, 'reset_after': 4.0}, now=50.0)
+    assert limiter.ready_at(0, now=50.0) == 54.0
+
+
+def test_throttled_without_history_only_pauses():
+    limiter = ServerRateLimiter(1)
+    pause = limiter.on_throttled(0, {'retry_after': 3.0}, now=100.0)
+    assert pause == 3.0
+    assert limiter.ready_at(0, now=100.0) == 103.0
+    # 暂停结束后不受令牌桶限制
+    assert limiter.ready_at(0, now=104.0) == 104.0
+    assert limiter.snapshot(0, now=104.0)['request_rate_limit'] is None
+
+
+def test_throttled_with_few_samples_does_not_learn_rate():
+    limiter = ServerRateLimiter(1)
+    for i in range(MIN_RATE_SAMPLES - 1):
+        limiter.acquire(0, 100, now=100.0 + i)
+    limiter.on_throttled(0, now=110.0)
+    assert limiter.ready_at(0, now=110.0 + DEFAULT_PAUSE) == 110.0 + DEFAULT_PAUSE
+    assert limiter.snapshot(0, now=120.0)['request_rate_limit'] is None
+
+
+def test_throttled_with_history_learns_rate():
+    limiter = ServerRateLimiter(1)
+    for i in range(20):
+        limiter.acquire(0, 100, now=100.0 + i)
+    limiter.on_throttled(0, {'retry_after': 0.0}, now=120.0)
+    assert limiter.snapshot(0, now=120.0)['request_rate_limit'] == round(20 / 20 * BACKOFF_FACTOR * 60, 1)
+
+
+def test_recovery_is_capped_at_throttled_rate():
+    limiter = ServerRateLimiter(1)
+    for i in range(20):
+        limiter.acquire(0, 100, now=100.0 + i)
+    limiter.on_throttled(0, {'retry_after': 0.0}, now=120.0)
+    for step in range(200):
+        limiter.on_success(0, now=121.0 + step)
+    snapshot = limiter.snapshot(0, now=400.0)
+    assert snapshot['request_rate_limit'] == round(20 / 20 * 60, 1)
+    assert snapshot['char_rate_limit'] == round(20 * 100 / 20, 1)
+
+
+def test_pause_does_not_learn_rate():
+    limiter = ServerRateLimiter(1)
+    for i in range(20):
+        limiter.acquire(0, 100, now=100.0 + i)
+    assert limiter.pause(0, {'retry_after': 5.0}, now=120.0) == 5.0
+    assert limiter.ready_at(0, now=120.0) == 125.0
+    assert limiter.snapshot(0, now=125.0)['request_rate_limit'] is None
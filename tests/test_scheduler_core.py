@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from scheduler_core import DelayedRetryQueue, WakeupSignal
+
+
+def test_retries_delivered_in_due_order():
+    async def scenario():
+        delivered = []
+        queue = DelayedRetryQueue(delivered.append)
+        queue.schedule('c', 0.06)
+        queue.schedule('a', 0.02)
+        queue.schedule('b', 0.04)
+        queue.schedule('a2', 0.02)  # 同一到期时刻按入堆先后
+        assert len(queue) == 4
+        await asyncio.wait_for(queue.join(), 1)
+        return delivered, len(queue)
+
+    delivered, remaining = asyncio.run(scenario())
+    assert delivered == ['a', 'a2', 'b', 'c']
+    assert remaining == 0
+
+
+def test_earlier_item_rearms_timer():
+    async def scenario():
+        delivered = []
+        queue = DelayedRetryQueue(delivered.append)
+        queue.schedule('late', 5.0)
+        queue.schedule('soon', 0.01)
+        await asyncio.sleep(0.05)
+        return delivered, len(queue)
+
+    assert asyncio.run(scenario()) == (['soon'], 1)
+
+
+def test_close_drops_pending_items():
+    async def scenario():
+        delivered = []
+        queue = DelayedRetryQueue(delivered.append)
+        queue.schedule('x', 0.01)
+        queue.close()
+        await asyncio.wait_for(queue.join(), 1)
+        await asyncio.sleep(0.03)
+        return delivered, len(queue)
+
+    assert asyncio.run(scenario()) == ([], 0)
+
+
+def test_wakeup_signal_coalesces_and_times_out():
+    async def scenario():
+        signal = WakeupSignal()
+        signal.notify()
+        signal.notify()
+        first = await signal.wait()
+        loop = asyncio.get_running_loop()
+        second = await signal.wait(deadline=time.time() + 0.02)
+        loop.call_later(0.01, signal.notify)
+        third = await signal.wait()
+        return first, second, third
+
+    assert asyncio.run(scenario()) == (True, False, True)
@@ -0,0 +1,39 @@
+import os
+
+from segment_store import SEGMENT_DIR_NAME, SegmentStore
+
+
+def write_segment(store, key):
+    with open(store.segment_path(key), 'wb') as f:
+        f.write(b'mp3')
+
+
+def test_constructor_does_not_touch_disk(tmp_path):
+    SegmentStore(str(tmp_path))
+    assert not os.path.exists(tmp_path / SEGMENT_DIR_NAME)
+    assert SegmentStore(str(tmp_path)).prune() == 0
+
+
+def test_prune_waits_for_last_batch_on_folder(tmp_path):
+    first, second = SegmentStore(str(tmp_path)), SegmentStore(str(tmp_path))
+    first.attach()
+    second.attach()
+    for key in ('done', 'first_pending', 'second_pending', 'stale'):
+        write_segment(first, key)
+    first.record('a.md', 'hash', {}, ['done'])
+
+    # 另一个批次仍在处理同一目录：不清理，它需要的分段不能被删
+    assert first.detach({'first_pending'}) is None
+    keep = second.detach({'second_pending'})
+    assert keep == {'first_pending', 'second_pending'}
+
+    assert second.prune(keep) == 1
+    assert sorted(os.listdir(tmp_path / SEGMENT_DIR_NAME)) == ['done.mp3', 'first_pending.mp3', 'second_pending.mp3']
+
+
+def test_detach_flushes_pending_records(tmp_path):
+    store = SegmentStore(str(tmp_path))
+    store.attach()
+    store.record('a.md', 'hash', {'voice': 'v'}, ['k'])
+    assert store.detach() == set()
+    assert SegmentStore(str(tmp_path)).is_current('a.md', 'hash', {'voice': 'v'})
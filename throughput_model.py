@@ -0,0 +1,141 @@
+"""
+服务器吞吐量模型
+- 每台服务器按已完成请求的 字符数/耗时 维护指数加权移动平均 (EWMA)
+- 根据在途任务估算服务器何时空闲，为任务挑选预计完成时间最早的服务器
+- 保留最近请求的单字耗时样本，按高分位估计某个长度的请求"慢得反常"的阈值（对冲请求用）
+- 批次开始前的探测吞吐作为尚无真实观测的服务器的估计：探测文本很短、固定开销占比大，
+  只反映服务器间的相对快慢，按已有服务器"真实吞吐/探测吞吐"的比例换算
+"""
+
+import math
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+DEFAULT_ALPHA = 0.3               # EWMA 平滑系数，越大越看重最近的请求
+DEFAULT_CHARS_PER_SEC = 100.0     # 没有任何观测时的先验吞吐
+OVERDUE_FACTOR = 0.25             # 在途任务已超出预计时间时，假定还需要预计耗时的这一比例
+LATENCY_SAMPLES = 200             # 保留的单字耗时样本数（所有服务器合计）
+MIN_LATENCY_SAMPLES = 10          # 样本少于该数时不给出分位估计
+
+
+class ThroughputModel:
+    """批次内各服务器的字符吞吐估计与最早完成时间 (ECT) 分配。"""
+
+    def __init__(self, server_count: int, alpha: float = DEFAULT_ALPHA,
+                 prior: float = DEFAULT_CHARS_PER_SEC):
+        self.alpha = alpha
+        self.prior = prior
+        self._rates: Dict[int, Optional[float]] = {i: None for i in range(server_count)}
+        self._samples: Dict[int, int] = {i: 0 for i in range(server_count)}
+        # server_id -> {task_id: (开始时刻, 预计完成时刻)}
+        self._inflight: Dict[int, Dict[Hashable, Tuple[float, float]]] = {i: {} for i in range(server_count)}
+        self._probe_rates: Dict[int, Optional[float]] = {i: None for i in range(server_count)}
+        self._latency = deque(maxlen=LATENCY_SAMPLES)  # 秒/字
+
+    def rate(self, server_id: int) -> float:
+        """服务器的字符/秒估计；尚无观测时按探测吞吐换算，也未探测时取已观测服务器的平均值，全都没有时取先验。"""
+        rate = self._rates.get(server_id)
+        if rate is not None:
+            return rate
+        probe = self._probe_rates.get(server_id)
+        if probe is not None:
+            ratios = [self._rates[i] / self._probe_rates[i] for i in self._rates
+                      if self._rates[i] is not None and self._probe_rates.get(i)]
+            return probe * (sum(ratios) / len(ratios) if ratios else 1.0)
+        known = [r for r in self._rates.values() if r is not None]
+        return sum(known) / len(known) if known else self.prior
+
+    def observed_rate(self, server_id: int) -> Optional[float]:
+        """服务器自身的实测字符/秒；尚无观测时为 None。"""
+        return self._rates.get(server_id)
+
+    def seed(self, server_id: int, chars_per_sec: float):
+        """登记探测测得的吞吐（用于尚无真实观测时的估计）。"""
+        if chars_per_sec > 0:
+            self._probe_rates[server_id] = chars_per_sec
+
+    def observe(self, server_id: int, chars: int, seconds: float):
+        """登记一次成功请求的字符数与耗时。"""
+        if chars <= 0 or seconds <= 0:
+            return
+        sample = chars / seconds
+        previous = self._rates.get(server_id)
+        self._rates[server_id] = sample if previous is None else (
+            self.alpha * sample + (1 - self.alpha) * previous
+        )
+        self._samples[server_id] = self._samples.get(server_id, 0) + 1
+        self._latency.append(seconds / chars)
+
+    def latency_quantile(self, chars: int, quantile: float) -> Optional[float]:
+        """该长度请求耗时的高分位估计（单字耗时分位 × 字数）；样本不足时返回 None。"""
+        if len(self._latency) < MIN_LATENCY_SAMPLES or chars <= 0:
+            return None
+        ordered = sorted(self._latency)
+        index = min(len(ordered) - 1, max(0, math.ceil(quantile * len(ordered)) - 1))
+        return ordered[index] * chars
+
+    def expected_duration(self, server_id: int, chars: int) -> float:
+        return chars / self.rate(server_id)
+
+    def start(self, server_id: int, task_id: Hashable, chars: int, now: Optional[float] = None):
+        """任务派发到服务器时登记在途。"""
+        now = time.time() if now is None else now
+        self._inflight[server_id][task_id] = (now, now + self.expected_duration(server_id, chars))
+
+    def finish(self, server_id: int, task_id: Hashable):
+        """任务结束（无论成败）时移除在途记录。"""
+        self._inflight[server_id].pop(task_id, None)
+
+    def free_at(self, server_id: int, now: Optional[float] = None, slots: int = 1) -> float:
+        """预计服务器空出一个并发位的时刻（slots 为该服务器的并发上限）。"""
+        now = time.time() if now is None else now
+        inflight = self._inflight[server_id]
+        if len(inflight) < slots:
+            return now
+        ends = sorted(
+            expected_end if expected_end > now else now + (expected_end - started) * OVERDUE_FACTOR
+            for started, expected_end in inflight.values()
+        )
+        return ends[len(ends) - slots]
+
+    def choose(self, candidates: Sequence[Tuple[Hashable, int]], idle: Iterable[int],
+               now: Optional[float] = None,
+               slots: Optional[Callable[[int], int]] = None,
+               not_before: Optional[Callable[[int], float]] = None) -> Optional[Tuple[Hashable, int]]:
+        """为空闲服务器挑选任务。
+
+        candidates 是按出队顺序排列的 (任务, 字符数)。依次把每个任务模拟分配给预计完成时间
+        最早的服务器（含忙碌服务器及之前模拟分配的任务），第一个落到空闲服务器上的任务即为结果，
+        返回 (任务, 服务器)；所有候选都更适合等待忙碌服务器时返回 None。
+        尚无观测（也未探测）的空闲服务器先用窗口内最小的任务探测吞吐。slots 返回各服务器的并发上限，
+        not_before 返回服务器最早可接收请求的时刻（如限流暂停）。
+        """
+        now = time.time() if now is None else now
+        idle = set(idle)
+        if not candidates:
+            return None
+        for server_id in sorted(idle):
+            if (self._rates.get(server_id) is None and self._probe_rates.get(server_id) is None
+                    and not self._inflight[server_id]):
+                return min(reversed(candidates), key=lambda candidate: candidate[1])[0], server_id
+        slots = slots or (lambda server_id: 1)
+        free = {server_id: (now if server_id in idle else self.free_at(server_id, now, slots(server_id)))
+                for server_id in self._rates}
+        if not_before is not None:
+            free = {server_id: max(at, not_before(server_id)) for server_id, at in free.items()}
+        for item, chars in candidates:
+            best = min(free, key=lambda server_id: free[server_id] + self.expected_duration(server_id, chars))
+            if best in idle:
+                return item, best
+            free[best] += self.expected_duration(best, chars) / slots(best)
+        return None
+
+    def snapshot(self, server_id: int) -> Dict:
+        """供 /server_status 展示的估计值。"""
+        rate = self._rates.get(server_id)
+        return {
+            'chars_per_sec': round(rate, 1) if rate is not None else None,
+            'throughput_samples': self._samples.get(server_id, 0),
+        }
+